@@ -1,17 +1,28 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify
 from pymongo import MongoClient
+from bson import ObjectId
+from functools import wraps
 from flask_cors import CORS
 from flasgger import Swagger, swag_from
+import hashlib
+import hmac
 import uuid
 import os
-import re
-import json
-import random
-from datetime import datetime, date
-from bson import ObjectId
+from datetime import datetime, date, timedelta
 
-from models.user_visits import UserVisit
-from models.user_streak import UserStreak
+from models.daily_stats import DailyStats, PERIODS, utc_today
+from models.word_search import HeadwordIndex
+from models.definition_search import DefinitionIndex
+from models.quiz import QuizNeighbours, MAX_DISTRACTORS
+from models.card_stats import CardStats
+from models.repositories import STORAGE_BACKEND, create_storage
+from models.slow_queries import SlowQueryLog, SLOW_QUERY_MS
+from utils.json_provider import FastJSONProvider, json_response
+from utils.http_cache import cached_response, conditional_json, init_compression
+from utils.cards import build_cards
+from utils.cache import Cache, invalidate
+from utils import metrics, query_budget, tokens, uuid_codec
+from utils.profiler import init_profiler, profiler
 
 from dotenv import load_dotenv
 
@@ -19,7 +30,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
+init_compression(app)
+metrics.init_request_metrics(app)
+query_budget.init_query_budget(app)
 
 # Настройка Swagger
 swagger_config = {
@@ -62,25 +77,130 @@ MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
 FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
 FLASK_PORT = int(os.getenv('FLASK_PORT', 5000))
+# Токен для /admin/* (пусто — служебные эндпоинты выключены)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+# Время жизни проверок UUID токенов и статистики пользователей в кэше
+CACHE_AUTH_TTL = int(os.getenv('CACHE_AUTH_TTL', 300))
+CACHE_STATS_TTL = int(os.getenv('CACHE_STATS_TTL', 30))
+
+CARDS_COUNT = 100
+DIFFICULTIES = ('easy', 'medium', 'hard')
 
-# Подключение к MongoDB
-client = MongoClient(MONGODB_URI)
-db = client[DATABASE_NAME]
+# Подключение к MongoDB (слушатели метрик — до создания клиентов)
+metrics.register_mongo_listeners()
+query_budget.register_listener()
+slow_query_log = None
+if STORAGE_BACKEND == 'mongo':
+    slow_query_log = SlowQueryLog()
+    slow_query_log.register_listener()
 
-# Коллекции
-users_collection = db['users']
-cards_collection = db['cards']
-words_collection = db['words']
-answers_collection = db['answers']
+# ХРАНИЛИЩЕ (STORAGE_BACKEND: mongo или memory)
+storage = create_storage(STORAGE_BACKEND)
+users_repository = storage.users
+words_repository = storage.words
 
+# МОДЕЛИ
+visit_model = storage.visits
+streak_model = storage.streaks
+answer_store = storage.answers
+token_revocations = storage.revocations
+token_revocations.start()
 
-REMOVE_WORDS_1 = ['разг', 'прост', 'межд', 'част']
-REMOVE_WORDS_2 = ['сущ', 'гл', 'прил', 'нар', 'пр']
+# Агрегаты и поисковые индексы есть только в MongoDB
+daily_stats_model = quiz_model = card_stats_model = None
+word_index = definition_index = None
+if storage.backend == 'mongo':
+    client = MongoClient(MONGODB_URI)
+    db = client[DATABASE_NAME]
+    cards_collection = db['cards']
 
+    daily_stats_model = DailyStats()
+    quiz_model = QuizNeighbours()
+    card_stats_model = CardStats()
+    word_index = HeadwordIndex()
+    word_index.start()
+    definition_index = DefinitionIndex()
+    definition_index.start()
+
+
+# КЭШИ (бэкенд задается CACHE_BACKEND, см. utils/cache.py)
+auth_cache = Cache('auth', ttl=CACHE_AUTH_TTL)
+stats_cache = Cache('stats', ttl=CACHE_STATS_TTL)
+# Рейтинги сбрасываются при отметке стрика (/api/streak/visit); рейтинг по ответам
+# живет RESPONSE_CACHE_TTL — сброс на каждый ответ обнулил бы попадания
+LEADERBOARD_TAG = 'leaderboard'
+
+
+def user_tag(user_id):
+    """Тег записей кэша, зависящих от ответов пользователя"""
+    return f'user:{user_id}'
+
+
+def requires_mongo(view):
+    """Эндпоинт на агрегатах MongoDB: при STORAGE_BACKEND=memory отвечает 503"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if storage.backend != 'mongo':
+            return jsonify({'success': False, 'error': 'Not available with in-memory storage'}), 503
+        return view(*args, **kwargs)
+    return wrapper
 
-# МОДЕЛИ
-visit_model = UserVisit()
-streak_model = UserStreak()
+
+def get_request_credentials():
+    """
+    user_id и token запроса: из JSON тела или из заголовков
+    X-User-Id и Authorization: Bearer <token>.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id') or request.headers.get('X-User-Id')
+    token = data.get('token')
+    
+    auth_header = request.headers.get('Authorization', '')
+    if not token and auth_header.startswith('Bearer '):
+        token = auth_header[len('Bearer '):].strip()
+    return user_id, token
+
+def get_authenticated_user():
+    """
+    Проверяет пользователя по user_id и token.
+    
+    Подписанный токен проверяется без обращения к users: возвращается
+    только {'user_id', 'claims'}. Старые UUID токены сверяются с users,
+    тогда возвращается документ пользователя.
+    """
+    user_id, token = get_request_credentials()
+    
+    if tokens.is_signed(token):
+        claims = tokens.verify(token)
+        if not claims or (user_id and user_id != claims['user_id']):
+            return None
+        if token_revocations.is_revoked(claims['token_id']):
+            return None
+        return {'user_id': claims['user_id'], 'claims': claims}
+    
+    if not user_id or not token:
+        return None
+    
+    # Ключ — user_id и хэш токена: сам токен в кэш не попадает
+    token_hash = hashlib.blake2b(token.encode('utf-8'), digest_size=16).hexdigest()
+    return auth_cache.get_or_set(
+        f'{user_id}:{token_hash}',
+        lambda: users_repository.authenticate(user_id, token),
+        tags=(f'auth:{user_id}',)
+    )
+
+def is_admin_request():
+    """Передан ли ADMIN_TOKEN в X-Admin-Token или Authorization: Bearer"""
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get('X-Admin-Token', '')
+    auth_header = request.headers.get('Authorization', '')
+    if not token and auth_header.startswith('Bearer '):
+        token = auth_header[len('Bearer '):].strip()
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+# Профилирование по заголовку X-Profile доступно только с ADMIN_TOKEN
+init_profiler(app, authorize=is_admin_request if ADMIN_TOKEN else None)
 
 # РЕГИСТРАЦИЯ
 @app.route('/register', methods=['POST'])
@@ -111,20 +231,16 @@ def register():
               example: "987fcdeb-51a2-43d1-b789-123456789abc"
     """
     user_id = str(uuid.uuid4())
-    token = str(uuid.uuid4())
     
-    user_data = {
-        'user_id': user_id,
-        'token': token,
-        'created_at': datetime.utcnow(),
-        'total_questions': 0,
-        'correct_answers': 0,
-        'current_streak': 0,
-        'max_streak': 0,
-        'last_login': None
-    }
+    # Подписанный токен не хранится: он проверяется по подписи
+    if tokens.signing_enabled():
+        token = tokens.issue(user_id)
+        stored_token = None
+    else:
+        token = str(uuid.uuid4())
+        stored_token = token
     
-    users_collection.insert_one(user_data)
+    users_repository.create(user_id, stored_token)
     
     return jsonify({
         'success': True,
@@ -137,8 +253,14 @@ def register():
 def track_visit():
     """Отслеживает посещение пользователя (только одно в день)"""
     try:
-        # Проверяем, было ли уже посещение сегодня
-        if visit_model.has_visited_today():
+        user = get_authenticated_user()
+        if not user:
+            return jsonify({'success': False, 'error': 'Invalid user'}), 401
+        
+        # Один upsert и проверяет, и добавляет запись о посещении
+        visit_id = visit_model.track_visit(user['user_id'])
+        
+        if visit_id is None:
             return jsonify({
                 'success': True,
                 'message': 'Visit already recorded today',
@@ -146,22 +268,16 @@ def track_visit():
                 'visit_date': date.today().isoformat()
             }), 200
         
-        # Добавляем запись о посещении
-        visit_id = visit_model.track_visit()
+        if daily_stats_model is not None:
+            daily_stats_model.record_visit(user['user_id'])
         
-        if visit_id:
-            return jsonify({
-                'success': True,
-                'message': 'Visit tracked successfully',
-                'visit_id': str(visit_id),
-                'visit_date': date.today().isoformat(),
-                'already_visited': False
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Failed to track visit'
-            }), 500
+        return jsonify({
+            'success': True,
+            'message': 'Visit tracked successfully',
+            'visit_id': str(visit_id),
+            'visit_date': date.today().isoformat(),
+            'already_visited': False
+        }), 200
             
     except Exception as e:
         return jsonify({
@@ -174,17 +290,18 @@ def track_visit():
 def get_visits():
     """Возвращает список всех посещений"""
     try:
-        visits = visit_model.get_all_visits()
+        visits = visit_model.get_all_visits(request.args.get('user_id'))
         
-        # Преобразуем для JSON сериализации
-        serialized_visits = []
-        for visit in visits:
-            serialized_visit = {
-                'id': str(visit['_id']),
+        # datetime и ObjectId сериализует JSON-провайдер
+        serialized_visits = [
+            {
+                'id': visit['_id'],
+                'user_id': uuid_codec.decode(visit.get('user_id')),
                 'visit_date': visit['visit_date'],
-                'created_at': visit['created_at'].isoformat() if 'created_at' in visit else None
+                'created_at': visit.get('created_at')
             }
-            serialized_visits.append(serialized_visit)
+            for visit in visits
+        ]
         
         return jsonify({
             'success': True,
@@ -198,10 +315,84 @@ def get_visits():
             'error': str(e)
         }), 500
 
+# АКТИВНОСТЬ ПО ДНЯМ / НЕДЕЛЯМ / МЕСЯЦАМ
+# Сколько интервалов возвращать по умолчанию
+DEFAULT_SERIES_DAYS = {'day': 30, 'week': 7 * 12, 'month': 365}
+
+@app.route('/api/activity/<period>', methods=['GET'])
+@requires_mongo
+@cached_response()
+def get_activity_series(period):
+    """Возвращает ряд посещений и ответов из агрегатов daily_stats"""
+    try:
+        if period not in PERIODS:
+            return jsonify({
+                'success': False,
+                'error': f'period must be one of: {", ".join(PERIODS)}'
+            }), 400
+        
+        end = date.fromisoformat(request.args['end']) if 'end' in request.args else utc_today()
+        if 'start' in request.args:
+            start = date.fromisoformat(request.args['start'])
+        else:
+            start = end - timedelta(days=DEFAULT_SERIES_DAYS[period] - 1)
+        
+        if start > end or (end - start).days > 366 * 5:
+            return jsonify({'success': False, 'error': 'Invalid date range'}), 400
+        
+        user_id = request.args.get('user_id')
+        series = daily_stats_model.get_series(period, start, end, user_id)
+        
+        return {
+            'success': True,
+            'period': period,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'user_id': user_id,
+            'series': series
+        }
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # РАНГ
 @app.route('/api/ranking', methods=['GET'])
+@cached_response(tags=(LEADERBOARD_TAG,))
 def get_streak_ranking():
-    """Получает рейтинг стриков с пагинацией"""
+    """
+    Получает рейтинг стриков с пагинацией
+    ---
+    tags:
+      - Рейтинги
+    summary: Рейтинг стриков
+    description: |
+      Пользователи по убыванию текущего стрика. search ищет по началу
+      user_id (префикс, регистр не важен), а не по любой подстроке: так
+      строковые и бинарные id находятся одинаково и поиск идет по индексу.
+    parameters:
+      - in: query
+        name: page
+        type: integer
+        default: 1
+      - in: query
+        name: per_page
+        type: integer
+        default: 20
+        description: От 1 до 100
+      - in: query
+        name: search
+        type: string
+        description: Начало user_id
+        example: "3f2a"
+    responses:
+      200:
+        description: Страница рейтинга и пагинация
+    """
     try:
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
@@ -214,12 +405,12 @@ def get_streak_ranking():
         
         ranking_data = streak_model.get_streak_ranking(page, per_page, search)
         
-        return jsonify({
+        return {
             'success': True,
             'ranking': ranking_data['ranking'],
             'pagination': ranking_data['pagination'],
             'timestamp': datetime.now().isoformat()
-        }), 200
+        }
         
     except Exception as e:
         return jsonify({
@@ -228,6 +419,7 @@ def get_streak_ranking():
         }), 500
 
 @app.route('/api/ranking/top', methods=['GET'])
+@cached_response(tags=(LEADERBOARD_TAG,))
 def get_top_streaks():
     """Получает топ стриков"""
     try:
@@ -238,12 +430,12 @@ def get_top_streaks():
         
         top_streaks = streak_model.get_top_streaks(limit)
         
-        return jsonify({
+        return {
             'success': True,
             'top_streaks': top_streaks,
             'limit': limit,
             'timestamp': datetime.now().isoformat()
-        }), 200
+        }
         
     except Exception as e:
         return jsonify({
@@ -280,6 +472,57 @@ def get_user_rank():
 # КОНЕЦ РАНГОВ
 
 
+# СТРИК ЗАХОДА
+@app.route('/api/streak/visit', methods=['POST'])
+def track_streak_visit():
+    """Отмечает заход пользователя за сегодня и обновляет его стрик"""
+    try:
+        user = get_authenticated_user()
+        if not user:
+            return jsonify({'success': False, 'error': 'Invalid user'}), 401
+        
+        streak_info, changed = streak_model.record_visit(user['user_id'])
+        if changed:
+            # Повторный заход за день рейтинг не меняет — кэш остается
+            invalidate(LEADERBOARD_TAG)
+        
+        return jsonify({
+            'success': True,
+            'user_id': user['user_id'],
+            'streak_info': streak_info,
+            'today': date.today().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/streak', methods=['GET'])
+def get_streak_info():
+    """Получает информацию о текущем стрике пользователя"""
+    try:
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({'success': False, 'error': 'user_id is required'}), 400
+        
+        streak_info = streak_model.get_streak_info(user_id)
+        
+        return jsonify({
+            'success': True,
+            'user_id': user_id,
+            'streak_info': streak_info,
+            'today': date.today().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 # ВЫВОД КАРТОЧЕК
 @app.route('/cards', methods=['GET'])
 def get_random_words():
@@ -295,6 +538,25 @@ def get_random_words():
       Правила обработки:
       - Если определение содержит "1.", оно заменяется на определение из случайного другого слова
       - Удаляются служебные слова: разг, прост, межд, част, сущ, гл, прил, нареч, пр
+      
+      Сложность: по пометам словаря (source=static) или по ответам
+      пользователей (source=empirical, только карточки с достаточным числом ответов).
+      order=difficulty сортирует карточки от самых трудных по последним ответам.
+    parameters:
+      - in: query
+        name: difficulty
+        type: string
+        enum: [easy, medium, hard]
+      - in: query
+        name: source
+        type: string
+        enum: [static, empirical]
+        default: static
+      - in: query
+        name: order
+        type: string
+        enum: [random, difficulty]
+        default: random
     responses:
       200:
         description: Успешный запрос, возвращает 100 случайных слов
@@ -334,76 +596,209 @@ def get_random_words():
               example: "Internal server error"
     """
     try:
-      # Получаем 100 случайных слов
-      words = list(words_collection.aggregate([
-          {'$sample': {'size': 100}}
-      ]))
+      difficulty = request.args.get('difficulty')
+      difficulty_source = request.args.get('source', 'static')
+      order = request.args.get('order', 'random')
+      if difficulty and difficulty not in DIFFICULTIES:
+          return json_response({'success': False, 'error': 'Unknown difficulty'}, status=400)
+      if difficulty_source not in ('static', 'empirical') or order not in ('random', 'difficulty'):
+          return json_response({'success': False, 'error': 'Unknown source or order'}, status=400)
       
-      # Получаем все слова, у которых в definitions нет "1." (для замены)
-      words_without_numbers = list(words_collection.find({
-          'definitions': {'$not': {'$regex': '1\\.'}}
-      }, {'definitions': 1, 'word': 1}))
+      with_stats = difficulty_source == 'empirical' or order == 'difficulty'
+      if with_stats and card_stats_model is None:
+          return json_response({'success': False, 'error': 'Not available with in-memory storage'}, status=503)
+      
+      if difficulty and difficulty_source == 'empirical':
+          # Карточки нужной сложности выбираются по card_stats, слова — одним запросом по _id
+          words = words_repository.find_by_ids(card_stats_model.sample_ids(difficulty, CARDS_COUNT))
+      else:
+          # Получаем 100 случайных слов
+          words = words_repository.sample(CARDS_COUNT, difficulty)
+      
+      stats = card_stats_model.get_stats(str(word['_id']) for word in words) if with_stats else None
       
-      processed_words = []
+      # Получаем все слова, у которых в definitions нет "1." (для замены)
+      words_without_numbers = words_repository.replacement_candidates()
       
-      for word in words:
-          processed_word = {
-              'id': str(word.get('_id', '')),
-              'word': word.get('word', ''),
-              'definitions': word.get('definitions', []),
-              'difficulty': word.get('difficulty', 'easy'),
-              'changed_from': None  # По умолчанию null
-          }
-          
-          # Проверяем, содержит ли definitions "1."
-          contains_numbered = any('1.' in definition for definition in processed_word['definitions'])
-          
-          # Если содержит, заменяем definitions на случайные из слова без "1."
-          if contains_numbered and words_without_numbers:
-              # Выбираем случайное слово из списка слов без "1."
-              random_word = random.choice(words_without_numbers)
-              processed_word['definitions'] = random_word.get('definitions', [])
-              processed_word['changed_from'] = str(random_word['_id'])  # ID слова, откуда взяли definitions
-          
-          # Удаляем нежелательные слова из definitions
-          filtered_definitions = []
-          for definition in processed_word['definitions']:
-              # Удаляем слова из первого списка
-              for word_to_remove in REMOVE_WORDS_1:
-                  definition = re.sub(r'\b' + word_to_remove + r'\b', '', definition, flags=re.IGNORECASE)
-              
-              # Удаляем слова из второго списка
-              for word_to_remove in REMOVE_WORDS_2:
-                  definition = re.sub(r'\b' + word_to_remove + r'\b', '', definition, flags=re.IGNORECASE)
-              
-              # Очищаем от лишних пробелов и запятых
-              definition = re.sub(r'\s+', ' ', definition).strip()
-              definition = re.sub(r'^,\s*|\s*,$', '', definition)
-              
-              # Добавляем только непустые определения
-              if definition:
-                  filtered_definitions.append(definition)
-          
-          processed_word['definitions'] = filtered_definitions
-          
-          # Добавляем обработанное слово в результат
-          processed_words.append(processed_word)
+      processed_words = build_cards(words, words_without_numbers, stats, order=order)
       
-      # Создаем ответ с правильной кодировкой
-      response_data = json.dumps({
+      # Сериализация в UTF-8 без экранирования кириллицы
+      return json_response({
           'success': True,
           'words': processed_words
-      }, ensure_ascii=False)
-      
-      return Response(response_data, mimetype='application/json; charset=utf-8')
+      })
     
     except Exception as e:
-        error_response = json.dumps({
+        return json_response({
             'success': False,
             'error': str(e)
-        }, ensure_ascii=False)
+        }, status=500)
+
+@app.route('/words/search', methods=['GET'])
+@requires_mongo
+def search_words():
+    """
+    Поиск татарских слов по началу слова (автодополнение)
+    ---
+    tags:
+      - Слова
+    summary: Поиск слов по префиксу
+    description: |
+      Возвращает до limit слов, начинающихся с q. Регистр, ударения и
+      латинские двойники букв не важны; ввод без татарских букв
+      (а вместо ә, о вместо ө и т.д.) тоже находит слова.
+    parameters:
+      - in: query
+        name: q
+        type: string
+        required: true
+        example: "сәл"
+      - in: query
+        name: limit
+        type: integer
+        default: 10
+    responses:
+      200:
+        description: Найденные слова
+      400:
+        description: Не указан запрос
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'q is required'}), 400
+        
+        limit = int(request.args.get('limit', 10))
+        if limit < 1 or limit > 50:
+            limit = 10
+        
+        results, source = word_index.search(query, limit)
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'source': source
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/words/reverse', methods=['GET'])
+@requires_mongo
+def reverse_search_words():
+    """
+    Обратный поиск: татарские слова по русскому переводу
+    ---
+    tags:
+      - Слова
+    summary: Поиск слов по тексту определений
+    description: |
+      Возвращает слова, в определениях которых встречаются все слова запроса
+      (с учетом окончаний), по убыванию релевантности.
+    parameters:
+      - in: query
+        name: q
+        type: string
+        required: true
+        example: "книга"
+      - in: query
+        name: limit
+        type: integer
+        default: 10
+    responses:
+      200:
+        description: Найденные слова
+      400:
+        description: Не указан запрос
+      503:
+        description: Индекс еще строится
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'q is required'}), 400
+        
+        limit = int(request.args.get('limit', 10))
+        if limit < 1 or limit > 50:
+            limit = 10
+        
+        results, backend = definition_index.search(query, limit)
+        if results is None:
+            return jsonify({'success': False, 'error': 'Search index is loading'}), 503
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'backend': backend
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/quiz', methods=['GET'])
+@requires_mongo
+def get_quiz():
+    """
+    Вопросы с вариантами ответа
+    ---
+    tags:
+      - Слова
+    summary: Получить вопросы с вариантами ответа
+    description: |
+      Возвращает n вопросов: татарское слово и k вариантов перевода, один из
+      которых правильный (answer_index). Неправильные варианты заранее
+      подобраны из слов той же сложности (python jobs.py build-quiz).
+    parameters:
+      - in: query
+        name: n
+        type: integer
+        default: 10
+      - in: query
+        name: k
+        type: integer
+        default: 4
+        description: Число вариантов ответа (2-9)
+      - in: query
+        name: difficulty
+        type: string
+        enum: [easy, medium, hard]
+    responses:
+      200:
+        description: Вопросы
+      400:
+        description: Неизвестная сложность
+    """
+    try:
+        count = int(request.args.get('n', 10))
+        if count < 1 or count > 100:
+            count = 10
+        
+        options = int(request.args.get('k', 4))
+        if options < 2 or options > MAX_DISTRACTORS + 1:
+            options = 4
         
-        return Response(error_response, status=500, mimetype='application/json; charset=utf-8')
+        difficulty = request.args.get('difficulty')
+        if difficulty and difficulty not in DIFFICULTIES:
+            return jsonify({'success': False, 'error': 'Unknown difficulty'}), 400
+        
+        return json_response({
+            'success': True,
+            'questions': quiz_model.get_questions(count, options, difficulty)
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, status=500)
 
 @app.route('/answer', methods=['POST'])
 def submit_answer():
@@ -436,8 +831,8 @@ def submit_answer():
               example: "987fcdeb-51a2-43d1-b789-123456789abc"
             card_id:
               type: string
-              format: uuid
-              example: "456e7890-e89b-12d3-a456-426614174001"
+              description: ObjectId слова (id карточки из /cards)
+              example: "6ad66cd01b86e75597a04b6d"
             is_correct:
               type: boolean
               example: true
@@ -450,6 +845,8 @@ def submit_answer():
             success:
               type: boolean
               example: true
+      400:
+        description: card_id не является ObjectId
       401:
         description: Неверный пользователь или токен
         schema:
@@ -463,46 +860,204 @@ def submit_answer():
               example: "Invalid user"
     """
     data = request.get_json()
-    user_id = data.get('user_id')
-    token = data.get('token')
     card_id = data.get('card_id')
     is_correct = data.get('is_correct')
     
     # Проверка пользователя
-    user = users_collection.find_one({'user_id': user_id, 'token': token})
+    user = get_authenticated_user()
     if not user:
         return jsonify({'success': False, 'error': 'Invalid user'}), 401
+    user_id = user['user_id']
     
-    # Сохранение ответа
-    answer_data = {
-        'user_id': user_id,
-        'card_id': card_id,
-        'is_correct': is_correct,
-        'answered_at': datetime.utcnow()
-    }
+    # card_id — id слова; иначе он попал бы в фильтр upsert card_stats как есть
+    if not isinstance(card_id, str) or not ObjectId.is_valid(card_id):
+        return jsonify({'success': False, 'error': 'Invalid card_id'}), 400
     
-    answers_collection.insert_one(answer_data)
+    # Сохранение ответа (answers или answer_buckets, см. ANSWER_STORAGE)
+    answer_store.record(user_id, card_id, is_correct)
+    if daily_stats_model is not None:
+        daily_stats_model.record_answer(user_id, is_correct)
+        card_stats_model.record_answer(card_id, is_correct)
     
     # Обновление статистики пользователя
-    update_data = {
-        '': {'total_questions': 1}
-    }
-    
-    if is_correct:
-        update_data['']['correct_answers'] = 1
-        update_data['']['current_streak'] = 1
-        update_data[''] = {'max_streak': user.get('current_streak', 0) + 1}
-    else:
-        update_data[''] = {'current_streak': 0}
-    
-    users_collection.update_one(
-        {'user_id': user_id}, 
-        update_data
-    )
+    users_repository.record_answer(user_id, is_correct)
+    invalidate(user_tag(user_id))
     
     return jsonify({'success': True})
 
+@app.route('/logout', methods=['POST'])
+def logout():
+    """
+    Отзыв подписанного токена
+    ---
+    tags:
+      - Пользователи
+    summary: Отозвать текущий токен
+    description: |
+      Подписанный токен перестает приниматься (в других процессах — после
+      обновления списка отозванных токенов). Для старых UUID токенов ничего не делает.
+    responses:
+      200:
+        description: Токен отозван
+      401:
+        description: Неверный пользователь или токен
+    """
+    try:
+        user = get_authenticated_user()
+        if not user:
+            return jsonify({'success': False, 'error': 'Invalid user'}), 401
+        
+        claims = user.get('claims')
+        if claims:
+            expires_at = None
+            if tokens.TOKEN_MAX_AGE:
+                expires_at = datetime.utcfromtimestamp(claims['iat'] + tokens.TOKEN_MAX_AGE)
+            token_revocations.revoke(claims['token_id'], claims['user_id'], expires_at)
+        
+        return jsonify({'success': True, 'revoked': bool(claims)}), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ИСТОРИЯ ОТВЕТОВ
+@app.route('/api/user-answers/<user_id>', methods=['GET'])
+def get_user_answers(user_id):
+    """
+    История ответов пользователя
+    ---
+    tags:
+      - Ответы
+    summary: Страница истории ответов, новые первыми
+    description: |
+      Постраничная выдача по курсору: next_cursor из ответа передается
+      в параметре cursor для следующей страницы (null — страниц больше нет).
+    parameters:
+      - in: path
+        name: user_id
+        type: string
+        required: true
+      - in: query
+        name: limit
+        type: integer
+        default: 50
+      - in: query
+        name: cursor
+        type: string
+      - in: query
+        name: correct
+        type: boolean
+        description: Только верные (true) или только неверные (false) ответы
+    responses:
+      200:
+        description: Страница истории
+      400:
+        description: Неверный курсор
+    """
+    try:
+        limit = int(request.args.get('limit', 50))
+        if limit < 1 or limit > 200:
+            limit = 50
+        
+        correct = request.args.get('correct')
+        is_correct = None if correct is None else correct.lower() in ('1', 'true', 'yes')
+        
+        try:
+            answers, next_cursor = answer_store.history(
+                user_id, limit, request.args.get('cursor'), is_correct
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Слова для страницы — одним запросом по _id
+        words = {
+            str(doc['_id']): doc.get('word')
+            for doc in words_repository.find_by_ids([answer['card_id'] for answer in answers], {'word': 1})
+        }
+        for answer in answers:
+            answer['word'] = words.get(answer['card_id'])
+        
+        return jsonify({
+            'success': True,
+            'user_id': user_id,
+            'answers': answers,
+            'next_cursor': next_cursor
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/user-answers/stats/<user_id>', methods=['GET'])
+def get_user_answer_stats(user_id):
+    """
+    Статистика ответов пользователя
+    ---
+    tags:
+      - Статистика
+    summary: Всего ответов, верных, неверных, точность и ряд по дням
+    description: |
+      Итоги считаются одной группировкой по индексу user_id (в режиме
+      бакетов — по их счетчикам), ряд по дням берется из daily_stats.
+      При STORAGE_BACKEND=memory оба считаются по ответам в памяти.
+    parameters:
+      - in: path
+        name: user_id
+        type: string
+        required: true
+      - in: query
+        name: days
+        type: integer
+        default: 30
+    responses:
+      200:
+        description: Статистика
+    """
+    try:
+        days = int(request.args.get('days', 30))
+        if days < 1 or days > 365:
+            days = 30
+        
+        totals = answer_store.user_stats(user_id)
+        end = utc_today()
+        start = end - timedelta(days=days - 1)
+        if daily_stats_model is not None:
+            series = daily_stats_model.get_series('day', start, end, user_id)
+        else:
+            series = answer_store.daily_series(user_id, start, end)
+        
+        return jsonify({
+            'success': True,
+            'user_id': user_id,
+            'stats': {
+                'total': totals['total_answers'],
+                'correct': totals['correct_answers'],
+                'incorrect': totals['total_answers'] - totals['correct_answers'],
+                'accuracy': totals['accuracy'],
+                'daily': [
+                    {
+                        'date': item['period_start'],
+                        'answers': item['answers'],
+                        'correct': item['corrects'],
+                        'accuracy': item['accuracy']
+                    }
+                    for item in series
+                ]
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/rating/words', methods=['GET'])
+@cached_response(tags=(LEADERBOARD_TAG,))
 def get_rating_by_words():
     """
     Рейтинг по изученным словам
@@ -533,46 +1088,18 @@ def get_rating_by_words():
                     type: integer
                     example: 15
     """
-    pipeline = [
-        {
-            '': {
-                'from': 'answers',
-                'localField': 'user_id',
-                'foreignField': 'user_id',
-                'as': 'answers'
-            }
-        },
-        {
-            '': {
-                'correct_words': {
-                    '': {
-                        '': {
-                            'input': '',
-                            'cond': {'': ['requirements.txtthis.is_correct', True]}
-                        }
-                    }
-                }
-            }
-        },
-        {
-            '': {'correct_words': -1}
-        },
-        {
-            '': {
-                'user_id': 1,
-                'correct_words': 1,
-                '_id': 0
-            }
-        }
+    # Счетчик correct_answers ведет /answer, поэтому answers не сканируется
+    rating = [
+        {'user_id': user['user_id'], 'correct_words': user['correct_answers']}
+        for user in users_repository.rating_by_correct()
     ]
-    
-    rating = list(users_collection.aggregate(pipeline))
-    return jsonify({
+    return {
         'success': True,
         'rating': rating
-    })
+    }
 
 @app.route('/rating/streak', methods=['GET'])
+@cached_response(tags=(LEADERBOARD_TAG,))
 def get_rating_by_streak():
     """
     Рейтинг по максимальному стрику
@@ -603,15 +1130,10 @@ def get_rating_by_streak():
                     type: integer
                     example: 8
     """
-    users = list(users_collection.find(
-        {}, 
-        {'user_id': 1, 'max_streak': 1, '_id': 0}
-    ).sort('max_streak', -1))
-    
-    return jsonify({
+    return {
         'success': True,
-        'rating': users
-    })
+        'rating': users_repository.rating_by_max_streak()
+    }
 
 @app.route('/stats/<user_id>', methods=['GET'])
 def get_user_stats(user_id):
@@ -678,15 +1200,15 @@ def get_user_stats(user_id):
               type: string
               example: "User not found"
     """
-    user = users_collection.find_one(
-        {'user_id': user_id}, 
-        {'_id': 0, 'token': 0}
+    user = stats_cache.get_or_set(
+        user_id, lambda: users_repository.get_stats(user_id), tags=(user_tag(user_id),)
     )
     
     if not user:
         return jsonify({'success': False, 'error': 'User not found'}), 404
     
-    return jsonify({
+    # ETag позволяет клиенту не скачивать статистику повторно, если она не изменилась
+    return conditional_json({
         'success': True,
         'stats': user
     })
@@ -719,9 +1241,135 @@ def health_check():
         'timestamp': datetime.utcnow().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Метрики в формате Prometheus
+    ---
+    tags:
+      - Система
+    summary: Метрики сервера
+    description: Время обработки запросов по маршрутам, команды и пулы MongoDB, очереди фоновых задач
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Метрики в текстовом формате Prometheus
+    """
+    return app.response_class(metrics.registry.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+# СЛУЖЕБНЫЕ
+@app.route('/admin/slow-queries', methods=['GET'])
+@requires_mongo
+def slow_queries():
+    """
+    Медленные команды MongoDB по формам запросов
+    ---
+    tags:
+      - Система
+    summary: Медленные запросы
+    description: Формы команд дольше SLOW_QUERY_MS, отсортированные по суммарному времени, с планом explain (collscan — полный просмотр коллекции). Требует ADMIN_TOKEN.
+    parameters:
+      - name: X-Admin-Token
+        in: header
+        type: string
+        required: true
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+      - name: hours
+        in: query
+        type: integer
+        description: Только записи за последние N часов
+    responses:
+      200:
+        description: Формы команд
+      403:
+        description: Нет доступа
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        hours = request.args.get('hours', type=int)
+        since = datetime.utcnow() - timedelta(hours=hours) if hours else None
+        
+        shapes = slow_query_log.top_shapes(limit=limit, since=since)
+        return jsonify({
+            'success': True,
+            'threshold_ms': SLOW_QUERY_MS,
+            'shapes': shapes
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/profiles', methods=['GET', 'DELETE'])
+def profiles():
+    """
+    Профили запросов по маршрутам
+    ---
+    tags:
+      - Система
+    summary: Выборочный профилировщик
+    description: GET — маршруты с числом профилированных запросов и выборок, DELETE — очистить профили. Запрос профилируется с заголовком X-Profile 1 (и X-Admin-Token) или с вероятностью PROFILE_SAMPLE_RATE. Требует ADMIN_TOKEN.
+    parameters:
+      - name: X-Admin-Token
+        in: header
+        type: string
+        required: true
+    responses:
+      200:
+        description: Список маршрутов
+      403:
+        description: Нет доступа
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    if request.method == 'DELETE':
+        profiler.reset()
+        return jsonify({'success': True})
+    return jsonify({'success': True, 'routes': profiler.summary()})
+
+@app.route('/admin/profiles/folded', methods=['GET'])
+def profile_folded():
+    """
+    Стеки профиля в folded формате
+    ---
+    tags:
+      - Система
+    summary: Скачать профиль для flame graph
+    description: Строки "кадр;кадр;... число", для flamegraph.pl или speedscope. Без route — все маршруты, маршрут первым кадром. Требует ADMIN_TOKEN.
+    produces:
+      - text/plain
+    parameters:
+      - name: X-Admin-Token
+        in: header
+        type: string
+        required: true
+      - name: route
+        in: query
+        type: string
+        example: "/cards"
+    responses:
+      200:
+        description: Стеки в folded формате
+      403:
+        description: Нет доступа
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    route = request.args.get('route')
+    filename = (route or 'all').strip('/').replace('/', '_') or 'root'
+    return app.response_class(
+        profiler.folded(route),
+        content_type='text/plain; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename={filename}.folded'}
+    )
+
 if __name__ == '__main__':
     # Создание тестовых карточек при запуске
-    if cards_collection.count_documents({}) == 0:
+    if storage.backend == 'mongo' and cards_collection.count_documents({}) == 0:
         test_cards = [
             {
                 'card_id': str(uuid.uuid4()),
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк сборки карточек /cards (utils/cards.py)
+
+Без базы данных прогоняет то же, что get_random_words после запросов:
+проверку нумерованных определений, замену, очистку помет регулярными
+выражениями (для документов без clean_definitions) и сериализацию orjson.
+Печатает время на карточку, долю времени регулярных выражений и выделения
+памяти (tracemalloc). С --baseline сравнивает с сохраненным прогоном и
+завершается с кодом 1, если время на карточку выросло больше --threshold.
+
+Пример:
+    python benchmarks/bench_cards.py --json cards.json
+    python benchmarks/bench_cards.py --legacy 1.0 --baseline cards.json --threshold 0.15
+    python benchmarks/bench_cards.py --words-dir words
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+
+from benchmarks.bench_normalization import real_documents  # noqa: E402
+from benchmarks.seed_data import generate_words  # noqa: E402
+from utils import cards as cards_module  # noqa: E402
+from utils.json_provider import dumps_bytes  # noqa: E402
+from utils.normalization import normalize_definitions  # noqa: E402
+
+CARDS_COUNT = 100
+
+
+def prepare(documents, legacy, rng):
+    """
+    Документы как из базы: _id и, кроме доли legacy, очищенные при импорте
+    определения. Возвращает (все слова, слова без "1." для замены).
+    """
+    words = []
+    for document in documents:
+        word = {'_id': ObjectId(), 'word': document['word'], 'definitions': document['definitions']}
+        cleaned, difficulty = normalize_definitions(document['definitions'])
+        word['difficulty'] = difficulty
+        if rng.random() >= legacy:
+            word['clean_definitions'] = cleaned
+        words.append(word)
+    replacements = [word for word in words if not cards_module.has_numbered_definitions(word)]
+    return words, replacements
+
+
+class TimedDefinitions:
+    """Обертка card_definitions: время очистки регулярными выражениями"""
+
+    def __init__(self, original):
+        self.original = original
+        self.seconds = 0.0
+        self.calls = 0
+
+    def __call__(self, document):
+        if document.get('clean_definitions') is not None:
+            return self.original(document)
+        started = time.perf_counter()
+        try:
+            return self.original(document)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.calls += 1
+
+
+def run_request(words, replacements, rng):
+    sample = rng.sample(words, min(CARDS_COUNT, len(words)))
+    started = time.perf_counter()
+    cards = cards_module.build_cards(sample, replacements, rng=rng)
+    built = time.perf_counter()
+    body = dumps_bytes({'success': True, 'words': cards})
+    return len(cards), built - started, time.perf_counter() - built, len(body)
+
+
+def measure_allocations(words, replacements, rng, requests=20):
+    """Пик памяти и число выделенных блоков на запрос"""
+    tracemalloc.start()
+    try:
+        peaks = []
+        blocks = []
+        for _ in range(requests):
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            current_before = tracemalloc.get_traced_memory()[0]
+            run_request(words, replacements, rng)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current_before)
+            after = tracemalloc.take_snapshot()
+            blocks.append(sum(
+                max(stat.count_diff, 0) for stat in after.compare_to(before, 'lineno')
+            ))
+        return {
+            'peak_bytes_per_request': int(statistics.median(peaks)),
+            'blocks_per_request': int(statistics.median(blocks)),
+        }
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Микробенчмарк сборки карточек /cards')
+    parser.add_argument('--words', type=int, default=20000, help='размер синтетического словаря')
+    parser.add_argument('--words-dir', help='взять слова из JSON файлов словаря')
+    parser.add_argument('--legacy', type=float, default=0.0,
+                        help='доля слов без clean_definitions (очищаются при каждом запросе)')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='сохранить результат в файл')
+    parser.add_argument('--baseline', help='результат прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='допустимый рост времени на карточку относительно baseline')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    if args.words_dir:
+        documents = real_documents(args.words_dir)
+    else:
+        documents = list(generate_words(args.words, rng))
+    words, replacements = prepare(documents, args.legacy, rng)
+
+    timed = TimedDefinitions(cards_module.card_definitions)
+    cards_module.card_definitions = timed
+    try:
+        # Прогрев: компиляция шаблонов, кэши
+        for _ in range(10):
+            run_request(words, replacements, rng)
+        timed.seconds, timed.calls = 0.0, 0
+
+        per_card = []
+        build_total = serialize_total = 0.0
+        cards_total = body_total = 0
+        for _ in range(args.requests):
+            count, build, serialize, size = run_request(words, replacements, rng)
+            per_card.append((build + serialize) / count * 1e6)
+            build_total += build
+            serialize_total += serialize
+            cards_total += count
+            body_total += size
+    finally:
+        cards_module.card_definitions = timed.original
+
+    result = {
+        'words': len(words),
+        'replacements': len(replacements),
+        'legacy_fraction': args.legacy,
+        'requests': args.requests,
+        'us_per_card': round(statistics.median(per_card), 3),
+        'us_per_card_p95': round(sorted(per_card)[int(len(per_card) * 0.95) - 1], 3),
+        'build_us_per_card': round(build_total / cards_total * 1e6, 3),
+        'serialize_us_per_card': round(serialize_total / cards_total * 1e6, 3),
+        'regex_share_of_build': round(timed.seconds / build_total, 3) if build_total else 0,
+        'regex_cleanings_per_request': round(timed.calls / args.requests, 1),
+        'response_bytes': body_total // args.requests,
+        'memory': measure_allocations(words, replacements, rng),
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        change = (result['us_per_card'] - baseline['us_per_card']) / baseline['us_per_card']
+        result['change_vs_baseline'] = round(change, 3)
+        if change > args.threshold:
+            status = 1
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+    if status:
+        print(f"❌ Регрессия: время на карточку выросло на {result['change_vs_baseline'] * 100:.1f}% "
+              f"(порог {args.threshold * 100:.0f}%)", file=sys.stderr)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк нормализации определений (utils/normalization.py)
+
+Считает скорость очистки и классификации в определениях в секунду
+для одного процесса и для пула процессов, а также в пересчете на ядро.
+
+Пример:
+    python benchmarks/bench_normalization.py --definitions 1000000 --workers 1 2 4
+    python benchmarks/bench_normalization.py --words-dir words
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from import_words import iter_json_object  # noqa: E402
+from utils.normalization import DEFAULT_CHUNK_SIZE, normalize_documents  # noqa: E402
+
+LABELS = ['разг.', 'прост.', 'межд.', 'част.', 'сущ.', 'гл.', 'прил.', 'нареч.', 'пр.']
+RUSSIAN_WORDS = [
+    'дом', 'книга', 'вода', 'приветствие', 'здравствуйте', 'школа', 'лошадь',
+    'дружба', 'уважение', 'память', 'глаз', 'прилагательное', 'частица', 'простой',
+]
+
+
+def synthetic_documents(count, seed=42):
+    """Синтетические слова со служебными пометами, как в словаре"""
+    rng = random.Random(seed)
+    documents = []
+    produced = 0
+    while produced < count:
+        definitions = []
+        for _ in range(rng.randint(1, 4)):
+            parts = [rng.choice(LABELS)] if rng.random() < 0.6 else []
+            parts += rng.choices(RUSSIAN_WORDS, k=rng.randint(1, 6))
+            definitions.append(', '.join(parts))
+        produced += len(definitions)
+        documents.append({'word': f'сүз{len(documents)}', 'definitions': definitions})
+    return documents
+
+
+def real_documents(words_dir, limit=None):
+    """Слова из JSON файлов словаря"""
+    documents = []
+    for path in sorted(glob.glob(os.path.join(words_dir, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as file:
+            for word, definitions in iter_json_object(file):
+                documents.append({'word': word, 'definitions': definitions})
+                if limit and len(documents) >= limit:
+                    return documents
+    return documents
+
+
+def run(documents, workers, chunk_size):
+    """Прогоняет нормализацию и возвращает определения в секунду"""
+    total = sum(len(doc['definitions']) for doc in documents)
+    # Копии, чтобы каждый прогон начинался с сырых документов
+    fresh = ({'word': doc['word'], 'definitions': doc['definitions']} for doc in documents)
+    started = time.perf_counter()
+    for _ in normalize_documents(fresh, workers=workers, chunk_size=chunk_size):
+        pass
+    elapsed = time.perf_counter() - started
+    return {
+        'workers': workers,
+        'definitions': total,
+        'seconds': round(elapsed, 3),
+        'definitions_per_second': round(total / elapsed),
+        'definitions_per_second_per_core': round(total / elapsed / workers),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк нормализации определений')
+    parser.add_argument('--definitions', type=int, default=200000,
+                        help='число синтетических определений')
+    parser.add_argument('--words-dir', help='взять слова из JSON файлов словаря')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args(argv)
+
+    if args.words_dir:
+        documents = real_documents(args.words_dir)
+    else:
+        documents = synthetic_documents(args.definitions)
+
+    results = [run(documents, workers, args.chunk_size) for workers in args.workers]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            print(
+                f"workers={result['workers']:<3} {result['definitions']} определений "
+                f"за {result['seconds']} с: {result['definitions_per_second']}/с, "
+                f"{result['definitions_per_second_per_core']}/с на ядро"
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк обратного поиска по определениям (models/definition_search.py)
+
+Строит InvertedIndex на синтетическом корпусе размера словаря (или на словах
+из JSON файлов), печатает отчет о памяти и задержки AND-запросов из 1-3 слов.
+
+Пример:
+    python benchmarks/bench_reverse_index.py --words 150000 --queries 5000
+    python benchmarks/bench_reverse_index.py --words-dir words --json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_normalization import real_documents  # noqa: E402
+from models.definition_search import InvertedIndex  # noqa: E402
+from utils.normalization import card_definitions, tokenize_russian  # noqa: E402
+
+SYLLABLES = [
+    'ка', 'ло', 'ми', 'ра', 'ст', 'но', 'ве', 'пр', 'до', 'ни', 'ку', 'ль',
+    'та', 'ре', 'зо', 'бы', 'ск', 'жи', 'че', 'го', 'ту', 'вя', 'ше', 'ин',
+]
+ENDINGS = ['а', 'ы', 'у', 'ой', 'ый', 'ая', 'ть', 'ение', 'ость', '']
+
+
+def synthetic_corpus(count, vocabulary=40000, seed=42):
+    """Корпус с распределением слов по закону Ципфа, как в естественном тексте"""
+    rng = random.Random(seed)
+    stems = list({
+        ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(vocabulary)
+    })
+    # Накопленные веса считаем один раз: с weights choices пересчитывает их при каждом вызове
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(stems))))
+    corpus = []
+    for number in range(count):
+        definitions = []
+        for _ in range(rng.randint(1, 3)):
+            tokens = rng.choices(stems, cum_weights=cum_weights, k=rng.randint(1, 6))
+            definitions.append(' '.join(token + rng.choice(ENDINGS) for token in tokens))
+        corpus.append((f'{number:024x}', f'сүз{number}', definitions))
+    return corpus
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк инвертированного индекса')
+    parser.add_argument('--words', type=int, default=150000, help='размер синтетического корпуса')
+    parser.add_argument('--words-dir', help='взять слова из JSON файлов словаря')
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args(argv)
+
+    if args.words_dir:
+        corpus = [
+            (str(number), doc['word'], card_definitions(doc))
+            for number, doc in enumerate(real_documents(args.words_dir))
+        ]
+    else:
+        corpus = synthetic_corpus(args.words)
+
+    started = time.perf_counter()
+    index = InvertedIndex.build(corpus)
+    build_seconds = time.perf_counter() - started
+
+    # Запросы составляем из токенов реальных определений корпуса
+    rng = random.Random(args.seed)
+    queries = []
+    while len(queries) < args.queries:
+        _, _, definitions = rng.choice(corpus)
+        words = ' '.join(definitions).split()
+        if words:
+            queries.append(' '.join(rng.sample(words, k=min(len(words), rng.randint(1, 3)))))
+
+    latencies = []
+    hits = 0
+    for query in queries:
+        started = time.perf_counter()
+        hits += bool(index.search(query, args.limit))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    result = {
+        'words': len(corpus),
+        'build_seconds': round(build_seconds, 3),
+        'memory': index.memory_report(),
+        'queries': len(queries),
+        'hit_rate': round(hits / len(queries), 3),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 4),
+            'p50': round(percentile(latencies, 0.50), 4),
+            'p95': round(percentile(latencies, 0.95), 4),
+            'p99': round(percentile(latencies, 0.99), 4),
+        },
+        'tokenized_sample': tokenize_russian(queries[0]),
+    }
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        memory = result['memory']
+        print(f"Слов: {result['words']}, построение: {result['build_seconds']} с")
+        print(
+            f"Токенов: {memory['tokens']}, вхождений: {memory['postings']}, "
+            f"память: {memory['total_bytes'] / 1024 / 1024:.1f} МБ "
+            f"(списки {memory['postings_bytes'] / 1024 / 1024:.1f} МБ)"
+        )
+        latency = result['latency_ms']
+        print(
+            f"{result['queries']} запросов: mean {latency['mean']} мс, p50 {latency['p50']} мс, "
+            f"p95 {latency['p95']} мс, p99 {latency['p99']} мс"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
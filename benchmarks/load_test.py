@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест публичных эндпоинтов
+
+Сценарии повторяют поведение клиента (см. SCENARIOS), например session:
+регистрация → карточки → ответы → статистика → рейтинги. Нагрузка подается
+в двух режимах:
+- closed: --concurrency потоков выполняют сценарии друг за другом;
+- open: сценарии запускаются с частотой --rate в секунду (пуассоновский поток)
+  независимо от того, успевает ли сервер; время сценария считается от
+  запланированного старта, поэтому очередь на клиенте не прячет задержки.
+
+Отчет: p50/p95/p99 по каждому эндпоинту и пропускная способность, --json
+сохраняет его для сравнения коммитов, --baseline печатает разницу с прошлым
+прогоном. Данные готовит seed_data.py, сервер работает на той же базе.
+Внешних зависимостей нет: HTTP через http.client, с --in-process запросы идут
+в Flask test client без сети.
+
+Пример:
+    python benchmarks/seed_data.py
+    DATABASE_NAME=tatar_learning_bench python app.py
+    python benchmarks/load_test.py --scenario session --concurrency 8 --duration 30 --json run.json
+    python benchmarks/load_test.py --mode open --rate 50 --duration 30 --baseline run.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_reverse_index import percentile  # noqa: E402
+
+SEARCH_PREFIXES = ['а', 'ба', 'кы', 'сә', 'ту', 'ән', 'кар', 'ул']
+REVERSE_QUERIES = ['дом', 'вода', 'книга', 'школа дружба', 'память', 'простой глаз']
+
+
+class HttpClient:
+    """Соединение keep-alive одного потока"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, body=data, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError):
+            # Соединение разорвано — следующий запрос откроет новое
+            self.connection.close()
+            raise
+        return response.status, payload
+
+    def close(self):
+        self.connection.close()
+
+
+class InProcessClient:
+    """Flask test client: тот же сценарий без сети и отдельного сервера"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class Recorder:
+    """Задержки по эндпоинтам, общие для всех потоков"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self.latencies[name].append(seconds * 1000)
+            if not ok:
+                self.errors[name] += 1
+
+
+class Session:
+    """Выполняет запросы сценария и записывает их время под именем маршрута"""
+
+    def __init__(self, client, recorder, rng, users):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.users = users
+
+    def call(self, name, method, path, body=None, headers=None, params=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        started = time.perf_counter()
+        try:
+            status, payload = self.client.request(method, path, body, headers)
+        except Exception:
+            self.recorder.add(name, time.perf_counter() - started, False)
+            return None
+        self.recorder.add(name, time.perf_counter() - started, status < 400)
+        if status >= 400:
+            return None
+        try:
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def existing_user(self):
+        """Пользователь из seed_data.py (с историей ответов)"""
+        return self.rng.choice(self.users) if self.users else None
+
+
+def scenario_session(session, answers=5):
+    """Новый пользователь: регистрация → карточки → ответы → статистика → рейтинги"""
+    user = session.call('POST /register', 'POST', '/register')
+    if not user:
+        return
+    auth = {'Authorization': f"Bearer {user['token']}", 'X-User-Id': user['user_id']}
+
+    cards = session.call('GET /cards', 'GET', '/cards') or {}
+    for card in (cards.get('words') or [])[:answers]:
+        session.call('POST /answer', 'POST', '/answer', headers=auth, body={
+            'card_id': card['id'],
+            'is_correct': session.rng.random() < 0.7
+        })
+
+    session.call('POST /api/streak/visit', 'POST', '/api/streak/visit', headers=auth)
+    session.call('GET /stats/<user_id>', 'GET', f"/stats/{user['user_id']}")
+    session.call('GET /rating/words', 'GET', '/rating/words')
+    session.call('GET /rating/streak', 'GET', '/rating/streak')
+
+
+def scenario_cards(session):
+    """Только выдача карточек — самый тяжелый публичный эндпоинт"""
+    session.call('GET /cards', 'GET', '/cards')
+
+
+def scenario_rankings(session):
+    """Все рейтинги"""
+    session.call('GET /rating/words', 'GET', '/rating/words')
+    session.call('GET /rating/streak', 'GET', '/rating/streak')
+    session.call('GET /api/ranking', 'GET', '/api/ranking',
+                 params={'page': session.rng.randint(1, 5), 'per_page': 20})
+    session.call('GET /api/ranking/top', 'GET', '/api/ranking/top')
+
+
+def scenario_history(session):
+    """Существующий пользователь смотрит свою историю и статистику"""
+    user = session.existing_user()
+    if user is None:
+        return
+    user_id = user['user_id']
+    page = session.call('GET /api/user-answers/<user_id>', 'GET', f'/api/user-answers/{user_id}',
+                        params={'limit': 50})
+    if page and page.get('next_cursor'):
+        session.call('GET /api/user-answers/<user_id>', 'GET', f'/api/user-answers/{user_id}',
+                     params={'limit': 50, 'cursor': page['next_cursor']})
+    session.call('GET /api/user-answers/stats/<user_id>', 'GET', f'/api/user-answers/stats/{user_id}')
+    session.call('GET /stats/<user_id>', 'GET', f'/stats/{user_id}')
+
+
+def scenario_search(session):
+    """Поиск по словарю"""
+    session.call('GET /words/search', 'GET', '/words/search',
+                 params={'q': session.rng.choice(SEARCH_PREFIXES)})
+    session.call('GET /words/reverse', 'GET', '/words/reverse',
+                 params={'q': session.rng.choice(REVERSE_QUERIES)})
+
+
+SCENARIOS = {
+    'session': scenario_session,
+    'cards': scenario_cards,
+    'rankings': scenario_rankings,
+    'history': scenario_history,
+    'search': scenario_search,
+}
+# Смесь для --scenario mixed: доля каждого сценария
+MIXED_WEIGHTS = {'session': 2, 'cards': 4, 'rankings': 2, 'history': 1, 'search': 1}
+
+
+def pick_scenario(name, rng):
+    if name != 'mixed':
+        return name
+    names = list(MIXED_WEIGHTS)
+    return rng.choices(names, weights=[MIXED_WEIGHTS[item] for item in names])[0]
+
+
+def run_closed(make_client, recorder, args, users):
+    """concurrency потоков выполняют сценарии без пауз"""
+    deadline = time.perf_counter() + args.duration
+    completed = [0] * args.concurrency
+
+    def worker(number):
+        rng = random.Random(args.seed + number)
+        client = make_client()
+        session = Session(client, recorder, rng, users)
+        try:
+            while time.perf_counter() < deadline:
+                if args.iterations and completed[number] >= args.iterations:
+                    break
+                name = pick_scenario(args.scenario, rng)
+                started = time.perf_counter()
+                SCENARIOS[name](session)
+                recorder.add(f'scenario {name}', time.perf_counter() - started, True)
+                completed[number] += 1
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(completed)
+
+
+def run_open(make_client, recorder, args, users):
+    """Сценарии стартуют по расписанию с частотой rate, время — от запланированного старта"""
+    rng = random.Random(args.seed)
+    local = threading.local()
+    clients = []
+    clients_lock = threading.Lock()
+    # Поставленные, но еще не завершенные сценарии
+    in_flight = [0]
+    in_flight_lock = threading.Lock()
+    failures = []
+    dropped = 0
+    started = 0
+
+    def get_session():
+        if not hasattr(local, 'session'):
+            client = make_client()
+            with clients_lock:
+                clients.append(client)
+            local.session = Session(client, recorder, random.Random(args.seed + threading.get_ident()), users)
+        return local.session
+
+    def job(name, scheduled):
+        try:
+            SCENARIOS[name](get_session())
+        except Exception:
+            recorder.add(f'scenario {name}', time.perf_counter() - scheduled, False)
+            with in_flight_lock:
+                failures.append(traceback.format_exc())
+        else:
+            recorder.add(f'scenario {name}', time.perf_counter() - scheduled, True)
+        finally:
+            with in_flight_lock:
+                in_flight[0] -= 1
+
+    start = time.perf_counter()
+    scheduled = start
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        while True:
+            scheduled += rng.expovariate(args.rate)
+            if scheduled - start >= args.duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # Ограничиваем очередь, чтобы перегруженный сервер не копил бесконечный хвост
+            with in_flight_lock:
+                if in_flight[0] > args.concurrency * 100:
+                    dropped += 1
+                    continue
+                in_flight[0] += 1
+            executor.submit(job, pick_scenario(args.scenario, rng), scheduled)
+            started += 1
+    for client in clients:
+        client.close()
+    if dropped:
+        print(f'⚠️ Пропущено сценариев из-за переполнения очереди: {dropped}')
+    if failures:
+        print(f'❌ Сценариев с исключением: {len(failures)}, первое:\n{failures[0]}')
+    return started
+
+
+def summarize(recorder, elapsed, scenarios):
+    endpoints = {}
+    requests_total = 0
+    for name, values in sorted(recorder.latencies.items()):
+        if not name.startswith('scenario '):
+            requests_total += len(values)
+        endpoints[name] = {
+            'count': len(values),
+            'errors': recorder.errors.get(name, 0),
+            'mean_ms': round(statistics.mean(values), 3),
+            'p50_ms': round(percentile(values, 0.50), 3),
+            'p95_ms': round(percentile(values, 0.95), 3),
+            'p99_ms': round(percentile(values, 0.99), 3),
+            'max_ms': round(max(values), 3),
+        }
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'scenarios': scenarios,
+        'requests': requests_total,
+        'requests_per_second': round(requests_total / elapsed, 2) if elapsed else 0,
+        'scenarios_per_second': round(scenarios / elapsed, 2) if elapsed else 0,
+        'endpoints': endpoints,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result, baseline=None):
+    print(f"Сценариев: {result['scenarios']}, запросов: {result['requests']} "
+          f"за {result['elapsed_seconds']} с — {result['requests_per_second']} запр/с")
+    previous = (baseline or {}).get('endpoints', {})
+    print(f"{'эндпоинт':<42} {'n':>7} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, stats in result['endpoints'].items():
+        line = (f"{name:<42} {stats['count']:>7} {stats['errors']:>5} "
+                f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+        before = previous.get(name)
+        if before and before['p95_ms']:
+            change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            line += f"   p95 {change:+.1f}%"
+        print(line)
+    if baseline:
+        change = (result['requests_per_second'] - baseline['requests_per_second']) \
+            / max(baseline['requests_per_second'], 1e-9) * 100
+        print(f"Пропускная способность: {change:+.1f}% к {baseline.get('commit') or 'baseline'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API')
+    parser.add_argument('--url', default=os.getenv('BENCH_URL', 'http://127.0.0.1:5000'))
+    parser.add_argument('--in-process', action='store_true',
+                        help='вызывать приложение через Flask test client, без HTTP сервера')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS) + ['mixed'], default='session')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--concurrency', type=int, default=8, help='потоков (open: максимум одновременных)')
+    parser.add_argument('--rate', type=float, default=20, help='сценариев в секунду для --mode open')
+    parser.add_argument('--duration', type=float, default=30, help='длительность в секундах')
+    parser.add_argument('--iterations', type=int, default=0,
+                        help='closed: не больше стольких сценариев на поток (0 — без ограничения)')
+    parser.add_argument('--users-file', default=os.path.join('benchmarks', 'bench_users.json'))
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='сохранить результат в файл')
+    parser.add_argument('--baseline', help='сравнить с результатом прошлого прогона')
+    args = parser.parse_args(argv)
+
+    users = []
+    if os.path.exists(args.users_file):
+        with open(args.users_file, 'r', encoding='utf-8') as file:
+            users = json.load(file).get('users', [])
+    elif args.scenario in ('history', 'mixed'):
+        print(f'⚠️ {args.users_file} не найден: сценарий history пропускается (запустите seed_data.py)')
+
+    if args.in_process:
+        from app import app
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+    else:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+
+    recorder = Recorder()
+    runner = run_open if args.mode == 'open' else run_closed
+    started = time.perf_counter()
+    scenarios = runner(make_client, recorder, args, users)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(recorder, elapsed, scenarios)
+    result.update({
+        'commit': git_commit(),
+        'started_at': datetime.utcnow().isoformat(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'baseline')},
+    })
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+    print_report(result, baseline)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        print(f'📄 Результат: {args.json}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
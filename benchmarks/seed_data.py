@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Генератор тестовых данных для нагрузочных тестов
+
+Заполняет отдельную базу (по умолчанию tatar_learning_bench) детерминированным
+набором: слова словаря, пользователи со стриками и посещениями, история ответов.
+Одинаковый --seed дает одинаковые данные, поэтому прогоны разных коммитов
+сравнимы. После записи пересчитываются производные коллекции (card_stats,
+daily_stats, quiz_neighbours, бакеты ответов) теми же методами, что и jobs.py.
+
+Учетные данные пользователей пишутся в --users-out для load_test.py.
+Сервер для теста запускается на той же базе:
+    DATABASE_NAME=tatar_learning_bench python app.py
+
+Пример:
+    python benchmarks/seed_data.py --users 1000 --words 20000 --answers 200000
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_normalization import LABELS, RUSSIAN_WORDS  # noqa: E402
+
+DEFAULT_DATABASE = 'tatar_learning_bench'
+PRODUCTION_DATABASE = 'tatar_learning'
+BATCH_SIZE = 5000
+SESSION_ANSWERS = 20
+TATAR_LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюяәөүҗңһ'
+
+
+def generate_words(count, rng):
+    """Слова со служебными пометами и нумерованными определениями, как в словаре"""
+    seen = set()
+    while len(seen) < count:
+        word = ''.join(rng.choices(TATAR_LETTERS, k=rng.randint(2, 10)))
+        if word in seen:
+            continue
+        seen.add(word)
+
+        definitions = []
+        for number in range(1, rng.randint(1, 4) + 1):
+            parts = [rng.choice(LABELS)] if rng.random() < 0.6 else []
+            parts += rng.choices(RUSSIAN_WORDS, k=rng.randint(1, 6))
+            text = ', '.join(parts)
+            # Примерно у трети слов определения пронумерованы
+            definitions.append(f'{number}. {text}' if len(seen) % 3 == 0 else text)
+        yield {'word': word, 'definitions': definitions}
+
+
+def seed_words(db, count, rng):
+    """Записывает слова так же, как import_words.py; возвращает их _id"""
+    from import_words import WORD_INDEXES, WORDS_COLLECTION, content_hash
+    from utils.normalization import fold_headword, normalize_documents
+
+    words = db[WORDS_COLLECTION]
+    words.drop()
+    batch = []
+    for document in normalize_documents(generate_words(count, rng), workers=1):
+        document['word_fold'] = fold_headword(document['word'])
+        document['source_file'] = 'bench.json'
+        document['content_hash'] = content_hash(document)
+        batch.append(document)
+        if len(batch) >= BATCH_SIZE:
+            words.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        words.insert_many(batch, ordered=False)
+    for keys, options in WORD_INDEXES:
+        words.create_index(keys, **options)
+    return [str(doc['_id']) for doc in words.find({}, {'_id': 1}).sort('_id', 1)]
+
+
+def seed_users(db, count, days, rng):
+    """Пользователи, их посещения и стрики; возвращает [(user_id, token)]"""
+    from utils import tokens, uuid_codec
+
+    today = date.today()
+    credentials = []
+    users, visits, streak_visits, streaks = [], [], [], []
+    for _ in range(count):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        if tokens.signing_enabled():
+            token, stored_token = tokens.issue(user_id), None
+        else:
+            token = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            stored_token = uuid_codec.encode(token)
+        credentials.append((user_id, token))
+        users.append({
+            'user_id': uuid_codec.encode(user_id),
+            'token': stored_token,
+            'created_at': datetime.utcnow() - timedelta(days=days),
+            'total_questions': 0,
+            'correct_answers': 0,
+            'current_streak': 0,
+            'max_streak': 0,
+            'last_login': None
+        })
+
+        # Серия последних посещений, у части пользователей прерванная
+        current = rng.randint(0, min(days, 30))
+        longest = current + rng.randint(0, 10)
+        last_visit = today if current else today - timedelta(days=rng.randint(2, days))
+        visit_days = [last_visit - timedelta(days=offset) for offset in range(max(current, 1))]
+        for day in visit_days:
+            record = {'user_id': uuid_codec.encode(user_id), 'visit_date': day.isoformat(),
+                      'created_at': datetime.combine(day, datetime.min.time())}
+            visits.append(dict(record, _id=str(uuid.UUID(int=rng.getrandbits(128), version=4))))
+            streak_visits.append(dict(record, _id=str(uuid.UUID(int=rng.getrandbits(128), version=4))))
+        streaks.append({
+            'user_id': uuid_codec.encode(user_id),
+            'current_streak': current,
+            'longest_streak': longest,
+            'total_visits': len(visit_days),
+            'start_date': visit_days[-1].isoformat() if current else None,
+            'last_visit_date': last_visit.isoformat(),
+            'updated_at': datetime.now()
+        })
+
+    for name, documents in (('users', users), ('visits', visits),
+                            ('streak_visits', streak_visits), ('user_streaks', streaks)):
+        db[name].drop()
+        for start in range(0, len(documents), BATCH_SIZE):
+            db[name].insert_many(documents[start:start + BATCH_SIZE], ordered=False)
+    return credentials
+
+
+def seed_answers(db, count, credentials, word_ids, days, rng):
+    """История ответов в answers и счетчики пользователей"""
+    from pymongo import UpdateOne
+    from utils import uuid_codec
+
+    answers = db['answers']
+    answers.drop()
+    db['answer_buckets'].drop()
+    now = datetime.utcnow()
+    totals = {}
+    # Часть пользователей отвечает намного чаще остальных (закон Ципфа)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(credentials))))
+    batch = []
+    for number in range(count):
+        # Ответы идут сессиями по SESSION_ANSWERS от одного пользователя
+        if number % SESSION_ANSWERS == 0:
+            user_id = rng.choices(credentials, cum_weights=cum_weights)[0][0]
+        is_correct = rng.random() < 0.7
+        batch.append({
+            'user_id': uuid_codec.encode(user_id),
+            'card_id': uuid_codec.encode(rng.choice(word_ids)),
+            'is_correct': is_correct,
+            'answered_at': now - timedelta(seconds=rng.randint(0, days * 86400))
+        })
+        total, correct = totals.get(user_id, (0, 0))
+        totals[user_id] = (total + 1, correct + is_correct)
+        if len(batch) >= BATCH_SIZE:
+            answers.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        answers.insert_many(batch, ordered=False)
+
+    operations = [
+        UpdateOne({'user_id': uuid_codec.match(user_id)},
+                  {'$set': {'total_questions': total, 'correct_answers': correct}})
+        for user_id, (total, correct) in totals.items()
+    ]
+    if operations:
+        db['users'].bulk_write(operations, ordered=False)
+
+
+def rebuild_derived():
+    """Пересчитывает производные коллекции, как соответствующие задачи jobs.py"""
+    from models.answers import AnswerStore
+    from models.card_stats import CardStats
+    from models.daily_stats import DailyStats
+    from models.quiz import QuizNeighbours
+
+    store = AnswerStore()
+    card_stats = CardStats()
+    daily_stats = DailyStats()
+    quiz = QuizNeighbours()
+    try:
+        if store.reads_buckets:
+            store.migrate_to_buckets(batch_size=BATCH_SIZE)
+        card_stats.rebuild(batch_size=BATCH_SIZE, answers=store.iter_all(BATCH_SIZE))
+        daily_stats.backfill(batch_size=BATCH_SIZE, answers=store.iter_all(BATCH_SIZE))
+        quiz.build(batch_size=BATCH_SIZE)
+    finally:
+        for model in (store, card_stats, daily_stats, quiz):
+            model.close_connection()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генератор данных для нагрузочных тестов')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--answers', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=90, help='глубина истории в днях')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default=DEFAULT_DATABASE,
+                        help='база для данных (существующие коллекции пересоздаются)')
+    parser.add_argument('--users-out', default=os.path.join('benchmarks', 'bench_users.json'),
+                        help='куда записать user_id и token пользователей')
+    parser.add_argument('--force', action='store_true', help='разрешить запись в рабочую базу')
+    args = parser.parse_args(argv)
+
+    if args.database == PRODUCTION_DATABASE and not args.force:
+        # Генератор пересоздает коллекции — рабочую базу без --force не трогаем
+        print(f'❌ {args.database} — рабочая база приложения, укажите другую --database или --force')
+        return 1
+
+    # Модели читают DATABASE_NAME при импорте
+    os.environ['DATABASE_NAME'] = args.database
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    db = client[args.database]
+    rng = random.Random(args.seed)
+    try:
+        started = time.perf_counter()
+        word_ids = seed_words(db, args.words, rng)
+        print(f'✅ Слов: {len(word_ids)} ({time.perf_counter() - started:.1f} с)')
+
+        started = time.perf_counter()
+        credentials = seed_users(db, args.users, args.days, rng)
+        print(f'✅ Пользователей: {len(credentials)} ({time.perf_counter() - started:.1f} с)')
+
+        started = time.perf_counter()
+        seed_answers(db, args.answers, credentials, word_ids, args.days, rng)
+        print(f'✅ Ответов: {args.answers} ({time.perf_counter() - started:.1f} с)')
+
+        started = time.perf_counter()
+        rebuild_derived()
+        print(f'✅ Производные коллекции пересчитаны ({time.perf_counter() - started:.1f} с)')
+    finally:
+        client.close()
+
+    with open(args.users_out, 'w', encoding='utf-8') as file:
+        json.dump({
+            'database': args.database,
+            'seed': args.seed,
+            'users': [{'user_id': user_id, 'token': token} for user_id, token in credentials],
+            'word_ids': word_ids[:1000]
+        }, file)
+    print(f'📄 Учетные данные: {args.users_out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Импорт словаря из JSON файлов в папке words в MongoDB
+
+Файлы читаются потоково и вставляются пачками в теневую коллекцию.
+Когда импорт и построение индексов завершены, теневая коллекция атомарно
+подменяет words через renameCollection — /cards не остается без слов.
+
+В инкрементальном режиме (--incremental) записываются только изменения:
+слово определяется ключом (word, source_file), изменения — хэшем содержимого.
+_id неизмененных и обновленных слов сохраняются, поэтому changed_from из /cards
+и card_id в answers остаются действительными.
+
+Определения очищаются и классифицируются по сложности в пуле процессов
+(utils/normalization.py, тот же код используется в /cards).
+
+Пример:
+    python import_words.py --dir words --batch-size 1000 --workers 4
+    python import_words.py --incremental
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+from pymongo import MongoClient, InsertOne, UpdateOne
+from dotenv import load_dotenv
+
+from models.word_search import mark_words_changed
+from utils.normalization import DEFAULT_CHUNK_SIZE, default_workers, fold_headword, normalize_documents
+
+# Загрузка переменных окружения
+load_dotenv()
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+
+WORDS_COLLECTION = 'words'
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 1 << 16
+
+# Индексы, которые строятся на теневой коллекции до подмены
+WORD_INDEXES = [
+    ([('word', 1), ('source_file', 1)], {'unique': True}),
+    ([('difficulty', 1)], {}),
+    ([('word_fold', 1)], {}),
+]
+
+# Поля, которые перезаписываются при изменении слова
+CONTENT_FIELDS = ('definitions', 'clean_definitions', 'difficulty', 'word_fold')
+
+
+def iter_json_object(fp, chunk_size=READ_CHUNK_SIZE):
+    """
+    Потоково разбирает JSON-объект верхнего уровня.
+
+    Возвращает пары (ключ, значение) по мере чтения файла, не загружая
+    его целиком: в памяти находится только текущий фрагмент. Повторные
+    ключи возвращаются все, в порядке файла.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf) or not read_more():
+                return
+
+    def expect(chars):
+        nonlocal pos
+        skip_whitespace()
+        if pos >= len(buf) or buf[pos] not in chars:
+            found = buf[pos] if pos < len(buf) else 'EOF'
+            raise ValueError(f'Invalid JSON: expected {chars!r}, found {found!r}')
+        pos += 1
+        return buf[pos - 1]
+
+    def decode_value():
+        nonlocal pos
+        skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            # Значение упирается в конец буфера (например, число) — дочитываем
+            if end == len(buf) and not eof and read_more():
+                continue
+            pos = end
+            return value
+
+    expect('{')
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == '}':
+        return
+
+    while True:
+        key = decode_value()
+        if not isinstance(key, str):
+            raise ValueError('Invalid JSON: object key must be a string')
+        expect(':')
+        yield key, decode_value()
+        if expect(',}') == '}':
+            return
+
+
+def content_hash(document):
+    """Хэш содержимого слова: меняется только при изменении определений"""
+    content = json.dumps(
+        [document.get(field) for field in CONTENT_FIELDS],
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ImportProgress:
+    """Отчет о ходе импорта: количество слов и скорость"""
+
+    def __init__(self, report_every=10):
+        self.started = time.monotonic()
+        self.words = 0
+        self.batches = 0
+        self.files = 0
+        self.report_every = report_every
+
+    @property
+    def elapsed(self):
+        return max(time.monotonic() - self.started, 1e-9)
+
+    def file_done(self, path, count):
+        self.files += 1
+        print(f'✅ Файл {path} обработан: {count} слов')
+
+    def batch_done(self, size):
+        self.words += size
+        self.batches += 1
+        if self.batches % self.report_every == 0:
+            self.report()
+
+    def report(self):
+        print(f'  📦 {self.words} слов, {self.words / self.elapsed:.0f} слов/с')
+
+    def summary(self):
+        return {
+            'files': self.files,
+            'words': self.words,
+            'seconds': round(self.elapsed, 2),
+            'words_per_second': round(self.words / self.elapsed)
+        }
+
+
+class WordsImporter:
+    """Импорт словаря с подменой коллекции words без окна простоя"""
+
+    def __init__(self, db, batch_size=DEFAULT_BATCH_SIZE, progress=None,
+                 workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.progress = progress or ImportProgress()
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def iter_documents(self, json_files):
+        """
+        Потоково выдает документы слов из всех файлов.
+
+        Повторный ключ в файле, как в json.load, берется по последнему
+        вхождению: предварительный проход запоминает номер последнего
+        вхождения каждого слова, значения при этом не хранятся.
+        """
+        for json_file in json_files:
+            print(f'📖 Обработка файла: {json_file}')
+            source_file = os.path.basename(json_file)
+            count = 0
+            last = {}
+            with open(json_file, 'r', encoding='utf-8') as file:
+                for index, (word, _) in enumerate(iter_json_object(file)):
+                    last[word] = index
+                    count += 1
+            if count > len(last):
+                print(f'⚠️ В файле {json_file} повторяются слова: {count - len(last)}, берется последнее определение')
+
+            # (word, source_file) уникален: из повторов остается последний
+            with open(json_file, 'r', encoding='utf-8') as file:
+                for index, (word, definitions) in enumerate(iter_json_object(file)):
+                    if last[word] != index:
+                        continue
+                    yield {
+                        'word': word,
+                        'word_fold': fold_headword(word),  # Ключ поиска по префиксу
+                        'definitions': definitions,
+                        'source_file': source_file  # Сохраняем имя файла-источника
+                    }
+            self.progress.file_done(json_file, len(last))
+
+    def iter_normalized(self, json_files):
+        """Документы с очищенными определениями, сложностью и хэшем содержимого"""
+        documents = normalize_documents(
+            self.iter_documents(json_files),
+            workers=self.workers,
+            chunk_size=self.chunk_size
+        )
+        for document in documents:
+            document['content_hash'] = content_hash(document)
+            yield document
+
+    def iter_batches(self, documents):
+        """Группирует документы в пачки ограниченного размера"""
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def full_import(self, json_files):
+        """Загружает словарь в теневую коллекцию и атомарно подменяет words"""
+        shadow_name = f'{WORDS_COLLECTION}_import_{int(time.time())}'
+        shadow = self.db[shadow_name]
+        shadow.drop()
+
+        try:
+            for batch in self.iter_batches(self.iter_normalized(json_files)):
+                shadow.insert_many(batch, ordered=False)
+                self.progress.batch_done(len(batch))
+
+            if self.progress.words == 0:
+                print('❌ Нет данных для добавления.')
+                shadow.drop()
+                return False
+
+            print('🔨 Построение индексов...')
+            self._create_indexes(shadow)
+
+            # renameCollection с dropTarget подменяет коллекцию атомарно
+            shadow.rename(WORDS_COLLECTION, dropTarget=True)
+        except Exception:
+            shadow.drop()
+            raise
+
+        mark_words_changed(self.db)
+        return True
+
+    def incremental_import(self, json_files):
+        """
+        Применяет к words только разницу со словарем на диске.
+
+        В памяти держится лишь отображение ключ -> (_id, хэш) текущих слов,
+        а записи (вставки, обновления, удаления) отправляются пачками bulk_write,
+        поэтому объем записи пропорционален размеру изменений.
+        """
+        words = self.db[WORDS_COLLECTION]
+        self._create_indexes(words)
+
+        existing = {}
+        for doc in words.find({}, {'word': 1, 'source_file': 1, 'content_hash': 1}):
+            existing[(doc.get('word'), doc.get('source_file'))] = (doc['_id'], doc.get('content_hash'))
+
+        stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        operations = []
+
+        def flush():
+            if operations:
+                words.bulk_write(operations, ordered=False)
+                self.progress.batch_done(len(operations))
+                operations.clear()
+
+        for document in self.iter_normalized(json_files):
+            current = existing.pop((document['word'], document['source_file']), None)
+            if current is None:
+                operations.append(InsertOne(document))
+                stats['inserted'] += 1
+            elif current[1] != document['content_hash']:
+                update = {field: document[field] for field in CONTENT_FIELDS}
+                update['content_hash'] = document['content_hash']
+                operations.append(UpdateOne({'_id': current[0]}, {'$set': update}))
+                stats['updated'] += 1
+            else:
+                stats['unchanged'] += 1
+
+            if len(operations) >= self.batch_size:
+                flush()
+        flush()
+
+        # Слова, которых больше нет в файлах, удаляем
+        stale_ids = [doc_id for doc_id, _ in existing.values()]
+        for start in range(0, len(stale_ids), self.batch_size):
+            result = words.delete_many({'_id': {'$in': stale_ids[start:start + self.batch_size]}})
+            stats['deleted'] += result.deleted_count
+
+        if stats['inserted'] or stats['updated'] or stats['deleted']:
+            mark_words_changed(self.db)
+        return stats
+
+    def _create_indexes(self, target):
+        """Строит на коллекции обязательные индексы и индексы текущей words"""
+        indexes = {tuple(keys): options for keys, options in WORD_INDEXES}
+        for name, info in self.db[WORDS_COLLECTION].index_information().items():
+            if name == '_id_':
+                continue
+            if 'weights' in info:
+                # Текстовый индекс описывается весами полей, а не ключом _fts
+                keys = tuple((field, 'text') for field in info['weights'])
+                options = {'default_language': info.get('default_language', 'english')}
+            else:
+                keys = tuple(tuple(key) for key in info['key'])
+                options = {'unique': True} if info.get('unique') else {}
+            indexes.setdefault(keys, options)
+
+        for keys, options in indexes.items():
+            target.create_index(list(keys), **options)
+
+
+def add_words_from_json(words_dir='words', batch_size=DEFAULT_BATCH_SIZE,
+                        incremental=False, workers=1):
+    """Добавление слов из JSON файлов в папке words в MongoDB"""
+    json_files = sorted(glob.glob(os.path.join(words_dir, '*.json')))
+    if not json_files:
+        print(f'❌ В папке {words_dir} не найдено JSON файлов')
+        return False
+
+    client = MongoClient(MONGODB_URI)
+    try:
+        importer = WordsImporter(client[DATABASE_NAME], batch_size=batch_size, workers=workers)
+        if incremental:
+            stats = importer.incremental_import(json_files)
+            print(
+                f"✅ Добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+                f"удалено {stats['deleted']}, без изменений {stats['unchanged']} "
+                f"за {importer.progress.summary()['seconds']} с"
+            )
+            return True
+
+        success = importer.full_import(json_files)
+        if success:
+            summary = importer.progress.summary()
+            print(
+                f"✅ Добавлено {summary['words']} слов из {summary['files']} файлов "
+                f"за {summary['seconds']} с ({summary['words_per_second']} слов/с)"
+            )
+        return success
+    except Exception as e:
+        print(f'❌ Ошибка при добавлении слов: {e}')
+        return False
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Импорт словаря в MongoDB')
+    parser.add_argument('--dir', default='words', help='папка с JSON файлами')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='записать только изменения, сохранив _id существующих слов'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=default_workers(),
+        help='число процессов для очистки определений (по умолчанию — число ядер)'
+    )
+    args = parser.parse_args(argv)
+
+    print('=== Добавление слов из JSON файлов в MongoDB ===')
+    success = add_words_from_json(args.dir, args.batch_size, args.incremental, args.workers)
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
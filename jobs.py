@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Фоновые задачи обслуживания базы данных
+
+Пример:
+    python jobs.py backfill-daily-stats
+    python jobs.py build-quiz
+    python jobs.py rebuild-card-stats
+    python jobs.py migrate-answers
+    python jobs.py migrate-uuids
+    python jobs.py backfill-word-fold
+"""
+
+import argparse
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения
+load_dotenv()
+
+
+def _progress_printer(label):
+    """Печатает прогресс и скорость обработки"""
+    started = time.monotonic()
+
+    def report(processed):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f'  {label}: {processed} ({processed / elapsed:.0f}/с)')
+
+    return report
+
+
+def backfill_daily_stats(args):
+    """Перестраивает daily_stats по истории посещений и ответов"""
+    from models.answers import AnswerStore
+    from models.daily_stats import DailyStats
+
+    model = DailyStats()
+    store = AnswerStore()
+    try:
+        processed = model.backfill(
+            batch_size=args.batch_size,
+            progress=_progress_printer('обработано событий'),
+            answers=store.iter_all(args.batch_size)
+        )
+        print(f'✅ Агрегаты daily_stats перестроены, событий: {processed}')
+    finally:
+        model.close_connection()
+        store.close_connection()
+
+
+def build_quiz(args):
+    """Перестраивает таблицу дистракторов для /quiz"""
+    from models.quiz import QuizNeighbours
+
+    model = QuizNeighbours()
+    try:
+        written = model.build(
+            batch_size=args.batch_size,
+            progress=_progress_printer('записано вопросов')
+        )
+        print(f'✅ Таблица quiz_neighbours перестроена, вопросов: {written}')
+    finally:
+        model.close_connection()
+
+
+def rebuild_card_stats(args):
+    """Пересчитывает статистику карточек по истории ответов"""
+    from models.answers import AnswerStore
+    from models.card_stats import CardStats
+
+    model = CardStats()
+    store = AnswerStore()
+    try:
+        cards = model.rebuild(
+            batch_size=args.batch_size,
+            progress=_progress_printer('обработано ответов'),
+            answers=store.iter_all(args.batch_size)
+        )
+        print(f'✅ Статистика card_stats пересчитана, карточек: {cards}')
+    finally:
+        model.close_connection()
+        store.close_connection()
+
+
+def migrate_answers(args):
+    """Переносит историю ответов из answers в answer_buckets"""
+    from models.answers import AnswerStore
+
+    store = AnswerStore()
+    try:
+        processed = store.migrate_to_buckets(
+            batch_size=args.batch_size,
+            progress=_progress_printer('перенесено ответов')
+        )
+        print(f'✅ Ответы перенесены в answer_buckets: {processed}')
+    finally:
+        store.close_connection()
+
+
+def migrate_uuids(args):
+    """Переводит строковые user_id, token и card_id в бинарный вид"""
+    from models.uuid_migration import UuidMigration
+    from utils.uuid_codec import USE_BINARY_UUIDS
+
+    if not USE_BINARY_UUIDS:
+        print('⚠️ USE_BINARY_UUIDS выключен: новые записи будут снова строковыми')
+
+    migration = UuidMigration()
+    try:
+        results = migration.run(
+            batch_size=args.batch_size,
+            progress=lambda name: _progress_printer(f'{name}: обновлено')
+        )
+        for name, (updated, duplicates) in results.items():
+            print(f'✅ {name}: обновлено {updated}, удалено дубликатов {duplicates}')
+    finally:
+        migration.close_connection()
+
+
+def backfill_word_fold(args):
+    """Проставляет ключ поиска по префиксу словам, импортированным без него"""
+    from models.word_search import HeadwordIndex
+
+    index = HeadwordIndex()
+    try:
+        updated = index.backfill_fold(
+            batch_size=args.batch_size,
+            progress=_progress_printer('обновлено слов')
+        )
+        print(f'✅ word_fold проставлен, слов: {updated}')
+    finally:
+        index.close_connection()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Задачи обслуживания базы данных')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backfill = subparsers.add_parser(
+        'backfill-daily-stats',
+        help='перестроить дневные агрегаты из visits и answers'
+    )
+    backfill.add_argument('--batch-size', type=int, default=1000)
+    backfill.set_defaults(handler=backfill_daily_stats)
+
+    quiz = subparsers.add_parser(
+        'build-quiz',
+        help='подобрать дистракторы для /quiz по текущему словарю'
+    )
+    quiz.add_argument('--batch-size', type=int, default=1000)
+    quiz.set_defaults(handler=build_quiz)
+
+    card_stats = subparsers.add_parser(
+        'rebuild-card-stats',
+        help='пересчитать card_stats по всей истории answers'
+    )
+    card_stats.add_argument('--batch-size', type=int, default=1000)
+    card_stats.set_defaults(handler=rebuild_card_stats)
+
+    migrate = subparsers.add_parser(
+        'migrate-answers',
+        help='перенести answers в бакеты answer_buckets (перед ANSWER_STORAGE=buckets)'
+    )
+    migrate.add_argument('--batch-size', type=int, default=1000)
+    migrate.set_defaults(handler=migrate_answers)
+
+    uuids = subparsers.add_parser(
+        'migrate-uuids',
+        help='перевести строковые id в BSON Binary/ObjectId (при USE_BINARY_UUIDS=1)'
+    )
+    uuids.add_argument('--batch-size', type=int, default=1000)
+    uuids.set_defaults(handler=migrate_uuids)
+
+    word_fold = subparsers.add_parser(
+        'backfill-word-fold',
+        help='проставить word_fold словам старого импорта (поиск /words/search до готовности индекса)'
+    )
+    word_fold.add_argument('--batch-size', type=int, default=1000)
+    word_fold.set_defaults(handler=backfill_word_fold)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+from pymongo import MongoClient, InsertOne, UpdateOne
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+import base64
+import json
+import os
+
+from dotenv import load_dotenv
+
+from utils import uuid_codec
+
+# Загрузка переменных окружения
+load_dotenv()
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+# documents — документ на ответ (answers), buckets — документ на пользователя
+# и день (answer_buckets), dual — запись в оба хранилища на время миграции.
+# Переход: dual -> python jobs.py migrate-answers -> buckets
+ANSWER_STORAGE = os.getenv('ANSWER_STORAGE', 'documents')
+# Максимум ответов в одном бакете; при переполнении начинается новый бакет того же дня
+BUCKET_SIZE = int(os.getenv('ANSWER_BUCKET_SIZE', 200))
+
+STORAGE_MODES = ('documents', 'buckets', 'dual')
+BUCKETS_COLLECTION = 'answer_buckets'
+# Индексы под keyset-пагинацию истории: порядок совпадает с сортировкой выдачи
+ANSWERS_HISTORY_INDEX = [('user_id', 1), ('answered_at', -1), ('_id', -1)]
+BUCKETS_HISTORY_INDEX = [('user_id', 1), ('first_at', -1), ('_id', -1)]
+# Обход бакетов по дням для пересчета агрегатов; day задается только
+# при создании бакета, поэтому индекс не дорожает от $push ответов
+BUCKETS_DAY_INDEX = [('day', 1)]
+
+
+def _bucket_answer(card_id, is_correct, answered_at):
+    """Компактная запись ответа внутри бакета"""
+    return {'c': uuid_codec.encode(card_id), 'k': bool(is_correct), 't': answered_at}
+
+
+def encode_cursor(position):
+    """Непрозрачный курсор страницы истории"""
+    data = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, parse_id=ObjectId):
+    """
+    Разбирает курсор; ValueError, если он поврежден.
+    parse_id приводит id позиции к типу хранилища (ObjectId или int).
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(data)
+        position['t'] = datetime.fromisoformat(position['t'])
+        if not isinstance(position['id'], str):
+            raise TypeError('id')
+        position['id'] = parse_id(position['id'])
+        if 'p' in position and (type(position['p']) is not int or position['p'] < 0):
+            raise TypeError('p')
+        return position
+    except (TypeError, KeyError, ValueError, InvalidId) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+class AnswerStore:
+    """
+    Хранилище истории ответов.
+
+    В режиме buckets ответы пользователя за день лежат в одном документе
+    answer_buckets (массив answers пополняется через $push, счетчики — $inc),
+    поэтому история и статистика пользователя читаются из нескольких документов.
+    """
+
+    def __init__(self, mode=ANSWER_STORAGE, bucket_size=BUCKET_SIZE):
+        if mode not in STORAGE_MODES:
+            raise ValueError(f'Unknown answer storage: {mode}')
+        self.mode = mode
+        self.bucket_size = bucket_size
+
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.answers = self.db['answers']
+        self.buckets = self.db[BUCKETS_COLLECTION]
+
+        self.answers.create_index(ANSWERS_HISTORY_INDEX)
+        if mode != 'documents':
+            self.buckets.create_index(BUCKETS_HISTORY_INDEX)
+            self.buckets.create_index(BUCKETS_DAY_INDEX)
+
+    @property
+    def reads_buckets(self):
+        return self.mode != 'documents'
+
+    def record(self, user_id, card_id, is_correct, answered_at=None):
+        """Сохраняет ответ в хранилища текущего режима"""
+        answered_at = answered_at or datetime.utcnow()
+
+        if self.mode != 'buckets':
+            self.answers.insert_one({
+                'user_id': uuid_codec.encode(user_id),
+                'card_id': uuid_codec.encode(card_id),
+                'is_correct': is_correct,
+                'answered_at': answered_at
+            })
+
+        if self.mode != 'documents':
+            # Условие count < bucket_size не задает count при вставке,
+            # поэтому заполненный бакет порождает новый документ того же дня
+            self.buckets.update_one(
+                {
+                    'user_id': uuid_codec.match(user_id),
+                    'day': answered_at.date().isoformat(),
+                    'count': {'$lt': self.bucket_size}
+                },
+                {
+                    '$push': {'answers': _bucket_answer(card_id, is_correct, answered_at)},
+                    '$inc': {'count': 1, 'corrects': 1 if is_correct else 0},
+                    '$setOnInsert': {'user_id': uuid_codec.encode(user_id)},
+                    '$min': {'first_at': answered_at},
+                    '$max': {'last_at': answered_at}
+                },
+                upsert=True
+            )
+
+    def history(self, user_id, limit=50, cursor=None, is_correct=None):
+        """
+        Страница истории ответов пользователя, новые первыми.
+
+        Возвращает (ответы, курсор следующей страницы или None). Пагинация
+        по ключу (answered_at, _id): страница читается по индексу с позиции
+        курсора, без skip, поэтому стоимость не растет с номером страницы.
+        """
+        position = decode_cursor(cursor) if cursor else None
+        if self.reads_buckets:
+            return self._history_buckets(user_id, limit, position, is_correct)
+
+        query = {'user_id': uuid_codec.match(user_id)}
+        if is_correct is not None:
+            query['is_correct'] = is_correct
+        if position:
+            query['$or'] = [
+                {'answered_at': {'$lt': position['t']}},
+                {'answered_at': position['t'], '_id': {'$lt': position['id']}}
+            ]
+
+        docs = list(self.answers.find(
+            query,
+            {'card_id': 1, 'is_correct': 1, 'answered_at': 1}
+        ).sort([('answered_at', -1), ('_id', -1)]).limit(limit + 1))
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = encode_cursor({'t': last['answered_at'].isoformat(), 'id': str(last['_id'])})
+
+        return [
+            {
+                'card_id': uuid_codec.decode(doc.get('card_id')),
+                'is_correct': doc.get('is_correct'),
+                'answered_at': doc['answered_at']
+            }
+            for doc in docs
+        ], next_cursor
+
+    def _history_buckets(self, user_id, limit, position, is_correct):
+        """
+        История из бакетов: курсор — (first_at бакета, _id бакета, позиция в нем).
+
+        Бакеты читаются по индексу (user_id, first_at, _id) с позиции курсора;
+        ответы внутри бакета — с конца массива. first_at не меняется при
+        дописывании ответов, поэтому курсор остается действительным.
+        """
+        query = {'user_id': uuid_codec.match(user_id)}
+        bucket_id = None
+        if position:
+            if 'p' not in position:
+                raise ValueError('Invalid cursor')
+            bucket_id = position['id']
+            query['$or'] = [
+                {'first_at': {'$lt': position['t']}},
+                {'first_at': position['t'], '_id': {'$lte': bucket_id}}
+            ]
+
+        result = []
+        cursor = self.buckets.find(
+            query,
+            {'answers': 1, 'first_at': 1}
+        ).sort([('first_at', -1), ('_id', -1)])
+        for bucket in cursor:
+            answers = bucket['answers']
+            start = len(answers) - 1
+            if bucket['_id'] == bucket_id:
+                start = min(position['p'], len(answers)) - 1
+
+            for index in range(start, -1, -1):
+                item = answers[index]
+                if is_correct is not None and item['k'] != is_correct:
+                    continue
+                if len(result) == limit:
+                    # Есть еще ответы: курсор указывает на следующий за последним выданным
+                    return result, encode_cursor({
+                        't': bucket['first_at'].isoformat(), 'id': str(bucket['_id']), 'p': index + 1
+                    })
+                result.append({
+                    'card_id': uuid_codec.decode(item['c']),
+                    'is_correct': item['k'],
+                    'answered_at': item['t']
+                })
+        return result, None
+
+    def user_stats(self, user_id):
+        """Количество ответов и правильных ответов пользователя"""
+        if self.reads_buckets:
+            collection = self.buckets
+            group = {'_id': None, 'total': {'$sum': '$count'}, 'corrects': {'$sum': '$corrects'}}
+        else:
+            collection = self.answers
+            group = {
+                '_id': None,
+                'total': {'$sum': 1},
+                'corrects': {'$sum': {'$cond': ['$is_correct', 1, 0]}}
+            }
+
+        result = list(collection.aggregate([
+            {'$match': {'user_id': uuid_codec.match(user_id)}},
+            {'$group': group}
+        ]))
+        total = result[0]['total'] if result else 0
+        corrects = result[0]['corrects'] if result else 0
+        return {
+            'total_answers': total,
+            'correct_answers': corrects,
+            'accuracy': round(corrects / total * 100, 2) if total else 0
+        }
+
+    def iter_all(self, batch_size=1000):
+        """
+        Все ответы по времени (id — строками) — для пересчета агрегатов.
+
+        answers обходятся по индексу _id: ответ пишется в момент ответа,
+        поэтому порядок вставки совпадает с порядком answered_at, а сортировка
+        по индексу не требует сортировки всей коллекции в памяти.
+        """
+        if not self.reads_buckets:
+            cursor = (self.answers.find({}, {'_id': 0, 'user_id': 1, 'card_id': 1,
+                                             'is_correct': 1, 'answered_at': 1})
+                      .sort('_id', 1)
+                      .batch_size(batch_size))
+            for doc in cursor:
+                yield uuid_codec.decode_fields(doc, ('user_id', 'card_id'))
+            return
+
+        # Бакеты упорядочены по дню (индекс day); внутри дня ответы разных
+        # пользователей сортируются в памяти — это ответы только одного дня
+        day, pending = None, []
+        for bucket in self.buckets.find({}).sort('day', 1).batch_size(batch_size):
+            if bucket['day'] != day:
+                yield from sorted(pending, key=lambda answer: answer['answered_at'])
+                day, pending = bucket['day'], []
+            for item in bucket['answers']:
+                pending.append({
+                    'user_id': uuid_codec.decode(bucket['user_id']),
+                    'card_id': uuid_codec.decode(item['c']),
+                    'is_correct': item['k'],
+                    'answered_at': item['t']
+                })
+        yield from sorted(pending, key=lambda answer: answer['answered_at'])
+
+    def migrate_to_buckets(self, batch_size=1000, progress=None):
+        """
+        Переносит в answer_buckets ответы из answers, которых там еще нет.
+
+        Запускается в режиме dual: ответы, начиная с первого бакета
+        пользователя, уже записаны в бакеты, переносятся только более ранние.
+        Бакеты дополняются на месте, без подмены коллекции, поэтому ответы,
+        которые пишутся во время миграции, не теряются.
+
+        answers читаются по индексу истории — по пользователю, от новых
+        к старым; в памяти только ответы текущего дня пользователя и пачка
+        на запись. Ответы дня первого бакета дописываются в его начало
+        ($push с $position 0, бакет может превысить bucket_size), более
+        ранние дни вставляются новыми бакетами. Пачки пишутся по порядку,
+        от новых ответов к старым, поэтому после сбоя повторный запуск
+        продолжает с места остановки.
+        """
+        self.buckets.create_index(BUCKETS_HISTORY_INDEX)
+        self.buckets.create_index(BUCKETS_DAY_INDEX)
+        operations = []
+        processed = 0
+        user_id = first_bucket = day = None
+        # Ответы текущего дня пользователя, от новых к старым
+        pending = []
+
+        def close_day():
+            if not pending:
+                return
+            answers = pending[::-1]
+            pending.clear()
+            if first_bucket is not None and day == first_bucket['day']:
+                operations.append(UpdateOne({'_id': first_bucket['_id']}, {
+                    '$push': {'answers': {'$each': answers, '$position': 0}},
+                    '$inc': {'count': len(answers), 'corrects': sum(item['k'] for item in answers)},
+                    '$min': {'first_at': answers[0]['t']}
+                }))
+            else:
+                chunks = [answers[i:i + self.bucket_size] for i in range(0, len(answers), self.bucket_size)]
+                for chunk in reversed(chunks):
+                    operations.append(InsertOne({
+                        'user_id': user_id,
+                        'day': day,
+                        'count': len(chunk),
+                        'corrects': sum(item['k'] for item in chunk),
+                        'first_at': chunk[0]['t'],
+                        'last_at': chunk[-1]['t'],
+                        'answers': chunk
+                    }))
+            if len(operations) >= batch_size:
+                self.buckets.bulk_write(operations, ordered=True)
+                operations.clear()
+
+        cursor = (self.answers.find({}, {'_id': 0})
+                  .sort(ANSWERS_HISTORY_INDEX)
+                  .batch_size(batch_size))
+        for doc in cursor:
+            doc_user_id = uuid_codec.encode(uuid_codec.decode(doc.get('user_id')))
+            if doc_user_id != user_id:
+                close_day()
+                user_id, day = doc_user_id, None
+                # Первый бакет читается, когда курсор уже дошел до пользователя:
+                # ответы, записанные после этого, курсор не вернет
+                first_bucket = self.buckets.find_one(
+                    {'user_id': uuid_codec.match(uuid_codec.decode(user_id))},
+                    {'day': 1, 'first_at': 1},
+                    sort=[('first_at', 1)]
+                )
+
+            answered_at = doc['answered_at']
+            if first_bucket is not None and answered_at >= first_bucket['first_at']:
+                continue
+            answer_day = answered_at.date().isoformat()
+            if answer_day != day:
+                close_day()
+                day = answer_day
+            pending.append(
+                _bucket_answer(uuid_codec.decode(doc.get('card_id')), doc.get('is_correct'), answered_at)
+            )
+            processed += 1
+            if progress and processed % (batch_size * 100) == 0:
+                progress(processed)
+
+        close_day()
+        if operations:
+            self.buckets.bulk_write(operations, ordered=True)
+
+        if progress:
+            progress(processed)
+        return processed
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
@@ -0,0 +1,202 @@
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from collections import deque
+from datetime import datetime
+import os
+
+from dotenv import load_dotenv
+
+from utils import uuid_codec
+
+# Загрузка переменных окружения
+load_dotenv()
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+
+CARD_STATS_COLLECTION = 'card_stats'
+# Сколько последних ответов учитывается в recent_accuracy
+RECENT_SIZE = 20
+# До этого числа ответов эмпирическая сложность не определяется
+MIN_ATTEMPTS = 5
+# Границы recent_accuracy: не ниже EASY — easy, не ниже MEDIUM — medium, иначе hard
+EASY_ACCURACY = 0.8
+MEDIUM_ACCURACY = 0.5
+DUPLICATE_KEY = 11000
+
+
+def empirical_difficulty(attempts, recent_accuracy):
+    """Сложность по тому, как карточку на самом деле решают (None — мало данных)"""
+    if attempts < MIN_ATTEMPTS:
+        return None
+    if recent_accuracy >= EASY_ACCURACY:
+        return 'easy'
+    if recent_accuracy >= MEDIUM_ACCURACY:
+        return 'medium'
+    return 'hard'
+
+
+class CardStats:
+    """
+    Статистика ответов по карточкам (коллекция card_stats, _id = ObjectId слова).
+
+    Счетчики attempts/corrects и последние RECENT_SIZE результатов обновляются
+    одним upsert при каждом ответе, там же пересчитываются recent_accuracy
+    и empirical_difficulty — выбор карточек не агрегирует answers.
+    """
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.stats = self.db[CARD_STATS_COLLECTION]
+        self.answers = self.db['answers']
+
+        self.stats.create_index([('empirical_difficulty', 1), ('recent_accuracy', 1)])
+
+    @staticmethod
+    def _answer_pipeline(is_correct):
+        """Update pipeline: счетчики, окно последних ответов и производные поля"""
+        result = 1 if is_correct else 0
+        return [
+            {'$set': {
+                'attempts': {'$add': [{'$ifNull': ['$attempts', 0]}, 1]},
+                'corrects': {'$add': [{'$ifNull': ['$corrects', 0]}, result]},
+                'recent': {'$slice': [
+                    {'$concatArrays': [{'$ifNull': ['$recent', []]}, [result]]},
+                    -RECENT_SIZE
+                ]},
+                'updated_at': datetime.utcnow()
+            }},
+            {'$set': {
+                'accuracy': {'$divide': ['$corrects', '$attempts']},
+                'recent_accuracy': {'$avg': '$recent'}
+            }},
+            {'$set': {
+                'empirical_difficulty': {'$switch': {
+                    'branches': [
+                        {'case': {'$lt': ['$attempts', MIN_ATTEMPTS]}, 'then': None},
+                        {'case': {'$gte': ['$recent_accuracy', EASY_ACCURACY]}, 'then': 'easy'},
+                        {'case': {'$gte': ['$recent_accuracy', MEDIUM_ACCURACY]}, 'then': 'medium'},
+                    ],
+                    'default': 'hard'
+                }}
+            }}
+        ]
+
+    def record_answer(self, card_id, is_correct):
+        """Учитывает ответ на карточку одним запросом (card_id — строка ObjectId слова)"""
+        if not isinstance(card_id, str) or not ObjectId.is_valid(card_id):
+            return
+        self.stats.update_one({'_id': ObjectId(card_id)}, self._answer_pipeline(is_correct), upsert=True)
+
+    def get_stats(self, card_ids):
+        """
+        Статистика для списка карточек одним запросом: card_id -> документ.
+        Документы со строковым _id (до rebuild-card-stats) тоже читаются,
+        документ с ObjectId важнее.
+        """
+        card_ids = [card_id for card_id in card_ids if ObjectId.is_valid(card_id or '')]
+        docs = sorted(
+            self.stats.find(
+                {'_id': {'$in': card_ids + [ObjectId(card_id) for card_id in card_ids]}},
+                {'recent': 0, 'updated_at': 0}
+            ),
+            key=lambda doc: isinstance(doc['_id'], ObjectId)
+        )
+        return {str(doc['_id']): doc for doc in docs}
+
+    def sample_ids(self, difficulty, size):
+        """Случайные card_id с заданной эмпирической сложностью"""
+        return [
+            str(doc['_id'])
+            for doc in self.stats.aggregate([
+                {'$match': {'empirical_difficulty': difficulty}},
+                {'$sample': {'size': size}},
+                {'$project': {'_id': 1}}
+            ])
+        ]
+
+    def rebuild(self, batch_size=1000, progress=None, answers=None):
+        """
+        Пересчитывает card_stats по всей истории answers.
+
+        Ответы читаются курсором в порядке вставки (индекс _id), в памяти — только
+        счетчики и окно последних ответов на карточку. Учитываются ответы до
+        начала пересчета; документы карточек заменяются в card_stats через
+        ReplaceOne, кроме карточек, которые /answer обновил после начала, —
+        их счетчики уже включают ответы, которых нет в пересчете. Остальные
+        документы (карточки без ответов, строковые _id) удаляются, поэтому
+        запускать можно под нагрузкой.
+        answers — поток ответов (AnswerStore.iter_all), по умолчанию коллекция answers.
+        """
+        started = datetime.utcnow()
+        cards = {}
+        processed = 0
+        if answers is None:
+            answers = (self.answers.find({'answered_at': {'$not': {'$gte': started}}},
+                                         {'_id': 0, 'card_id': 1, 'is_correct': 1, 'answered_at': 1})
+                       .sort('_id', 1)
+                       .batch_size(batch_size))
+        for doc in answers:
+            answered_at = doc.get('answered_at')
+            if answered_at is not None and answered_at >= started:
+                continue
+            card_id = uuid_codec.decode(doc.get('card_id'))
+            if not isinstance(card_id, str) or not ObjectId.is_valid(card_id):
+                continue
+            item = cards.get(card_id)
+            if item is None:
+                item = cards[card_id] = [0, 0, deque(maxlen=RECENT_SIZE)]
+            result = 1 if doc.get('is_correct') else 0
+            item[0] += 1
+            item[1] += result
+            item[2].append(result)
+            processed += 1
+            if progress and processed % (batch_size * 100) == 0:
+                progress(processed)
+
+        now = datetime.utcnow()
+        operations = []
+
+        def flush():
+            try:
+                self.stats.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Документ обновлен после начала пересчета: фильтр не совпал,
+                # а upsert уперся в его _id — такой документ оставляем
+                errors = e.details.get('writeErrors', [])
+                if any(error.get('code') != DUPLICATE_KEY for error in errors):
+                    raise
+            operations.clear()
+
+        for card_id, (attempts, corrects, recent) in cards.items():
+            recent_accuracy = sum(recent) / len(recent)
+            operations.append(ReplaceOne(
+                {'_id': ObjectId(card_id), 'updated_at': {'$not': {'$gte': started}}},
+                {
+                    'attempts': attempts,
+                    'corrects': corrects,
+                    'recent': list(recent),
+                    'accuracy': corrects / attempts,
+                    'recent_accuracy': recent_accuracy,
+                    'empirical_difficulty': empirical_difficulty(attempts, recent_accuracy),
+                    'updated_at': now
+                },
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                flush()
+        if operations:
+            flush()
+
+        # Не пересчитанные и не обновленные с начала пересчета документы устарели
+        self.stats.delete_many({'updated_at': {'$not': {'$gte': started}}})
+
+        if progress:
+            progress(processed)
+        return len(cards)
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
@@ -0,0 +1,233 @@
+from pymongo import MongoClient, ReplaceOne, UpdateOne
+from datetime import date, datetime, timedelta, timezone
+import os
+import time
+
+from dotenv import load_dotenv
+
+from utils import hyperloglog, uuid_codec
+
+# Загрузка переменных окружения
+load_dotenv()
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+
+PERIODS = ('day', 'week', 'month')
+DAILY_STATS_COLLECTION = 'daily_stats'
+
+
+def utc_today():
+    """Текущий день по UTC — дни агрегатов считаются по UTC, как answered_at"""
+    return datetime.utcnow().date()
+
+
+def _visit_day(doc):
+    """
+    День посещения по UTC: created_at пишется локальным временем сервера,
+    у старых записей без него берется visit_date.
+    """
+    created_at = doc.get('created_at')
+    if created_at is None:
+        return doc['visit_date']
+    return created_at.astimezone(timezone.utc).date().isoformat()
+
+
+class DailyStats:
+    """
+    Инкрементальные дневные агрегаты активности (коллекция daily_stats).
+
+    На каждый день (UTC) хранится общий документ (_id = "YYYY-MM-DD") с регистрами
+    HyperLogLog для оценки уникальных пользователей и документ на пользователя
+    (_id = "YYYY-MM-DD:<user_id>"). Счетчики обновляются через $inc,
+    дашборды читают только эти документы, а не сырые visits/answers.
+    """
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.stats = self.db[DAILY_STATS_COLLECTION]
+        self.visits = self.db['visits']
+        self.answers = self.db['answers']
+
+        self.stats.create_index([('user_id', 1), ('date', 1)])
+
+    @staticmethod
+    def _updates(day, user_id, counters):
+        """Формирует upsert-операции для общего и пользовательского документа"""
+        day_str = day.isoformat()
+        global_update = {
+            '$inc': counters,
+            '$setOnInsert': {'date': day_str, 'user_id': None}
+        }
+        if user_id is None:
+            return [UpdateOne({'_id': day_str}, global_update, upsert=True)]
+
+        index, rank = hyperloglog.register_for(user_id)
+        global_update['$max'] = {f'hll.{index}': rank}
+
+        return [
+            UpdateOne({'_id': day_str}, global_update, upsert=True),
+            UpdateOne(
+                {'_id': f'{day_str}:{user_id}'},
+                {'$inc': counters, '$setOnInsert': {'date': day_str, 'user_id': user_id}},
+                upsert=True
+            )
+        ]
+
+    def _record(self, user_id, counters, day=None):
+        """Обновляет агрегаты одним запросом к базе"""
+        self.stats.bulk_write(self._updates(day or utc_today(), user_id, counters), ordered=False)
+
+    def record_visit(self, user_id, day=None):
+        """Учитывает новое посещение"""
+        self._record(user_id, {'visits': 1}, day)
+
+    def record_answer(self, user_id, is_correct, day=None):
+        """Учитывает ответ на карточку"""
+        self._record(user_id, {'answers': 1, 'corrects': 1 if is_correct else 0}, day)
+
+    def get_series(self, period, start, end, user_id=None):
+        """Возвращает ряд агрегатов по дням, неделям (с понедельника) или месяцам"""
+        if period not in PERIODS:
+            raise ValueError(f'Unknown period: {period}')
+
+        docs = self.stats.find(
+            {
+                'user_id': user_id,
+                'date': {'$gte': start.isoformat(), '$lte': end.isoformat()}
+            },
+            {'_id': 0, 'date': 1, 'visits': 1, 'answers': 1, 'corrects': 1, 'hll': 1}
+        )
+
+        # Заранее создаем все интервалы, чтобы в ряду не было пропусков
+        buckets = {}
+        current = start
+        while current <= end:
+            key = self._bucket_key(current, period)
+            if key not in buckets:
+                buckets[key] = {'visits': 0, 'answers': 0, 'corrects': 0, 'hll': {}}
+            current += timedelta(days=1)
+
+        for doc in docs:
+            bucket = buckets.get(self._bucket_key(date.fromisoformat(doc['date']), period))
+            if bucket is None:
+                continue
+            for field in ('visits', 'answers', 'corrects'):
+                bucket[field] += doc.get(field, 0)
+            hyperloglog.merge(bucket['hll'], doc.get('hll'))
+
+        series = []
+        for key, bucket in buckets.items():
+            item = {
+                'period_start': key,
+                'visits': bucket['visits'],
+                'answers': bucket['answers'],
+                'corrects': bucket['corrects'],
+                'accuracy': round(bucket['corrects'] / bucket['answers'] * 100, 2) if bucket['answers'] else 0
+            }
+            if user_id is None:
+                item['distinct_users'] = hyperloglog.estimate(bucket['hll'])
+            series.append(item)
+        return series
+
+    @staticmethod
+    def _bucket_key(day, period):
+        """Начало интервала, к которому относится день"""
+        if period == 'week':
+            return (day - timedelta(days=day.weekday())).isoformat()
+        if period == 'month':
+            return day.replace(day=1).isoformat()
+        return day.isoformat()
+
+    def backfill(self, batch_size=1000, progress=None, answers=None):
+        """
+        Перестраивает daily_stats по истории visits и answers за один проход.
+
+        Пересчитываются дни до текущего (UTC). Документы читаются курсором,
+        промежуточные агрегаты сбрасываются пачками через $inc/$max в теневую
+        коллекцию, поэтому память ограничена batch_size. Затем документы
+        теневой коллекции заменяют документы тех же дней в daily_stats,
+        а прочие документы этих дней удаляются. Текущий день не трогается —
+        его ведут живые $inc, поэтому запускать можно под нагрузкой.
+        answers — поток ответов (AnswerStore.iter_all), по умолчанию коллекция answers.
+        """
+        cutoff = utc_today().isoformat()
+        shadow = self.db[f'{DAILY_STATS_COLLECTION}_backfill_{int(time.time())}']
+        shadow.drop()
+        pending = {}
+        processed = 0
+
+        def flush():
+            operations = []
+            for (day_str, user_id), item in pending.items():
+                update = {
+                    '$inc': item['counters'],
+                    '$setOnInsert': {'date': day_str, 'user_id': user_id}
+                }
+                doc_id = day_str if user_id is None else f'{day_str}:{user_id}'
+                if item['hll']:
+                    update['$max'] = {f'hll.{k}': v for k, v in item['hll'].items()}
+                operations.append(UpdateOne({'_id': doc_id}, update, upsert=True))
+            if operations:
+                shadow.bulk_write(operations, ordered=False)
+            pending.clear()
+
+        def add(day_str, user_id, counters):
+            keys = [(day_str, None)]
+            if user_id is not None:
+                keys.append((day_str, user_id))
+            for key in keys:
+                item = pending.setdefault(key, {'counters': {}, 'hll': {}})
+                for field, value in counters.items():
+                    item['counters'][field] = item['counters'].get(field, 0) + value
+            if user_id is not None:
+                hyperloglog.add(pending[(day_str, None)]['hll'], user_id)
+
+        events = (
+            (self.visits.find({}, {'_id': 0, 'user_id': 1, 'visit_date': 1, 'created_at': 1})
+             .batch_size(batch_size),
+             lambda doc: (_visit_day(doc), {'visits': 1})),
+            (answers if answers is not None else
+             self.answers.find({}, {'_id': 0, 'user_id': 1, 'is_correct': 1, 'answered_at': 1})
+             .batch_size(batch_size),
+             lambda doc: (doc['answered_at'].date().isoformat(),
+                          {'answers': 1, 'corrects': 1 if doc.get('is_correct') else 0})),
+        )
+
+        try:
+            for cursor, extract in events:
+                for doc in cursor:
+                    day_str, counters = extract(doc)
+                    if day_str >= cutoff:
+                        continue
+                    add(day_str, uuid_codec.decode(doc.get('user_id')), counters)
+                    processed += 1
+                    if len(pending) >= batch_size:
+                        flush()
+                        if progress:
+                            progress(processed)
+            flush()
+
+            # Прошедшие дни живые $inc уже не меняют — их документы заменяются
+            rebuilt_at = datetime.utcnow()
+            operations = []
+            for doc in shadow.find({}):
+                doc['rebuilt_at'] = rebuilt_at
+                operations.append(ReplaceOne({'_id': doc['_id']}, doc, upsert=True))
+                if len(operations) >= batch_size:
+                    self.stats.bulk_write(operations, ordered=False)
+                    operations.clear()
+            if operations:
+                self.stats.bulk_write(operations, ordered=False)
+            self.stats.delete_many({'date': {'$lt': cutoff}, 'rebuilt_at': {'$ne': rebuilt_at}})
+        finally:
+            shadow.drop()
+
+        if progress:
+            progress(processed)
+        return processed
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
@@ -0,0 +1,228 @@
+from array import array
+from bisect import bisect_left
+from bson import ObjectId
+import heapq
+import math
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from models.word_search import InMemoryWordIndex
+from utils.normalization import card_definitions, tokenize_russian
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# memory — инвертированный индекс в памяти, mongo — текстовый индекс MongoDB
+REVERSE_SEARCH_BACKEND = os.getenv('REVERSE_SEARCH_BACKEND', 'memory')
+
+# Параметры ранжирования BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс по очищенным определениям.
+
+    Токен -> отсортированный список номеров слов (array('I'), 4 байта на
+    вхождение). Длины определений в токенах хранятся в array('H') для
+    ранжирования: короткое определение с искомым словом — скорее перевод.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.words = []
+        self.lengths = array('H')
+        self.postings = {}
+
+    @classmethod
+    def build(cls, entries):
+        """Строит индекс из (id, слово, определения)"""
+        index = cls()
+        postings = index.postings
+        for doc_id, word, definitions in entries:
+            number = len(index.ids)
+            index.ids.append(doc_id)
+            index.words.append(word)
+
+            tokens = tokenize_russian(' '.join(definitions))
+            index.lengths.append(min(len(tokens), 0xFFFF))
+            for token in set(tokens):
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = array('I')
+                # Номера слов растут, поэтому списки получаются отсортированными
+                posting.append(number)
+
+        total = sum(index.lengths)
+        index.average_length = total / len(index.lengths) if index.lengths else 0
+        return index
+
+    def _idf(self, posting):
+        count = len(self.ids)
+        return math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+
+    def search(self, query, limit=10):
+        """
+        AND-поиск: слова, в определениях которых есть все токены запроса,
+        упорядоченные по BM25. Возвращает [(номер слова, score)].
+        """
+        tokens = set(tokenize_russian(query))
+        if not tokens:
+            return []
+
+        postings = []
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                return []
+            postings.append(posting)
+
+        # Пересечение начинаем с самого короткого списка
+        postings.sort(key=len)
+        candidates = postings[0]
+        others = postings[1:]
+        positions = [0] * len(others)
+        # Без учета частоты токена в определении score = сумма idf * f(длина)
+        weight = sum(self._idf(posting) for posting in postings) * (BM25_K1 + 1)
+
+        lengths = self.lengths
+        average_length = self.average_length or 1
+        scored = []
+        for number in candidates:
+            matched = True
+            for i, posting in enumerate(others):
+                position = bisect_left(posting, number, positions[i])
+                positions[i] = position
+                if position == len(posting) or posting[position] != number:
+                    matched = False
+                    break
+            if not matched:
+                continue
+
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[number] / average_length)
+            score = weight / (1 + norm)
+            scored.append((score, -number))
+
+        return [(-negative, score) for score, negative in heapq.nlargest(limit, scored)]
+
+    def memory_report(self):
+        """Оценка занимаемой памяти в байтах по составным частям"""
+        postings_bytes = sum(
+            posting.buffer_info()[1] * posting.itemsize for posting in self.postings.values()
+        )
+        keys_bytes = sum(sys.getsizeof(token) for token in self.postings)
+        ids_bytes = sum(sys.getsizeof(doc_id) for doc_id in self.ids)
+        words_bytes = sum(sys.getsizeof(word) for word in self.words)
+        lengths_bytes = self.lengths.buffer_info()[1] * self.lengths.itemsize
+        return {
+            'words': len(self.ids),
+            'tokens': len(self.postings),
+            'postings': sum(len(posting) for posting in self.postings.values()),
+            'postings_bytes': postings_bytes,
+            'token_keys_bytes': keys_bytes,
+            'words_bytes': ids_bytes + words_bytes + lengths_bytes,
+            'dict_overhead_bytes': sys.getsizeof(self.postings),
+            'total_bytes': postings_bytes + keys_bytes + ids_bytes + words_bytes
+            + lengths_bytes + sys.getsizeof(self.postings),
+        }
+
+
+class DefinitionIndex(InMemoryWordIndex):
+    """
+    Обратный поиск: татарские слова по русскому тексту определений.
+
+    Бэкенд задается REVERSE_SEARCH_BACKEND: memory — InvertedIndex в памяти,
+    mongo — текстовый индекс MongoDB по clean_definitions (для сравнения).
+    """
+
+    projection = {'word': 1, 'definitions': 1, 'clean_definitions': 1}
+    thread_name = 'definition-index'
+
+    def __init__(self, backend=REVERSE_SEARCH_BACKEND):
+        super().__init__()
+        if backend not in ('memory', 'mongo'):
+            raise ValueError(f'Unknown reverse search backend: {backend}')
+        self.backend = backend
+        if backend == 'mongo':
+            self.words.create_index(
+                [('clean_definitions', 'text')],
+                default_language='russian'
+            )
+
+    def start(self):
+        if self.backend == 'memory':
+            super().start()
+
+    def _build(self, cursor):
+        return InvertedIndex.build(
+            (str(doc['_id']), doc.get('word', ''), card_definitions(doc)) for doc in cursor
+        )
+
+    def memory_report(self):
+        index = self._snapshot
+        return index.memory_report() if index is not None else None
+
+    def search(self, query, limit=10):
+        """
+        Возвращает (результаты, бэкенд).
+
+        Результаты None — индекс в памяти еще строится.
+        """
+        if self.backend == 'mongo':
+            return self._search_mongo(query, limit), 'mongo'
+
+        self._refresh_if_stale()
+        index = self._snapshot
+        if index is None:
+            return None, 'memory'
+
+        found = index.search(query, limit)
+        if not found:
+            return [], 'memory'
+
+        # Определения для найденных слов берем одним запросом по _id
+        ids = [index.ids[number] for number, _ in found]
+        object_ids = [ObjectId(doc_id) for doc_id in ids if ObjectId.is_valid(doc_id)]
+        documents = {
+            str(doc['_id']): doc
+            for doc in self.words.find(
+                {'_id': {'$in': object_ids + ids}},
+                {'definitions': 1, 'clean_definitions': 1}
+            )
+        }
+
+        results = []
+        for number, score in found:
+            doc_id = index.ids[number]
+            document = documents.get(doc_id)
+            results.append({
+                'id': doc_id,
+                'word': index.words[number],
+                'definitions': card_definitions(document) if document else [],
+                'score': round(score, 4)
+            })
+        return results, 'memory'
+
+    def _search_mongo(self, query, limit):
+        """Поиск по текстовому индексу MongoDB; каждый токен в кавычках — AND"""
+        terms = ' '.join(f'"{term}"' for term in query.replace('"', ' ').split())
+        if not terms:
+            return []
+        cursor = (self.words.find(
+            {'$text': {'$search': terms, '$language': 'russian'}},
+            {'word': 1, 'definitions': 1, 'clean_definitions': 1,
+             'score': {'$meta': 'textScore'}})
+            .sort([('score', {'$meta': 'textScore'})])
+            .limit(limit))
+        return [
+            {
+                'id': str(doc['_id']),
+                'word': doc.get('word', ''),
+                'definitions': card_definitions(doc),
+                'score': round(doc.get('score', 0), 4)
+            }
+            for doc in cursor
+        ]
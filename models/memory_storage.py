@@ -0,0 +1,508 @@
+"""
+Хранилище в памяти процесса (STORAGE_BACKEND=memory)
+
+Те же методы, что у Mongo моделей, на словарях и отсортированных списках:
+порядок рейтингов, истории ответов и посещений поддерживается при записи
+(bisect), поэтому чтение не сортирует. Данные живут, пока жив процесс, и у
+каждого воркера свои — режим для тестов и бенчмарков логики приложения без
+задержек базы. id хранятся строками, без uuid_codec.
+"""
+
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import glob
+import heapq
+import itertools
+import logging
+import math
+import os
+import random
+import threading
+import uuid
+
+from bson import ObjectId
+
+from models.answers import decode_cursor, encode_cursor
+from models.daily_stats import utc_today
+from models.repositories import new_user
+from utils.cards import has_numbered_definitions
+
+logger = logging.getLogger(__name__)
+
+
+class SortedIndex:
+    """Пары (ключ, id) по возрастанию ключа: вставка и удаление через bisect"""
+
+    def __init__(self):
+        self._items = []
+
+    def add(self, key, item_id):
+        insort(self._items, (key, item_id))
+
+    def remove(self, key, item_id):
+        index = bisect_left(self._items, (key, item_id))
+        if index < len(self._items) and self._items[index] == (key, item_id):
+            del self._items[index]
+
+    def count_below(self, key):
+        """Сколько записей с ключом меньше key"""
+        return bisect_left(self._items, (key,))
+
+    def between(self, low, high):
+        """id с ключом low <= key < high"""
+        start = bisect_left(self._items, (low,))
+        stop = bisect_left(self._items, (high,))
+        return [item_id for _, item_id in self._items[start:stop]]
+
+    def __iter__(self):
+        return (item_id for _, item_id in self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class MemoryUserRepository:
+    """Пользователи: словарь по user_id и индексы рейтингов"""
+
+    def __init__(self):
+        self._users = {}
+        self._by_correct = SortedIndex()
+        self._by_max_streak = SortedIndex()
+        self._lock = threading.Lock()
+
+    def _index(self, user):
+        self._by_correct.add(-user['correct_answers'], user['user_id'])
+        self._by_max_streak.add(-user['max_streak'], user['user_id'])
+
+    def _unindex(self, user):
+        self._by_correct.remove(-user['correct_answers'], user['user_id'])
+        self._by_max_streak.remove(-user['max_streak'], user['user_id'])
+
+    def create(self, user_id, token):
+        user = new_user(user_id, token)
+        with self._lock:
+            self._users[user_id] = user
+            self._index(user)
+
+    def authenticate(self, user_id, token):
+        user = self._users.get(user_id)
+        if user is None or user['token'] is None or user['token'] != token:
+            return None
+        return dict(user)
+
+    def get_stats(self, user_id):
+        user = self._users.get(user_id)
+        if user is None:
+            return None
+        return {key: value for key, value in user.items() if key != 'token'}
+
+    def record_answer(self, user_id, is_correct):
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return
+            self._unindex(user)
+            user['total_questions'] += 1
+            if is_correct:
+                user['correct_answers'] += 1
+                user['current_streak'] += 1
+            else:
+                user['current_streak'] = 0
+            user['max_streak'] = max(user['max_streak'], user['current_streak'])
+            self._index(user)
+
+    def rating_by_correct(self):
+        with self._lock:
+            return [
+                {'user_id': user_id, 'correct_answers': self._users[user_id]['correct_answers']}
+                for user_id in self._by_correct
+            ]
+
+    def rating_by_max_streak(self):
+        with self._lock:
+            return [
+                {'user_id': user_id, 'max_streak': self._users[user_id]['max_streak']}
+                for user_id in self._by_max_streak
+            ]
+
+    def close_connection(self):
+        pass
+
+
+class MemoryWordRepository:
+    """
+    Слова: словарь по строковому _id, списки id по сложности и список
+    кандидатов на замену. Документы не копируются — вызывающий код их не меняет.
+    """
+
+    def __init__(self, rng=random):
+        self.rng = rng
+        self._words = {}
+        self._ids = []
+        self._by_difficulty = defaultdict(list)
+        self._replacements = []
+        self._lock = threading.Lock()
+
+    def insert_many(self, documents):
+        """Добавляет документы слов (без _id — получают ObjectId); возвращает их число"""
+        count = 0
+        with self._lock:
+            for document in documents:
+                document.setdefault('_id', ObjectId())
+                word_id = str(document['_id'])
+                if word_id in self._words:
+                    continue
+                self._words[word_id] = document
+                self._ids.append(word_id)
+                self._by_difficulty[document.get('difficulty')].append(word_id)
+                if not has_numbered_definitions(document):
+                    self._replacements.append(document)
+                count += 1
+        return count
+
+    def load_directory(self, words_dir):
+        """Загружает JSON файлы словаря так же, как import_words.py"""
+        from import_words import WordsImporter
+
+        json_files = sorted(glob.glob(os.path.join(words_dir, '*.json')))
+        count = self.insert_many(WordsImporter(None).iter_normalized(json_files))
+        logger.info('Loaded %d words from %s', count, words_dir)
+        return count
+
+    def sample(self, size, difficulty=None):
+        ids = self._by_difficulty.get(difficulty, []) if difficulty else self._ids
+        return [self._words[word_id] for word_id in self.rng.sample(ids, min(size, len(ids)))]
+
+    def find_by_ids(self, ids, projection=None):
+        words = (self._words.get(str(word_id)) for word_id in ids)
+        return [word for word in words if word is not None]
+
+    def replacement_candidates(self):
+        return self._replacements
+
+    def close_connection(self):
+        pass
+
+
+class MemoryAnswerStore:
+    """
+    История ответов: по пользователю список (answered_at, seq, card_id,
+    is_correct) по возрастанию времени. Курсор страницы — тот же формат,
+    что у AnswerStore, с порядковым номером ответа вместо _id.
+    """
+
+    mode = 'memory'
+    reads_buckets = False
+
+    def __init__(self):
+        self._by_user = defaultdict(list)
+        self._totals = defaultdict(lambda: [0, 0])
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def record(self, user_id, card_id, is_correct, answered_at=None):
+        answered_at = answered_at or datetime.utcnow()
+        with self._lock:
+            insort(self._by_user[user_id], (answered_at, next(self._seq), card_id, is_correct))
+            totals = self._totals[user_id]
+            totals[0] += 1
+            totals[1] += 1 if is_correct else 0
+
+    def history(self, user_id, limit=50, cursor=None, is_correct=None):
+        position = decode_cursor(cursor, parse_id=int) if cursor else None
+        result = []
+        next_cursor = None
+        with self._lock:
+            answers = self._by_user.get(user_id, [])
+            end = len(answers)
+            if position:
+                end = bisect_left(answers, (position['t'], position['id']))
+
+            for index in range(end - 1, -1, -1):
+                answered_at, seq, card_id, correct = answers[index]
+                if is_correct is not None and correct != is_correct:
+                    continue
+                if len(result) == limit:
+                    last = result[-1]
+                    next_cursor = encode_cursor({'t': last['answered_at'].isoformat(), 'id': str(last_seq)})
+                    break
+                result.append({'card_id': card_id, 'is_correct': correct, 'answered_at': answered_at})
+                last_seq = seq
+        return result, next_cursor
+
+    def user_stats(self, user_id):
+        total, corrects = self._totals.get(user_id, (0, 0))
+        return {
+            'total_answers': total,
+            'correct_answers': corrects,
+            'accuracy': round(corrects / total * 100, 2) if total else 0
+        }
+
+    def daily_series(self, user_id, start, end):
+        """Ряд ответов пользователя по дням (UTC) в формате DailyStats.get_series"""
+        days = {}
+        current = start
+        while current <= end:
+            days[current] = [0, 0]
+            current += timedelta(days=1)
+        with self._lock:
+            answers = self._by_user.get(user_id, [])
+            index = bisect_left(answers, (datetime.combine(start, datetime.min.time()),))
+            for answered_at, _, _, correct in answers[index:]:
+                day = days.get(answered_at.date())
+                if day is None:
+                    break
+                day[0] += 1
+                day[1] += 1 if correct else 0
+        return [
+            {
+                'period_start': day.isoformat(),
+                'answers': total,
+                'corrects': corrects,
+                'accuracy': round(corrects / total * 100, 2) if total else 0
+            }
+            for day, (total, corrects) in days.items()
+        ]
+
+    def iter_all(self, batch_size=1000):
+        def stream(user_id, answers):
+            for answered_at, seq, card_id, correct in answers:
+                yield answered_at, seq, user_id, card_id, correct
+
+        with self._lock:
+            streams = [stream(user_id, list(answers)) for user_id, answers in self._by_user.items()]
+        for answered_at, _, user_id, card_id, correct in heapq.merge(*streams):
+            yield {'user_id': user_id, 'card_id': card_id, 'is_correct': correct, 'answered_at': answered_at}
+
+    def close_connection(self):
+        pass
+
+
+class MemoryUserVisit:
+    """Посещения: документ по _id, ключ (user_id, день) и индексы по дате"""
+
+    def __init__(self):
+        self._documents = {}
+        self._keys = {}
+        self._by_date = SortedIndex()
+        self._by_user = defaultdict(SortedIndex)
+        self._lock = threading.Lock()
+
+    def track_visit(self, user_id):
+        today = date.today().isoformat()
+        with self._lock:
+            if (user_id, today) in self._keys:
+                return None
+            visit_id = str(uuid.uuid4())
+            self._documents[visit_id] = {
+                '_id': visit_id,
+                'user_id': user_id,
+                'visit_date': today,
+                'created_at': datetime.now()
+            }
+            self._keys[(user_id, today)] = visit_id
+            self._by_date.add(today, visit_id)
+            self._by_user[user_id].add(today, visit_id)
+        return visit_id
+
+    def has_visited_today(self, user_id):
+        return (user_id, date.today().isoformat()) in self._keys
+
+    def get_all_visits(self, user_id=None):
+        index = self._by_user.get(user_id, SortedIndex()) if user_id else self._by_date
+        with self._lock:
+            return [self._documents[visit_id] for visit_id in reversed(list(index))]
+
+    def get_visits_by_date(self, target_date):
+        ids = self._by_date.between(target_date.isoformat(), (target_date + timedelta(days=1)).isoformat())
+        return self._documents[ids[0]] if ids else None
+
+    def get_visit_count(self):
+        return len(self._documents)
+
+    def get_visits_by_month(self, year, month):
+        start_date = date(year, month, 1)
+        end_date = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        ids = self._by_date.between(start_date.isoformat(), end_date.isoformat())
+        return [self._documents[visit_id] for visit_id in reversed(ids)]
+
+    def close_connection(self):
+        pass
+
+
+def _empty_ranking(page, per_page):
+    return {
+        'ranking': [],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total_pages': 0,
+            'total_users': 0,
+            'has_next': False,
+            'has_prev': False
+        }
+    }
+
+
+class MemoryUserStreak:
+    """
+    Стрики: документ по user_id, дни посещений и индекс по current_streak.
+    Правила стрика те же, что в UserStreak._streak_update_pipeline.
+    """
+
+    def __init__(self):
+        self._streaks = {}
+        self._visit_dates = defaultdict(set)
+        self._by_current = SortedIndex()
+        self._lock = threading.Lock()
+
+    def track_visit(self, user_id):
+        return self.record_visit(user_id)[0]
+
+    def record_visit(self, user_id):
+        today = utc_today()
+        today_str = today.isoformat()
+        yesterday_str = (today - timedelta(days=1)).isoformat()
+
+        with self._lock:
+            dates = self._visit_dates[user_id]
+            if today_str in dates:
+                # Посещение уже было сегодня — стрик не меняется
+                return self._serialize_streak(self._streaks.get(user_id)), False
+            dates.add(today_str)
+
+            streak = self._streaks.get(user_id)
+            if streak is None:
+                streak = self._streaks[user_id] = {
+                    'user_id': user_id,
+                    'current_streak': 0,
+                    'longest_streak': 0,
+                    'total_visits': 0,
+                    'start_date': None,
+                    'last_visit_date': None
+                }
+            else:
+                self._by_current.remove(-streak['current_streak'], user_id)
+
+            last_visit = streak['last_visit_date']
+            if last_visit == yesterday_str:
+                streak['current_streak'] += 1
+            elif last_visit != today_str:
+                streak['current_streak'] = 1
+                streak['start_date'] = today_str
+            if last_visit != today_str:
+                streak['total_visits'] += 1
+            streak['longest_streak'] = max(streak['longest_streak'], streak['current_streak'])
+            streak['last_visit_date'] = today_str
+            streak['updated_at'] = datetime.utcnow()
+            self._by_current.add(-streak['current_streak'], user_id)
+            return self._serialize_streak(streak), True
+
+    def get_streak_info(self, user_id):
+        return self._serialize_streak(self._streaks.get(user_id))
+
+    @staticmethod
+    def _serialize_streak(streak):
+        if not streak:
+            return {
+                'current_streak': 0,
+                'longest_streak': 0,
+                'total_visits': 0,
+                'last_visit_date': None,
+                'start_date': None
+            }
+        return {
+            'current_streak': streak['current_streak'],
+            'longest_streak': streak['longest_streak'],
+            'total_visits': streak['total_visits'],
+            'last_visit_date': streak['last_visit_date'],
+            'start_date': streak['start_date']
+        }
+
+    def get_streak_ranking(self, page=1, per_page=20, search_query=None):
+        try:
+            with self._lock:
+                user_ids = list(self._by_current)
+                if search_query:
+                    # Как uuid_codec.prefix_filter в UserStreak: по началу user_id
+                    prefix = search_query.lower()
+                    user_ids = [user_id for user_id in user_ids if user_id.startswith(prefix)]
+
+                total_users = len(user_ids)
+                total_pages = math.ceil(total_users / per_page)
+                skip = (page - 1) * per_page
+                ranking = [
+                    self._ranking_data(self._streaks[user_id])
+                    for user_id in user_ids[skip:skip + per_page]
+                ]
+
+            return {
+                'ranking': ranking,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total_pages': total_pages,
+                    'total_users': total_users,
+                    'has_next': page < total_pages,
+                    'has_prev': page > 1
+                }
+            }
+        except Exception:
+            logger.exception("Error in get_streak_ranking")
+            return _empty_ranking(page, per_page)
+
+    def _ranking_data(self, streak):
+        user_id = streak['user_id']
+        dates = self._visit_dates.get(user_id, ())
+        return {
+            'user_id': user_id,
+            'current_streak': streak['current_streak'],
+            'longest_streak': streak['longest_streak'],
+            'total_visits': len(dates),
+            'last_visit_date': streak['last_visit_date'],
+            # Пользователей с большим стриком + 1
+            'rank_position': self._by_current.count_below(-streak['current_streak']) + 1,
+            'start_date': streak['start_date'],
+            'is_active_today': utc_today().isoformat() in dates
+        }
+
+    def get_top_streaks(self, limit=10):
+        with self._lock:
+            top_data = []
+            for user_id in itertools.islice(self._by_current, limit):
+                result = self._ranking_data(self._streaks[user_id])
+                result['rank_position'] = len(top_data) + 1  # Точная позиция в топе
+                top_data.append(result)
+            return top_data
+
+    def get_user_rank(self, user_id):
+        with self._lock:
+            streak = self._streaks.get(user_id)
+            return self._ranking_data(streak) if streak else None
+
+    def close_connection(self):
+        pass
+
+
+class MemoryTokenRevocations:
+    """Отозванные подписанные токены в памяти"""
+
+    def __init__(self):
+        self._revoked = {}
+
+    def start(self):
+        pass
+
+    def is_revoked(self, token_id):
+        return token_id in self._revoked
+
+    def revoke(self, token_id, user_id, expires_at=None):
+        self._revoked.setdefault(token_id, {
+            'user_id': user_id,
+            'revoked_at': datetime.utcnow(),
+            'expires_at': expires_at
+        })
+
+    def close_connection(self):
+        pass
@@ -0,0 +1,189 @@
+from pymongo import MongoClient, InsertOne
+from datetime import datetime
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+
+from models.word_search import META_COLLECTION, WORDS_VERSION_ID
+from utils.normalization import card_definitions, fold_headword
+
+# Загрузка переменных окружения
+load_dotenv()
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+
+QUIZ_COLLECTION = 'quiz_neighbours'
+QUIZ_VERSION_ID = 'quiz_version'
+# Сколько дистракторов хранится на слово (в вопросе используется до K из них)
+MAX_DISTRACTORS = 8
+# Сколько соседей по длине и по префиксу рассматривается с каждой стороны
+NEIGHBOUR_WINDOW = 12
+ANSWER_SEPARATOR = '; '
+
+
+def answer_text(document):
+    """Текст правильного ответа: очищенные определения через точку с запятой"""
+    return ANSWER_SEPARATOR.join(card_definitions(document))
+
+
+def _window(order, position, size):
+    """Соседи position в сортировке order в пределах size с каждой стороны, ближние первыми"""
+    for offset in range(1, size + 1):
+        if position - offset >= 0:
+            yield order[position - offset]
+        if position + offset < len(order):
+            yield order[position + offset]
+
+
+class QuizNeighbours:
+    """
+    Вопросы с вариантами ответа (коллекция quiz_neighbours).
+
+    Для каждого слова заранее выбираются дистракторы — определения других слов
+    той же сложности с похожей длиной ответа или похожим началом слова.
+    Определения хранятся в документе слова, поэтому вопрос — одна выборка $sample
+    без дополнительных запросов к words.
+    """
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.quiz = self.db[QUIZ_COLLECTION]
+        self.words = self.db['words']
+        self.meta = self.db[META_COLLECTION]
+
+        self.quiz.create_index('difficulty')
+
+    def get_questions(self, count, options, difficulty=None):
+        """
+        Возвращает count вопросов с options вариантами ответа (правильный + дистракторы).
+
+        Если у слова меньше дистракторов (маленькая группа сложности),
+        вариантов в вопросе тоже будет меньше.
+        """
+        pipeline = []
+        if difficulty:
+            pipeline.append({'$match': {'difficulty': difficulty}})
+        pipeline.append({'$sample': {'size': count}})
+
+        questions = []
+        for doc in self.quiz.aggregate(pipeline):
+            choices = random.sample(doc['distractors'], min(options - 1, len(doc['distractors'])))
+            choices.append(doc['answer'])
+            random.shuffle(choices)
+            questions.append({
+                'id': str(doc['_id']),
+                'word': doc['word'],
+                'difficulty': doc['difficulty'],
+                'options': choices,
+                'answer_index': choices.index(doc['answer'])
+            })
+        return questions
+
+    def build(self, batch_size=1000, progress=None):
+        """
+        Перестраивает таблицу соседей по текущей коллекции words.
+
+        В памяти держатся только (id, слово, сложность, ответ) — без исходных
+        определений. Соседи ищутся в окнах двух сортировок внутри сложности:
+        по длине ответа и по свертке слова. Результат пишется в теневую
+        коллекцию и подменяет quiz_neighbours через renameCollection.
+        """
+        version = self.meta.find_one({'_id': WORDS_VERSION_ID}, {'version': 1})
+
+        groups = {}
+        cursor = self.words.find({}, {'word': 1, 'difficulty': 1, 'definitions': 1, 'clean_definitions': 1})
+        for doc in cursor.batch_size(batch_size):
+            answer = answer_text(doc)
+            if not answer or not doc.get('word'):
+                continue
+            groups.setdefault(doc.get('difficulty', 'easy'), []).append(
+                (doc['_id'], doc['word'], answer)
+            )
+
+        shadow = self.db[f'{QUIZ_COLLECTION}_build_{int(time.time())}']
+        shadow.drop()
+        written = 0
+        operations = []
+
+        try:
+            for difficulty, entries in groups.items():
+                by_length = sorted(range(len(entries)), key=lambda i: len(entries[i][2]))
+                by_fold = sorted(range(len(entries)), key=lambda i: fold_headword(entries[i][1]))
+                length_rank = {entry: rank for rank, entry in enumerate(by_length)}
+                fold_rank = {entry: rank for rank, entry in enumerate(by_fold)}
+
+                for i, (doc_id, word, answer) in enumerate(entries):
+                    distractors = self._pick_distractors(
+                        entries, answer,
+                        (by_length, length_rank[i]),
+                        (by_fold, fold_rank[i])
+                    )
+                    if not distractors:
+                        continue
+                    operations.append(InsertOne({
+                        '_id': doc_id,
+                        'word': word,
+                        'difficulty': difficulty,
+                        'answer': answer,
+                        'distractors': distractors
+                    }))
+                    if len(operations) >= batch_size:
+                        shadow.bulk_write(operations, ordered=False)
+                        written += len(operations)
+                        operations.clear()
+                        if progress:
+                            progress(written)
+
+            if operations:
+                shadow.bulk_write(operations, ordered=False)
+                written += len(operations)
+            if written == 0:
+                shadow.drop()
+                return 0
+
+            shadow.create_index('difficulty')
+            shadow.rename(QUIZ_COLLECTION, dropTarget=True)
+        except Exception:
+            shadow.drop()
+            raise
+
+        self.meta.update_one(
+            {'_id': QUIZ_VERSION_ID},
+            {'$set': {
+                'words_version': version['version'] if version else None,
+                'questions': written,
+                'updated_at': datetime.utcnow()
+            }},
+            upsert=True
+        )
+        if progress:
+            progress(written)
+        return written
+
+    @staticmethod
+    def _pick_distractors(entries, answer, *orders):
+        """Чередует ближайших соседей из каждой сортировки, пропуская совпадающие ответы"""
+        seen = {answer}
+        distractors = []
+        windows = [_window(order, position, NEIGHBOUR_WINDOW) for order, position in orders]
+        while windows and len(distractors) < MAX_DISTRACTORS:
+            for window in list(windows):
+                neighbour = next(window, None)
+                if neighbour is None:
+                    windows.remove(window)
+                    continue
+                candidate = entries[neighbour][2]
+                if candidate not in seen:
+                    seen.add(candidate)
+                    distractors.append(candidate)
+                    if len(distractors) >= MAX_DISTRACTORS:
+                        break
+        return distractors
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
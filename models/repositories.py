@@ -0,0 +1,245 @@
+"""
+Слой хранилища приложения
+
+app.py работает с пользователями, словами, ответами, посещениями и стриками
+через репозитории, а не через коллекции PyMongo. Бэкенд задается
+STORAGE_BACKEND: mongo — MongoDB (рабочий режим), memory — словари и
+отсортированные индексы в памяти процесса (models/memory_storage.py), чтобы
+гонять логику приложения и бенчмарки без базы.
+"""
+
+from pymongo import MongoClient
+from bson import ObjectId
+from datetime import datetime
+import os
+import time
+
+from dotenv import load_dotenv
+
+from models.word_search import META_COLLECTION, WORDS_TAG, WORDS_VERSION_ID, WORD_INDEX_REFRESH_SECONDS
+from utils import uuid_codec
+from utils.cache import Cache
+
+# Загрузка переменных окружения
+load_dotenv()
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+# mongo или memory
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+# Папка JSON файлов словаря для STORAGE_BACKEND=memory (пусто — словарь пустой)
+MEMORY_WORDS_DIR = os.getenv('MEMORY_WORDS_DIR', '')
+# Сколько держать в кэше кандидатов на замену для /cards, если словарь не менялся
+CACHE_WORDS_TTL = int(os.getenv('CACHE_WORDS_TTL', 300))
+
+STORAGE_BACKENDS = ('mongo', 'memory')
+
+# Список кандидатов велик для общего бэкенда: значение в памяти процесса,
+# инвалидация по тегу words — общая, а ключ включает версию словаря из meta
+decks_cache = Cache('decks', ttl=CACHE_WORDS_TTL, local=True)
+
+
+def new_user(user_id, token):
+    """Документ нового пользователя (token — None для подписанных токенов)"""
+    return {
+        'user_id': user_id,
+        'token': token,
+        'created_at': datetime.utcnow(),
+        'total_questions': 0,
+        'correct_answers': 0,
+        'current_streak': 0,
+        'max_streak': 0,
+        'last_login': None
+    }
+
+
+def object_ids(ids):
+    """ObjectId из строк; невалидные id пропускаются"""
+    return [ObjectId(item) for item in ids if ObjectId.is_valid(item or '')]
+
+
+class MongoUserRepository:
+    """Пользователи и их счетчики ответов (коллекция users)"""
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.users = self.db['users']
+
+    def create(self, user_id, token):
+        """Создает пользователя"""
+        document = new_user(uuid_codec.encode(user_id), uuid_codec.encode(token))
+        self.users.insert_one(document)
+
+    def authenticate(self, user_id, token):
+        """Пользователь с такими user_id и UUID токеном или None"""
+        user = self.users.find_one({
+            'user_id': uuid_codec.match(user_id),
+            'token': uuid_codec.match(token)
+        })
+        return uuid_codec.decode_fields(user, ('user_id', 'token'))
+
+    def get_stats(self, user_id):
+        """Документ пользователя без _id и токена или None"""
+        return uuid_codec.decode_fields(self.users.find_one(
+            {'user_id': uuid_codec.match(user_id)},
+            {'_id': 0, 'token': 0}
+        ), ('user_id',))
+
+    def record_answer(self, user_id, is_correct):
+        """
+        Обновляет счетчики после ответа: max_streak считается в самом update,
+        поэтому документ пользователя заранее читать не нужно.
+        """
+        correct = 1 if is_correct else 0
+        self.users.update_one(
+            {'user_id': uuid_codec.match(user_id)},
+            [
+                {'$set': {
+                    'total_questions': {'$add': [{'$ifNull': ['$total_questions', 0]}, 1]},
+                    'correct_answers': {'$add': [{'$ifNull': ['$correct_answers', 0]}, correct]},
+                    'current_streak': {'$cond': [
+                        bool(is_correct), {'$add': [{'$ifNull': ['$current_streak', 0]}, 1]}, 0
+                    ]}
+                }},
+                {'$set': {
+                    'max_streak': {'$max': [{'$ifNull': ['$max_streak', 0]}, '$current_streak']}
+                }}
+            ]
+        )
+
+    def rating_by_correct(self):
+        """[{'user_id', 'correct_answers'}] по убыванию правильных ответов"""
+        return [
+            {'user_id': uuid_codec.decode(user['user_id']), 'correct_answers': user.get('correct_answers', 0)}
+            for user in self.users.find(
+                {},
+                {'user_id': 1, 'correct_answers': 1, '_id': 0}
+            ).sort('correct_answers', -1)
+        ]
+
+    def rating_by_max_streak(self):
+        """[{'user_id', 'max_streak'}] по убыванию максимального стрика"""
+        return [
+            uuid_codec.decode_fields(user, ('user_id',))
+            for user in self.users.find(
+                {},
+                {'user_id': 1, 'max_streak': 1, '_id': 0}
+            ).sort('max_streak', -1)
+        ]
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
+
+
+class MongoWordRepository:
+    """Слова словаря (коллекция words)"""
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.words = self.db['words']
+        self.meta = self.db[META_COLLECTION]
+        self._words_version = None
+        self._version_checked_at = None
+
+    def sample(self, size, difficulty=None):
+        """Случайные слова (только заданной сложности, если она указана)"""
+        pipeline = [{'$match': {'difficulty': difficulty}}] if difficulty else []
+        pipeline.append({'$sample': {'size': size}})
+        return list(self.words.aggregate(pipeline))
+
+    def find_by_ids(self, ids, projection=None):
+        """Слова по строковым _id; невалидные id пропускаются"""
+        ids = object_ids(ids)
+        if not ids:
+            return []
+        return list(self.words.find({'_id': {'$in': ids}}, projection))
+
+    def replacement_candidates(self):
+        """
+        Слова без "1." в определениях — из них берутся замены для /cards.
+        Список кэшируется до изменения словаря: тег words сбрасывается в этом
+        процессе, а импорт из другого процесса меняет версию в meta
+        (mark_words_changed) — она входит в ключ записи.
+        """
+        return decks_cache.get_or_set(
+            f'replacements:{self._current_words_version()}', self._load_replacement_candidates, tags=(WORDS_TAG,)
+        )
+
+    def _current_words_version(self):
+        """Версия словаря из meta; сверяется не чаще WORD_INDEX_REFRESH_SECONDS"""
+        now = time.monotonic()
+        if self._version_checked_at is None or now - self._version_checked_at >= WORD_INDEX_REFRESH_SECONDS:
+            doc = self.meta.find_one({'_id': WORDS_VERSION_ID}, {'version': 1})
+            self._words_version = doc['version'] if doc else None
+            self._version_checked_at = now
+        return self._words_version
+
+    def _load_replacement_candidates(self):
+        return list(self.words.find({
+            'definitions': {'$not': {'$regex': '1\\.'}}
+        }, {'definitions': 1, 'clean_definitions': 1, 'word': 1}))
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
+
+
+class Storage:
+    """Репозитории одного бэкенда"""
+
+    def __init__(self, backend, users, words, answers, visits, streaks, revocations):
+        self.backend = backend
+        self.users = users
+        self.words = words
+        self.answers = answers
+        self.visits = visits
+        self.streaks = streaks
+        self.revocations = revocations
+
+    def close(self):
+        for repository in (self.users, self.words, self.answers, self.visits,
+                           self.streaks, self.revocations):
+            repository.close_connection()
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    """Репозитории выбранного бэкенда"""
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f'Unknown storage backend: {backend}')
+
+    if backend == 'memory':
+        from models.memory_storage import (
+            MemoryAnswerStore, MemoryTokenRevocations, MemoryUserRepository,
+            MemoryUserStreak, MemoryUserVisit, MemoryWordRepository
+        )
+
+        words = MemoryWordRepository()
+        if MEMORY_WORDS_DIR:
+            words.load_directory(MEMORY_WORDS_DIR)
+        return Storage(
+            backend,
+            users=MemoryUserRepository(),
+            words=words,
+            answers=MemoryAnswerStore(),
+            visits=MemoryUserVisit(),
+            streaks=MemoryUserStreak(),
+            revocations=MemoryTokenRevocations()
+        )
+
+    from models.answers import AnswerStore
+    from models.token_revocation import TokenRevocations
+    from models.user_streak import UserStreak
+    from models.user_visits import UserVisit
+
+    return Storage(
+        backend,
+        users=MongoUserRepository(),
+        words=MongoWordRepository(),
+        answers=AnswerStore(),
+        visits=UserVisit(),
+        streaks=UserStreak(),
+        revocations=TokenRevocations()
+    )
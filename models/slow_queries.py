@@ -0,0 +1,305 @@
+from pymongo import MongoClient, monitoring
+from pymongo.errors import CollectionInvalid
+from collections import OrderedDict
+from datetime import datetime
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+
+from dotenv import load_dotenv
+from flask import has_request_context, request
+
+# Загрузка переменных окружения
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+# Порог медленной команды в миллисекундах (0 — запись выключена)
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 100))
+# Размер capped коллекции slow_queries
+SLOW_QUERY_LOG_BYTES = int(os.getenv('SLOW_QUERY_LOG_BYTES', 16 * 1024 * 1024))
+
+# Команды, для которых есть explain, и поле с условием отбора
+FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'aggregate': 'pipeline',
+    'update': 'updates',
+    'delete': 'deletes',
+}
+# Служебные поля команды, которые не передаются в explain
+SESSION_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern'}
+# Не больше стольких записей в очереди на запись; остальное отбрасывается
+MAX_PENDING = 1000
+# Сколько последних форм помнить как уже разобранные explain
+MAX_EXPLAINED = 10000
+
+
+def strip_literals(value):
+    """Форма условия: структура и операторы сохраняются, значения заменяются на '?'"""
+    if isinstance(value, dict):
+        return {key: strip_literals(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            # Стадии конвейера и ветки $or/$and
+            return [strip_literals(item) for item in value]
+        return '?'
+    return '?'
+
+
+def command_shape(command_name, command):
+    """Форма команды: коллекция, отбор и сортировка без литералов"""
+    collection = command.get('collection') if command_name == 'getMore' else command.get(command_name)
+    shape = {'command': command_name, 'collection': collection}
+    field = FILTER_FIELDS.get(command_name)
+    if field == 'updates' or field == 'deletes':
+        statements = command.get(field) or [{}]
+        shape['filter'] = strip_literals(statements[0].get('q', {}))
+    elif field is not None:
+        shape['filter'] = strip_literals(command.get(field, {}))
+    if 'sort' in command:
+        # Направление сортировки — часть формы
+        shape['sort'] = dict(command['sort'])
+    return shape
+
+
+def shape_hash(shape):
+    return hashlib.sha1(json.dumps(shape, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def _plan_stages(plan):
+    stages = []
+    while plan:
+        stages.append(plan.get('stage'))
+        for child in plan.get('inputStages', ())[1:]:
+            stages.extend(_plan_stages(child))
+        plan = plan.get('inputStage')
+    return stages
+
+
+def summarize_plan(explain):
+    """Стадии выигравшего плана и статистика выполнения из вывода explain"""
+    planner = explain.get('queryPlanner')
+    if planner is None:
+        # aggregate: план первой стадии $cursor
+        for stage in explain.get('stages', ()):
+            if '$cursor' in stage:
+                planner = stage['$cursor'].get('queryPlanner')
+                explain = stage['$cursor']
+                break
+    stages = _plan_stages((planner or {}).get('winningPlan', {}).get('queryPlan')
+                          or (planner or {}).get('winningPlan', {}))
+    stats = explain.get('executionStats', {})
+    return {
+        'stages': stages,
+        'collscan': 'COLLSCAN' in stages,
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'returned': stats.get('nReturned'),
+        'execution_ms': stats.get('executionTimeMillis'),
+    }
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных команд MongoDB.
+
+    Команды дольше SLOW_QUERY_MS пишутся в capped коллекцию slow_queries
+    с формой условия (без литералов). Для каждой новой формы в фоне
+    выполняется explain('executionStats'), итог сохраняется в query_plans.
+    Запись идет в одном фоновом потоке из очереди на MAX_PENDING записей.
+    Клиент журнала создается до регистрации слушателя, поэтому его
+    собственные команды не записываются.
+    """
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        if SLOW_QUERY_MS > 0 and 'slow_queries' not in self.db.list_collection_names():
+            try:
+                self.db.create_collection('slow_queries', capped=True, size=SLOW_QUERY_LOG_BYTES)
+            except CollectionInvalid:
+                pass
+        self.slow_queries = self.db['slow_queries']
+        self.plans = self.db['query_plans']
+
+        self._queue = queue.Queue(maxsize=MAX_PENDING)
+        # Поток запускается при первой записи (в каждом процессе после fork)
+        self._worker = None
+        # LRU форм, для которых explain уже выполнен
+        self._explained = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register_listener(self):
+        """Подключает запись медленных команд (для клиентов, созданных позже)"""
+        if SLOW_QUERY_MS > 0:
+            monitoring.register(SlowQueryListener(self, SLOW_QUERY_MS))
+
+    def is_explained(self, key):
+        """Выполнялся ли уже explain для формы"""
+        with self._lock:
+            if key not in self._explained:
+                return False
+            self._explained.move_to_end(key)
+            return True
+
+    def _mark_explained(self, key):
+        """Отмечает форму; True, если она новая"""
+        with self._lock:
+            is_new = key not in self._explained
+            self._explained[key] = True
+            self._explained.move_to_end(key)
+            while len(self._explained) > MAX_EXPLAINED:
+                self._explained.popitem(last=False)
+        return is_new
+
+    def submit(self, database_name, command_name, shape, command, duration_ms, route):
+        """
+        Ставит запись медленной команды в очередь (из потока запроса).
+        command — команда для explain или None, если форма уже разобрана.
+        """
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                self._worker.start()
+        try:
+            self._queue.put_nowait((database_name, command_name, shape, command, duration_ms, route))
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._record(*item)
+
+    def _record(self, database_name, command_name, shape, command, duration_ms, route):
+        try:
+            key = shape_hash(shape)
+            self.slow_queries.insert_one({
+                'shape_hash': key,
+                'shape': json.dumps(shape, default=str),
+                'collection': shape['collection'],
+                'command': command_name,
+                'duration_ms': duration_ms,
+                'route': route,
+                'at': datetime.utcnow()
+            })
+
+            if command is not None and self._mark_explained(key):
+                self._explain(database_name, command_name, command, key, shape)
+        except Exception:
+            logger.exception("Error in SlowQueryLog record")
+
+    def _explain(self, database_name, command_name, command, key, shape):
+        if self.plans.count_documents({'_id': key}, limit=1):
+            return
+        explained = {
+            field: value for field, value in command.items()
+            if not field.startswith('$') and field not in SESSION_FIELDS
+        }
+        result = self.client[database_name].command({'explain': explained, 'verbosity': 'executionStats'})
+        self.plans.update_one(
+            {'_id': key},
+            {'$set': dict(
+                summarize_plan(result),
+                shape=json.dumps(shape, default=str),
+                collection=shape['collection'],
+                command=command_name,
+                explained_at=datetime.utcnow()
+            )},
+            upsert=True
+        )
+
+    def top_shapes(self, limit=20, since=None):
+        """Формы команд по суммарному времени, с планами"""
+        match = {'at': {'$gte': since}} if since else {}
+        shapes = list(self.slow_queries.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': '$shape_hash',
+                'shape': {'$first': '$shape'},
+                'collection': {'$first': '$collection'},
+                'command': {'$first': '$command'},
+                'count': {'$sum': 1},
+                'total_ms': {'$sum': '$duration_ms'},
+                'max_ms': {'$max': '$duration_ms'},
+                'routes': {'$addToSet': '$route'},
+                'last_at': {'$max': '$at'}
+            }},
+            {'$sort': {'total_ms': -1}},
+            {'$limit': limit}
+        ]))
+
+        plans = {
+            plan['_id']: plan
+            for plan in self.plans.find({'_id': {'$in': [shape['_id'] for shape in shapes]}})
+        }
+        for shape in shapes:
+            shape['shape_hash'] = shape.pop('_id')
+            # Форма хранится строкой: ключи-операторы ($regex, ...) нельзя сохранять как поля
+            shape['shape'] = json.loads(shape['shape'])
+            shape['avg_ms'] = round(shape['total_ms'] / shape['count'], 2)
+            plan = plans.get(shape['shape_hash'])
+            shape['plan'] = {
+                field: plan.get(field)
+                for field in ('stages', 'collscan', 'docs_examined', 'keys_examined', 'returned', 'execution_ms')
+            } if plan else None
+        return shapes
+
+    def close_connection(self):
+        """Дописывает очередь и закрывает соединение с MongoDB"""
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self.client.close()
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Передает в SlowQueryLog команды дольше порога"""
+
+    def __init__(self, log, threshold_ms):
+        self.log = log
+        self.threshold_micros = threshold_ms * 1000
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event):
+        return event.connection_id, event.request_id, event.operation_id
+
+    def started(self, event):
+        # До завершения держим только форму; саму команду — лишь пока для
+        # ее формы не выполнен explain (ему нужны настоящие значения)
+        shape = command_shape(event.command_name, event.command)
+        command = None
+        if event.command_name in FILTER_FIELDS and not self.log.is_explained(shape_hash(shape)):
+            command = event.command
+        with self._lock:
+            self._pending[self._key(event)] = (shape, command)
+
+    def succeeded(self, event):
+        with self._lock:
+            pending = self._pending.pop(self._key(event), None)
+        if pending is None or event.duration_micros < self.threshold_micros:
+            return
+        shape, command = pending
+        route = request.url_rule.rule if has_request_context() and request.url_rule else None
+        self.log.submit(
+            event.database_name, event.command_name, shape,
+            copy.deepcopy(command) if command is not None else None,
+            event.duration_micros / 1000, route
+        )
+
+    def failed(self, event):
+        with self._lock:
+            self._pending.pop(self._key(event), None)
@@ -0,0 +1,107 @@
+from pymongo import MongoClient
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from utils.bloom import BloomFilter
+
+# Загрузка переменных окружения
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+# Как часто перечитывать список отозванных токенов
+TOKEN_REVOCATION_REFRESH_SECONDS = int(os.getenv('TOKEN_REVOCATION_REFRESH_SECONDS', 30))
+
+
+class TokenRevocations:
+    """
+    Отозванные подписанные токены (коллекция revoked_tokens).
+
+    Проверка идет по фильтру Блума в памяти, который перестраивается в фоне
+    не чаще раза в TOKEN_REVOCATION_REFRESH_SECONDS. База читается только
+    при срабатывании фильтра — чтобы отсечь его ложные срабатывания.
+    Токен, отозванный в другом процессе, перестает приниматься после
+    очередного обновления фильтра.
+    """
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.revoked = self.db['revoked_tokens']
+        # Запись можно удалить, когда токен истек бы сам
+        self.revoked.create_index('expires_at', expireAfterSeconds=0)
+
+        self._bloom = None
+        # Отзывы, сделанные во время перестройки фильтра (None — перестройки нет)
+        self._pending = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._loading = False
+
+    def start(self):
+        """Загружает фильтр в фоне"""
+        self._reload_async()
+
+    def _reload_async(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._reload, name='token-revocations', daemon=True).start()
+
+    def _reload(self):
+        with self._lock:
+            self._pending = []
+        try:
+            bloom = BloomFilter.from_items(doc['_id'] for doc in self.revoked.find({}, {'_id': 1}))
+            # Отзыв после начала чтения мог не попасть в снимок — добавляем его сами
+            with self._lock:
+                for token_id in self._pending:
+                    bloom.add(token_id)
+                self._bloom = bloom
+        except Exception:
+            logger.exception("Error in TokenRevocations reload")
+        finally:
+            with self._lock:
+                self._pending = None
+            self._checked_at = time.monotonic()
+            self._loading = False
+
+    def is_revoked(self, token_id):
+        """Отозван ли токен; без обращения к базе, если фильтр его не знает"""
+        if time.monotonic() - self._checked_at >= TOKEN_REVOCATION_REFRESH_SECONDS:
+            self._reload_async()
+
+        bloom = self._bloom
+        if bloom is not None and token_id not in bloom:
+            return False
+        # Фильтр еще не загружен или сработал — проверяем точно
+        return self.revoked.find_one({'_id': token_id}, {'_id': 1}) is not None
+
+    def revoke(self, token_id, user_id, expires_at=None):
+        """Отзывает токен"""
+        self.revoked.update_one(
+            {'_id': token_id},
+            {'$setOnInsert': {
+                'user_id': user_id,
+                'revoked_at': datetime.utcnow(),
+                'expires_at': expires_at
+            }},
+            upsert=True
+        )
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(token_id)
+            if self._pending is not None:
+                self._pending.append(token_id)
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
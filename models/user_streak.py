@@ -1,18 +1,38 @@
-from pymongo import MongoClient
-from datetime import date
-from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from datetime import datetime, timedelta
+import logging
 import math
 import os
+import uuid
 
 from dotenv import load_dotenv
 
+from models.daily_stats import utc_today
+from utils import uuid_codec
+from utils.singleflight import SingleFlight, coalesced
+
 # Загрузка переменных окружения
 load_dotenv()
 # from config import Config
 
+logger = logging.getLogger(__name__)
+
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
 
+# Одинаковые параллельные запросы рейтинга читают базу один раз
+ranking_flights = SingleFlight('streak_ranking')
+
+
+def _ranking_key(model, page=1, per_page=20, search_query=None):
+    return ('ranking', id(model), int(page), int(per_page), search_query or None)
+
+
+def _top_key(model, limit=10):
+    return ('top', id(model), int(limit))
+
+
 class UserStreak:
     def __init__(self):
         self.client = MongoClient(MONGODB_URI)
@@ -21,23 +41,177 @@ class UserStreak:
         self.streaks = self.db['user_streaks']
         # self.visits = self.db.streak_visits
         # self.streaks = self.db.user_streaks
-        self.executor = ThreadPoolExecutor(max_workers=10)
         
         # Создаем индексы для быстрого поиска
         self.visits.create_index('visit_date')
         self.visits.create_index('user_id')
-        self.streaks.create_index('user_id')
+        self._create_unique_visit_index()
+        self._create_unique_user_index()
         self.streaks.create_index([('current_streak', -1)])
     
-    # ... предыдущие методы остаются без изменений ...
+    def _create_unique_visit_index(self):
+        """Одно посещение на пользователя в день — дубликаты отсекает сам индекс"""
+        keys = [('user_id', 1), ('visit_date', 1)]
+        try:
+            self.visits.create_index(keys, unique=True)
+        except OperationFailure:
+            try:
+                # Прежний неуникальный индекс с тем же именем
+                self.visits.drop_index('user_id_1_visit_date_1')
+                self.visits.create_index(keys, unique=True)
+            except OperationFailure:
+                logger.exception("Error creating unique streak_visits index (duplicate visits?)")
+                self.visits.create_index(keys)
+    
+    def _create_unique_user_index(self):
+        """Один документ стрика на пользователя — параллельные upsert не создадут дубликат"""
+        try:
+            self.streaks.create_index('user_id', unique=True)
+        except OperationFailure:
+            try:
+                # Прежний неуникальный индекс с тем же именем
+                self.streaks.drop_index('user_id_1')
+                self.streaks.create_index('user_id', unique=True)
+            except OperationFailure:
+                logger.exception("Error creating unique user_streaks.user_id index (duplicate streaks?)")
+                self.streaks.create_index('user_id')
+    
+    def track_visit(self, user_id):
+        """Записывает посещение за сегодня и обновляет стрик"""
+        return self.record_visit(user_id)[0]
+    
+    def record_visit(self, user_id):
+        """
+        Как track_visit, но возвращает (стрик, изменился ли он) — по флагу
+        вызывающий код решает, сбрасывать ли кэш рейтингов.
+        
+        Сначала обновляется стрик: повторное посещение за день (частый случай)
+        обходится одним запросом. Только первое за день пишет и посещение —
+        upsert по (user_id, visit_date), поэтому гонка двух первых заходов не
+        создаст дубликат и без уникального индекса. Дни считаются по UTC.
+        """
+        today = utc_today()
+        # Метка обновления с точностью BSON: по ней видно, изменил ли стрик этот вызов
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        
+        streak = self._update_streak(user_id, today, now)
+        if streak.get('updated_at') != now:
+            return self._serialize_streak(streak), False
+        
+        try:
+            self.visits.update_one(
+                {'user_id': uuid_codec.match(user_id), 'visit_date': today.isoformat()},
+                {'$setOnInsert': {
+                    '_id': str(uuid.uuid4()),
+                    'user_id': uuid_codec.encode(user_id),
+                    'created_at': now
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Параллельный первый заход уже записал посещение
+            pass
+        return self._serialize_streak(streak), True
+    
+    def _update_streak(self, user_id, today, now):
+        """Обновляет стрик за today; повторяет upsert, если параллельный создал документ"""
+        for attempt in range(2):
+            try:
+                return self.streaks.find_one_and_update(
+                    {'user_id': uuid_codec.match(user_id)},
+                    self._streak_update_pipeline(today, uuid_codec.encode(user_id), now),
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                if attempt:
+                    raise
+    
+    @staticmethod
+    def _streak_update_pipeline(today, user_id, now):
+        """
+        Обновление стрика одним атомарным запросом (update с pipeline).
+        
+        Вчерашнее посещение продлевает стрик, сегодняшнее ничего не меняет
+        (в том числе updated_at — повторное обновление не пишет в базу),
+        любой пропуск (или первый заход) начинает стрик заново с 1.
+        user_id записывается при вставке: фильтр по двум представлениям id
+        сам его не задает.
+        """
+        today_str = today.isoformat()
+        yesterday_str = (today - timedelta(days=1)).isoformat()
+        last_visit = '$last_visit_date'
+        # Даты, записанные по местному времени до перехода на UTC, бывают
+        # на день впереди — такое посещение тоже считается сегодняшним
+        visited_today = {'$gte': [last_visit, today_str]}
+        
+        return [
+            {'$set': {
+                'current_streak': {'$switch': {
+                    'branches': [
+                        {'case': visited_today,
+                         'then': '$current_streak'},
+                        {'case': {'$eq': [last_visit, yesterday_str]},
+                         'then': {'$add': ['$current_streak', 1]}}
+                    ],
+                    'default': 1
+                }},
+                'start_date': {'$cond': [
+                    {'$gte': [last_visit, yesterday_str]},
+                    '$start_date',
+                    today_str
+                ]},
+                'total_visits': {'$add': [
+                    {'$ifNull': ['$total_visits', 0]},
+                    {'$cond': [visited_today, 0, 1]}
+                ]}
+            }},
+            {'$set': {
+                'longest_streak': {'$max': [{'$ifNull': ['$longest_streak', 0]}, '$current_streak']},
+                'last_visit_date': {'$cond': [visited_today, last_visit, today_str]},
+                'user_id': {'$ifNull': ['$user_id', {'$literal': user_id}]},
+                'updated_at': {'$cond': [visited_today, '$updated_at', now]}
+            }}
+        ]
+    
+    def get_streak_info(self, user_id):
+        """Получает информацию о стрике пользователя"""
+        streak = self.streaks.find_one({'user_id': uuid_codec.match(user_id)})
+        return self._serialize_streak(streak)
     
+    def _serialize_streak(self, streak):
+        """Преобразует документ стрика в ответ API"""
+        if not streak:
+            return {
+                'current_streak': 0,
+                'longest_streak': 0,
+                'total_visits': 0,
+                'last_visit_date': None,
+                'start_date': None
+            }
+        
+        total_visits = streak.get('total_visits')
+        if total_visits is None:
+            # Старые документы без счетчика
+            total_visits = self.visits.count_documents(
+                {'user_id': uuid_codec.match(uuid_codec.decode(streak['user_id']))}
+            )
+        
+        return {
+            'current_streak': streak['current_streak'],
+            'longest_streak': streak['longest_streak'],
+            'total_visits': total_visits,
+            'last_visit_date': streak.get('last_visit_date'),
+            'start_date': streak.get('start_date')
+        }
+    
+    @coalesced(ranking_flights, _ranking_key)
     def get_streak_ranking(self, page=1, per_page=20, search_query=None):
-        """Получает рейтинг стриков с пагинацией"""
+        """Получает рейтинг стриков с пагинацией (search_query — начало user_id)"""
         try:
-            # Базовый запрос
-            query = {}
-            if search_query:
-                query['user_id'] = {'$regex': f'.*{search_query}.*', '$options': 'i'}
+            # Базовый запрос; по началу id — строковые и бинарные user_id ищутся одинаково
+            query = uuid_codec.prefix_filter('user_id', search_query) if search_query else {}
             
             # Общее количество пользователей
             total_users = self.streaks.count_documents(query)
@@ -52,20 +226,8 @@ class UserStreak:
             
             streaks_list = list(streaks_cursor)
             
-            # Параллельно получаем дополнительную информацию для каждого пользователя
-            ranking_data = []
-            futures = []
-            
-            for streak in streaks_list:
-                future = self.executor.submit(self._get_user_ranking_data, streak)
-                futures.append(future)
-            
-            # Ждем завершения всех потоков
-            for future in futures:
-                ranking_data.append(future.result())
-            
             return {
-                'ranking': ranking_data,
+                'ranking': self._get_ranking_data(streaks_list),
                 'pagination': {
                     'page': page,
                     'per_page': per_page,
@@ -76,8 +238,8 @@ class UserStreak:
                 }
             }
             
-        except Exception as e:
-            print(f"Error in get_streak_ranking: {e}")
+        except Exception:
+            logger.exception("Error in get_streak_ranking")
             return {
                 'ranking': [],
                 'pagination': {
@@ -90,56 +252,68 @@ class UserStreak:
                 }
             }
     
-    def _get_user_ranking_data(self, streak):
-        """Получает данные пользователя для рейтинга (выполняется в отдельном потоке)"""
-        try:
-            user_id = streak['user_id']
-            
-            # Получаем количество посещений
-            visits_count = self.visits.count_documents({'user_id': user_id})
-            
-            # Получаем дату последнего посещения
-            last_visit = self.visits.find_one(
-                {'user_id': user_id},
-                sort=[('visit_date', -1)]
-            )
-            
-            # Вычисляем позицию в рейтинге (примерно)
-            rank_position = self.streaks.count_documents({
-                'current_streak': {'$gt': streak['current_streak']}
-            }) + 1
-            
-            return {
+    def _get_ranking_data(self, streaks, with_rank=True):
+        """
+        Данные рейтинга для списка стриков: посещения всех пользователей — одной
+        агрегацией, позиции — второй (with_rank=False, если позиции задает вызывающий).
+        """
+        if not streaks:
+            return []
+        
+        user_ids = [uuid_codec.decode(streak['user_id']) for streak in streaks]
+        visits = self._get_visits_summary(user_ids)
+        rank_positions = self._get_rank_positions(
+            {streak['current_streak'] for streak in streaks}
+        ) if with_rank else {}
+        today = utc_today().isoformat()
+        
+        ranking_data = []
+        for user_id, streak in zip(user_ids, streaks):
+            visits_count, last_visit_date = visits.get(user_id, (0, None))
+            ranking_data.append({
                 'user_id': user_id,
                 'current_streak': streak['current_streak'],
                 'longest_streak': streak['longest_streak'],
                 'total_visits': visits_count,
-                'last_visit_date': last_visit['visit_date'] if last_visit else None,
-                'rank_position': rank_position,
+                'last_visit_date': last_visit_date,
+                'rank_position': rank_positions.get(streak['current_streak'], 0),
                 'start_date': streak.get('start_date'),
-                'is_active_today': self._is_active_today(user_id)
-            }
-        except Exception as e:
-            print(f"Error in _get_user_ranking_data for {streak.get('user_id')}: {e}")
-            return {
-                'user_id': streak.get('user_id', 'unknown'),
-                'current_streak': streak.get('current_streak', 0),
-                'longest_streak': streak.get('longest_streak', 0),
-                'total_visits': 0,
-                'last_visit_date': None,
-                'rank_position': 0,
-                'start_date': None,
-                'is_active_today': False
-            }
+                'is_active_today': last_visit_date == today
+            })
+        return ranking_data
+    
+    def _get_visits_summary(self, user_ids):
+        """user_id -> (количество посещений, дата последнего) одним запросом"""
+        values = []
+        for user_id in user_ids:
+            user_filter = uuid_codec.match(user_id)
+            values.extend(user_filter['$in'] if isinstance(user_filter, dict) else [user_filter])
+        
+        summary = {}
+        for doc in self.visits.aggregate([
+            {'$match': {'user_id': {'$in': values}}},
+            {'$group': {'_id': '$user_id', 'count': {'$sum': 1}, 'last': {'$max': '$visit_date'}}}
+        ]):
+            # Во время миграции посещения одного пользователя — под двумя представлениями id
+            user_id = uuid_codec.decode(doc['_id'])
+            count, last = summary.get(user_id, (0, None))
+            summary[user_id] = (count + doc['count'], max(filter(None, [last, doc['last']]), default=None))
+        return summary
     
-    def _is_active_today(self, user_id):
-        """Проверяет, был ли пользователь активен сегодня"""
-        today = date.today().isoformat()
-        return self.visits.find_one({
-            'user_id': user_id,
-            'visit_date': today
-        }) is not None
+    def _get_rank_positions(self, current_streaks):
+        """current_streak -> позиция (пользователей с большим стриком + 1) одним запросом"""
+        greater = {}
+        for doc in self.streaks.aggregate([
+            {'$match': {'current_streak': {'$gt': min(current_streaks)}}},
+            {'$group': {'_id': '$current_streak', 'count': {'$sum': 1}}}
+        ]):
+            greater[doc['_id']] = doc['count']
+        return {
+            value: sum(count for streak, count in greater.items() if streak > value) + 1
+            for value in current_streaks
+        }
     
+    @coalesced(ranking_flights, _top_key)
     def get_top_streaks(self, limit=10):
         """Получает топ-N стриков"""
         try:
@@ -147,29 +321,20 @@ class UserStreak:
                               .sort('current_streak', -1)
                               .limit(limit))
             
-            # Параллельная обработка топовых пользователей
-            top_data = []
-            futures = []
-            
-            for streak in top_streaks:
-                future = self.executor.submit(self._get_user_ranking_data, streak)
-                futures.append(future)
-            
-            for future in futures:
-                result = future.result()
-                result['rank_position'] = len(top_data) + 1  # Точная позиция в топе
-                top_data.append(result)
+            top_data = self._get_ranking_data(top_streaks, with_rank=False)
+            for position, result in enumerate(top_data, 1):
+                result['rank_position'] = position  # Точная позиция в топе
             
             return top_data
             
-        except Exception as e:
-            print(f"Error in get_top_streaks: {e}")
+        except Exception:
+            logger.exception("Error in get_top_streaks")
             return []
     
     def get_user_rank(self, user_id):
         """Получает позицию конкретного пользователя в рейтинге"""
         try:
-            user_streak = self.streaks.find_one({'user_id': user_id})
+            user_streak = self.streaks.find_one({'user_id': uuid_codec.match(user_id)})
             if not user_streak:
                 return None
             
@@ -178,16 +343,15 @@ class UserStreak:
                 'current_streak': {'$gt': user_streak['current_streak']}
             }) + 1
             
-            user_data = self._get_user_ranking_data(user_streak)
+            user_data = self._get_ranking_data([user_streak], with_rank=False)[0]
             user_data['rank_position'] = rank_position
             
             return user_data
             
-        except Exception as e:
-            print(f"Error in get_user_rank: {e}")
+        except Exception:
+            logger.exception("Error in get_user_rank")
             return None
     
     def close_connection(self):
-        """Закрывает соединение с MongoDB и executor"""
-        self.executor.shutdown(wait=True)
+        """Закрывает соединение с MongoDB"""
         self.client.close()
\ No newline at end of file
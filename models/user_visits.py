@@ -1,9 +1,12 @@
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, date
 import uuid
 import os
 from dotenv import load_dotenv
 
+from utils import uuid_codec
+
 # Загрузка переменных окружения
 load_dotenv()
 # from config import Config
@@ -18,37 +21,46 @@ class UserVisit:
         self.visits = self.db['visits']
         # Создаем индекс для быстрого поиска по дате
         self.visits.create_index('visit_date')
+        # Одно посещение на пользователя в день
+        self.visits.create_index([('user_id', 1), ('visit_date', 1)], unique=True)
     
-    def track_visit(self):
-        """Добавляет запись о посещении, если сегодня еще не было посещений"""
-        today = date.today()
+    def track_visit(self, user_id):
+        """
+        Добавляет запись о посещении пользователя, если сегодня его еще не было.
         
-        # Проверяем, есть ли уже посещение сегодня
-        existing_visit = self.visits.find_one({
-            'visit_date': today.isoformat()
-        })
-        
-        if existing_visit:
-            return None  # Посещение уже было сегодня
+        Выполняется одним идемпотентным upsert: возвращает id новой записи
+        или None, если посещение уже было сегодня.
+        """
+        today = date.today()
         
-        # Создаем новую запись
-        visit_data = {
-            '_id': str(uuid.uuid4()),
-            'visit_date': today.isoformat(),  # Сохраняем как строку в формате YYYY-MM-DD
-            'created_at': datetime.now()
-        }
+        try:
+            result = self.visits.update_one(
+                {
+                    'user_id': uuid_codec.match(user_id),
+                    'visit_date': today.isoformat()  # Сохраняем как строку в формате YYYY-MM-DD
+                },
+                {'$setOnInsert': {
+                    '_id': str(uuid.uuid4()),
+                    'user_id': uuid_codec.encode(user_id),
+                    'created_at': datetime.now()
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Параллельный запрос успел вставить запись раньше
+            return None
         
-        result = self.visits.insert_one(visit_data)
-        return result.inserted_id
+        return result.upserted_id
     
-    def has_visited_today(self):
-        """Проверяет, было ли уже посещение сегодня"""
+    def has_visited_today(self, user_id):
+        """Проверяет, было ли уже посещение пользователя сегодня"""
         today = date.today().isoformat()
-        return self.visits.find_one({'visit_date': today}) is not None
+        return self.visits.find_one({'user_id': uuid_codec.match(user_id), 'visit_date': today}) is not None
     
-    def get_all_visits(self):
-        """Возвращает все посещения"""
-        return list(self.visits.find().sort('visit_date', -1))
+    def get_all_visits(self, user_id=None):
+        """Возвращает все посещения (или только посещения пользователя)"""
+        query = {'user_id': uuid_codec.match(user_id)} if user_id else {}
+        return list(self.visits.find(query).sort('visit_date', -1))
     
     def get_visits_by_date(self, target_date):
         """Возвращает посещение за определенную дату"""
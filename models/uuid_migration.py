@@ -0,0 +1,151 @@
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from utils.uuid_codec import to_binary
+
+# Загрузка переменных окружения
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+
+# Коллекции и поля с id, которые переводятся в бинарный вид
+UUID_FIELDS = {
+    'users': ('user_id', 'token'),
+    'answers': ('user_id', 'card_id'),
+    'answer_buckets': ('user_id',),
+    'visits': ('user_id',),
+    'streak_visits': ('user_id',),
+    'user_streaks': ('user_id',),
+}
+# Массивы ответов в бакетах: card_id хранится в поле c
+BUCKET_ANSWERS = 'answers'
+DUPLICATE_KEY = 11000
+# Сколько раз повторять проход по документам, которые изменились во время миграции
+MAX_PASSES = 5
+
+
+class UuidMigration:
+    """
+    Перевод строковых id в бинарные (см. utils/uuid_codec.py).
+
+    Документы со строковыми id читаются курсором и обновляются пачками через
+    bulk_write. Запускать после включения USE_BINARY_UUIDS, чтобы новые записи
+    уже шли в бинарном виде; чтение по обоим представлениям (UUID_DUAL_READ)
+    можно выключить после завершения миграции.
+
+    Миграция идет под нагрузкой: элементы answers в бакетах меняются по
+    индексу и только если они еще равны прочитанным, поэтому параллельный
+    $push из /answer не теряется. Документы, изменившиеся между чтением и
+    записью, обрабатываются следующим проходом.
+    """
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+
+    @staticmethod
+    def _converted(doc, fields):
+        """
+        (условие, $set) для перевода полей документа в бинарный вид (пустой
+        $set — менять нечего). Условие требует, чтобы элементы answers не
+        изменились с момента чтения.
+        """
+        guard = {}
+        update = {}
+        for field in fields:
+            binary = to_binary(doc.get(field))
+            if binary is not None:
+                update[field] = binary
+
+        answers = doc.get(BUCKET_ANSWERS)
+        if isinstance(answers, list):
+            for index, item in enumerate(answers):
+                binary = to_binary(item.get('c')) if isinstance(item, dict) else None
+                if binary is not None:
+                    path = f'{BUCKET_ANSWERS}.{index}.c'
+                    guard[path] = item['c']
+                    update[path] = binary
+        return guard, update
+
+    def migrate_collection(self, name, fields, batch_size=1000, progress=None):
+        """Конвертирует одну коллекцию; возвращает (обновлено, удалено дубликатов)"""
+        updated = duplicates = 0
+        for _ in range(MAX_PASSES):
+            result = self._migrate_pass(name, fields, batch_size, progress, updated)
+            updated += result[0]
+            duplicates += result[1]
+            if not result[2]:
+                break
+        else:
+            logger.warning('%s: documents still changing after %d passes, rerun the migration', name, MAX_PASSES)
+        return updated, duplicates
+
+    def _migrate_pass(self, name, fields, batch_size, progress, done):
+        """Один проход: (обновлено, удалено дубликатов, пропущено изменившихся)"""
+        collection = self.db[name]
+        conditions = [{field: {'$type': 'string'}} for field in fields]
+        projection = dict.fromkeys(fields, 1)
+        if name == 'answer_buckets':
+            conditions.append({f'{BUCKET_ANSWERS}.c': {'$type': 'string'}})
+            projection[BUCKET_ANSWERS] = 1
+
+        updated = 0
+        duplicates = 0
+        missed = 0
+        operations = []
+        ids = []
+
+        def flush():
+            nonlocal updated, duplicates, missed
+            if not operations:
+                return
+            try:
+                result = collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+                missed += len(operations) - result.matched_count
+            except BulkWriteError as e:
+                updated += e.details.get('nModified', 0)
+                missed += len(operations) - len(e.details.get('writeErrors', [])) - e.details.get('nMatched', 0)
+                # Запись уже есть в бинарном виде (уникальный индекс) — строковая копия лишняя
+                stale = [
+                    ids[error['index']]
+                    for error in e.details.get('writeErrors', [])
+                    if error.get('code') == DUPLICATE_KEY
+                ]
+                if len(stale) != len(e.details.get('writeErrors', [])):
+                    raise
+                duplicates += collection.delete_many({'_id': {'$in': stale}}).deleted_count
+            operations.clear()
+            ids.clear()
+            if progress:
+                progress(done + updated)
+
+        for doc in collection.find({'$or': conditions}, projection).batch_size(batch_size):
+            guard, update = self._converted(doc, fields)
+            if update:
+                operations.append(UpdateOne(dict(guard, _id=doc['_id']), {'$set': update}))
+                ids.append(doc['_id'])
+            if len(operations) >= batch_size:
+                flush()
+        flush()
+        return updated, duplicates, missed
+
+    def run(self, batch_size=1000, progress=None):
+        """Конвертирует все коллекции из UUID_FIELDS"""
+        results = {}
+        for name, fields in UUID_FIELDS.items():
+            results[name] = self.migrate_collection(
+                name, fields, batch_size, progress(name) if progress else None
+            )
+        return results
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
@@ -0,0 +1,230 @@
+from pymongo import MongoClient, UpdateOne
+from bisect import bisect_left
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from utils.cache import invalidate
+from utils.normalization import fold_headword, normalize_headword
+
+# Загрузка переменных окружения
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('DATABASE_NAME', 'tatar_learning')
+# Как часто проверять, не был ли словарь переимпортирован
+WORD_INDEX_REFRESH_SECONDS = int(os.getenv('WORD_INDEX_REFRESH_SECONDS', 30))
+
+META_COLLECTION = 'meta'
+WORDS_VERSION_ID = 'words_version'
+# Тег кэша данных, зависящих от словаря
+WORDS_TAG = 'words'
+# Символ больше любой буквы — верхняя граница диапазона по префиксу
+_PREFIX_END = '\uffff'
+
+
+def mark_words_changed(db):
+    """Отмечает изменение словаря, чтобы индексы в памяти перестроились"""
+    db[META_COLLECTION].update_one(
+        {'_id': WORDS_VERSION_ID},
+        {'$set': {'version': str(uuid.uuid4()), 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+    # При общем бэкенде кэша (shared, redis) сбросит его и в работающем приложении
+    invalidate(WORDS_TAG)
+
+
+class _SortedKeys:
+    """Отсортированный массив ключей с номерами слов для поиска по префиксу"""
+
+    __slots__ = ('keys', 'positions')
+
+    def __init__(self, pairs):
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def prefix(self, prefix):
+        """Номера слов, ключ которых начинается с prefix, в алфавитном порядке"""
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + _PREFIX_END, start)
+        return range(start, end)
+
+
+class InMemoryWordIndex:
+    """
+    Основа для индексов словаря в памяти.
+
+    Индекс строится в фоне при старте и перестраивается, когда импорт словаря
+    меняет версию в коллекции meta (проверка не чаще WORD_INDEX_REFRESH_SECONDS).
+    Наследники задают projection и _build(cursor), возвращающий снимок индекса.
+    """
+
+    projection = {'word': 1}
+    thread_name = 'word-index'
+
+    def __init__(self):
+        self.client = MongoClient(MONGODB_URI)
+        self.db = self.client[DATABASE_NAME]
+        self.words = self.db['words']
+        self.meta = self.db[META_COLLECTION]
+
+        # Снимок индекса подменяется целиком одним присваиванием
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._loading = False
+
+    @property
+    def ready(self):
+        return self._snapshot is not None
+
+    def start(self):
+        """Запускает построение индекса в фоне"""
+        self._reload_async()
+
+    def _current_version(self):
+        doc = self.meta.find_one({'_id': WORDS_VERSION_ID}, {'version': 1})
+        return doc['version'] if doc else None
+
+    def _reload_async(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._reload, name=self.thread_name, daemon=True).start()
+
+    def _reload(self):
+        """Загружает слова и строит новый снимок индекса"""
+        try:
+            version = self._current_version()
+            self._snapshot = self._build(self.words.find({}, self.projection))
+            self._version = version
+        except Exception:
+            logger.exception("Error in %s reload", type(self).__name__)
+        finally:
+            self._checked_at = time.monotonic()
+            self._loading = False
+
+    def _build(self, cursor):
+        raise NotImplementedError
+
+    def _refresh_if_stale(self):
+        """Не чаще раза в WORD_INDEX_REFRESH_SECONDS сверяет версию словаря"""
+        if self._loading or time.monotonic() - self._checked_at < WORD_INDEX_REFRESH_SECONDS:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            if self._current_version() != self._version:
+                self._reload_async()
+        except Exception:
+            logger.exception("Error in %s refresh", type(self).__name__)
+
+    def close_connection(self):
+        """Закрывает соединение с MongoDB"""
+        self.client.close()
+
+
+class HeadwordIndex(InMemoryWordIndex):
+    """
+    Поиск татарских слов по префиксу (автодополнение).
+
+    Слова хранятся в памяти в двух отсортированных массивах: по нормализованному
+    написанию и по свертке без татарских букв (ә -> а и т.д.), поиск — бинарный.
+    Пока индекс не готов, запросы обслуживает MongoDB по индексу word_fold;
+    словам, импортированным до появления поля, его проставляет
+    python jobs.py backfill-word-fold.
+    """
+
+    thread_name = 'headword-index'
+
+    def __init__(self):
+        super().__init__()
+        self.words.create_index('word_fold')
+
+    def _build(self, cursor):
+        """Строит массивы ключей: (слова, id, ключи по написанию, ключи по свертке)"""
+        words, ids, norm_pairs, fold_pairs = [], [], [], []
+        for doc in cursor:
+            word = doc.get('word')
+            if not word:
+                continue
+            position = len(words)
+            words.append(word)
+            ids.append(str(doc['_id']))
+            normalized = normalize_headword(word)
+            norm_pairs.append((normalized, position))
+            fold_pairs.append((fold_headword(normalized), position))
+
+        return words, ids, _SortedKeys(norm_pairs), _SortedKeys(fold_pairs)
+
+    def search(self, query, limit=10):
+        """
+        Возвращает до limit слов, начинающихся с query.
+
+        Сначала слова с точным совпадением татарских букв, затем найденные
+        по свертке (например, "сал" находит "сәлам").
+        """
+        self._refresh_if_stale()
+
+        normalized = normalize_headword(query)
+        if not normalized:
+            return [], 'memory'
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._search_mongo(fold_headword(normalized), limit), 'mongo'
+
+        words, ids, by_norm, by_fold = snapshot
+        results = []
+        seen = set()
+
+        for index_keys, key in ((by_norm, normalized), (by_fold, fold_headword(normalized))):
+            for i in index_keys.prefix(key):
+                position = index_keys.positions[i]
+                word = words[position]
+                if word in seen:
+                    continue
+                seen.add(word)
+                results.append({'id': ids[position], 'word': word})
+                if len(results) >= limit:
+                    return results, 'memory'
+
+        return results, 'memory'
+
+    def backfill_fold(self, batch_size=1000, progress=None):
+        """Проставляет word_fold словам, у которых его нет; возвращает число обновленных"""
+        updated = 0
+        operations = []
+        cursor = self.words.find({'word_fold': {'$exists': False}, 'word': {'$type': 'string'}}, {'word': 1})
+        for doc in cursor.sort('_id', 1).batch_size(batch_size):
+            operations.append(UpdateOne(
+                {'_id': doc['_id'], 'word_fold': {'$exists': False}},
+                {'$set': {'word_fold': fold_headword(doc['word'])}}
+            ))
+            if len(operations) >= batch_size:
+                updated += self.words.bulk_write(operations, ordered=False).modified_count
+                operations = []
+                if progress:
+                    progress(updated)
+        if operations:
+            updated += self.words.bulk_write(operations, ordered=False).modified_count
+        if progress:
+            progress(updated)
+        return updated
+
+    def _search_mongo(self, folded, limit):
+        """Поиск по префиксу в MongoDB (диапазон по индексу word_fold)"""
+        cursor = (self.words.find(
+            {'word_fold': {'$gte': folded, '$lt': folded + _PREFIX_END}},
+            {'word': 1})
+            .sort('word_fold', 1)
+            .limit(limit))
+        return [{'id': str(doc['_id']), 'word': doc['word']} for doc in cursor]
@@ -44,10 +44,10 @@ def test_api():
     cards_response = requests.get(f'{BASE_URL}/cards')
     if cards_response.status_code == 200:
         cards_data = cards_response.json()
-        cards = cards_data['cards']
+        cards = cards_data['words']
         print(f'✅ Получено карточек: {len(cards)}')
         for i, card in enumerate(cards[:3], 1):
-            print(f'  {i}. {card["tatar_word"]} - {card["russian_translation"]}')
+            print(f'  {i}. {card["word"]} - {", ".join(card["definitions"])}')
         print()
     else:
         print('❌ Ошибка получения карточек')
@@ -60,7 +60,7 @@ def test_api():
         answer_data = {
             'user_id': user_id,
             'token': token,
-            'card_id': cards[0]['card_id'],
+            'card_id': cards[0]['id'],
             'is_correct': True
         }
         answer_response = requests.post(f'{BASE_URL}/answer', json=answer_data)
@@ -69,7 +69,7 @@ def test_api():
         
         # Неправильный ответ
         answer_data['is_correct'] = False
-        answer_data['card_id'] = cards[1]['card_id']
+        answer_data['card_id'] = cards[1]['id']
         answer_response = requests.post(f'{BASE_URL}/answer', json=answer_data)
         if answer_response.status_code == 200:
             print('✅ Неправильный ответ отправлен')
@@ -0,0 +1,37 @@
+"""
+Общие фикстуры тестов
+
+Окружение задается до импорта app: по умолчанию приложение работает на
+STORAGE_BACKEND=memory и не обращается к MongoDB. MONGODB_URI берется
+только из TEST_MONGODB_URI, чтобы тесты не попали в базу из .env.
+"""
+
+import os
+
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+os.environ.setdefault('CACHE_BACKEND', 'memory')
+os.environ.setdefault('TOKEN_MODE', 'uuid')
+os.environ['MONGODB_URI'] = os.getenv('TEST_MONGODB_URI', 'mongodb://localhost:27017/')
+os.environ['DATABASE_NAME'] = os.getenv('TEST_DATABASE_NAME', 'chak_back_test')
+
+import pytest  # noqa: E402
+
+STORAGE_BACKEND = os.environ['STORAGE_BACKEND']
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app as app_module
+    return app_module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def user(client):
+    """Новый пользователь: {'user_id', 'token'}"""
+    data = client.post('/register').get_json()
+    return {'user_id': data['user_id'], 'token': data['token']}
@@ -0,0 +1,22 @@
+"""Фильтр Блума (utils/bloom.py)"""
+
+from utils.bloom import BloomFilter
+
+
+def test_no_false_negatives():
+    items = [f'token-{number}' for number in range(5000)]
+    bloom = BloomFilter.from_items(items)
+    assert len(bloom) == len(items)
+    assert all(item in bloom for item in items)
+
+
+def test_false_positive_rate():
+    bloom = BloomFilter.from_items((f'token-{number}' for number in range(5000)), error_rate=0.01)
+    false_positives = sum(f'other-{number}' in bloom for number in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_empty_filter():
+    bloom = BloomFilter.from_items([])
+    assert 'anything' not in bloom
+    assert len(bloom) == 0
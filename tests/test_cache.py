@@ -0,0 +1,141 @@
+"""Кэш с тегами (utils/cache.py)"""
+
+import os
+import threading
+
+import pytest
+
+from utils.cache import Cache, MemoryBackend, SharedMemoryBackend, invalidate
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend()
+
+
+def test_get_or_set_computes_once(backend):
+    cache = Cache('test', backend=backend)
+    calls = []
+    compute = lambda: calls.append(1) or {'value': len(calls)}  # noqa: E731
+
+    assert cache.get_or_set('key', compute) == {'value': 1}
+    assert cache.get_or_set('key', compute) == {'value': 1}
+    assert len(calls) == 1
+
+
+def test_none_is_not_cached(backend):
+    cache = Cache('test', backend=backend)
+    calls = []
+    assert cache.get_or_set('key', lambda: calls.append(1)) is None
+    assert cache.get_or_set('key', lambda: calls.append(1)) is None
+    assert len(calls) == 2
+
+
+def test_invalidate_tag(backend):
+    cache = Cache('test', backend=backend)
+    cache.set('a', 1, tags=('user:1',))
+    cache.set('b', 2, tags=('user:2',))
+
+    invalidate('user:1', backend=backend)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+
+    cache.clear()
+    assert cache.get('b') is None
+
+
+def test_invalidation_during_compute_is_not_lost(backend):
+    cache = Cache('test', backend=backend)
+
+    def compute():
+        # Значение посчитано по старым данным, а тег сброшен до записи в кэш
+        invalidate('user:1', backend=backend)
+        return 'stale'
+
+    assert cache.get_or_set('key', compute, tags=('user:1',)) == 'stale'
+    assert cache.get('key') is None
+
+
+def test_concurrent_misses_compute_once(backend):
+    cache = Cache('test', backend=backend)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('key', compute)))
+               for _ in range(10)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 10
+    assert len(calls) == 1
+
+
+def test_local_values_shared_versions(backend):
+    # Два процесса: значения у каждого свои, версии тегов — в общем бэкенде
+    first = Cache('decks', backend=backend, local=True)
+    second = Cache('decks', backend=backend, local=True)
+    first.set('deck', ['a', 'b'], tags=('words',))
+    assert first.get('deck') == ['a', 'b']
+    assert second.get('deck') is None
+    assert backend.get(first._key('deck')) is None
+
+    invalidate('words', backend=backend)
+    assert first.get('deck') is None
+
+
+def test_backend_error_is_a_miss():
+    class BrokenBackend(MemoryBackend):
+        def get(self, key):
+            raise ConnectionError('down')
+
+        def counters(self, names):
+            raise ConnectionError('down')
+
+    cache = Cache('test', backend=BrokenBackend())
+    assert cache.get('key') is None
+    assert cache.get_or_set('key', lambda: 'value') == 'value'
+
+
+def test_shared_memory_between_instances(tmp_path):
+    path = str(tmp_path / 'cache')
+    writer = SharedMemoryBackend(path, size_mb=1, slot_size=1024)
+    reader = SharedMemoryBackend(path, size_mb=1, slot_size=1024)
+    try:
+        Cache('test', backend=writer).set('key', {'value': 1}, tags=('words',))
+        cache = Cache('test', backend=reader)
+        assert cache.get('key') == {'value': 1}
+
+        invalidate('words', backend=writer)
+        assert cache.get('key') is None
+
+        # Значение больше слота не кэшируется
+        writer.set('big', 'x' * 2048, 60)
+        assert reader.get('big') is None
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_shared_memory_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'cache'
+    path.write_bytes(b'')
+    os.chmod(path, 0o644)
+    with pytest.raises(PermissionError):
+        SharedMemoryBackend(str(path), size_mb=1, slot_size=1024)
+
+    link = tmp_path / 'link'
+    link.symlink_to(tmp_path / 'target')
+    with pytest.raises(OSError):
+        SharedMemoryBackend(str(link), size_mb=1, slot_size=1024)
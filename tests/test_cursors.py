@@ -0,0 +1,42 @@
+"""Курсоры истории ответов (models/answers.py)"""
+
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from models.answers import decode_cursor, encode_cursor
+
+ANSWERED_AT = datetime(2024, 5, 1, 12, 30, 15, 123000)
+
+
+def test_round_trip():
+    answer_id = ObjectId()
+    position = decode_cursor(encode_cursor({'t': ANSWERED_AT.isoformat(), 'id': str(answer_id)}))
+    assert position == {'t': ANSWERED_AT, 'id': answer_id}
+
+
+def test_bucket_position_and_int_ids():
+    cursor = encode_cursor({'t': ANSWERED_AT.isoformat(), 'id': '42', 'p': 3})
+    assert decode_cursor(cursor, parse_id=int) == {'t': ANSWERED_AT, 'id': 42, 'p': 3}
+
+
+@pytest.mark.parametrize('position', [
+    {'t': ANSWERED_AT.isoformat()},
+    {'id': str(ObjectId())},
+    {'t': 'yesterday', 'id': str(ObjectId())},
+    {'t': ANSWERED_AT.isoformat(), 'id': 'not-an-object-id'},
+    {'t': ANSWERED_AT.isoformat(), 'id': {'$gt': ''}},
+    {'t': ANSWERED_AT.isoformat(), 'id': str(ObjectId()), 'p': -1},
+    {'t': ANSWERED_AT.isoformat(), 'id': str(ObjectId()), 'p': '3'},
+    {'t': ANSWERED_AT.isoformat(), 'id': str(ObjectId()), 'p': True},
+])
+def test_invalid_position(position):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(encode_cursor(position))
+
+
+@pytest.mark.parametrize('cursor', ['garbage', '', '!!!', encode_cursor([1, 2])])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor)
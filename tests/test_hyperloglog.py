@@ -0,0 +1,40 @@
+"""HyperLogLog (utils/hyperloglog.py)"""
+
+import pytest
+
+from utils import hyperloglog
+
+
+def test_empty():
+    assert hyperloglog.estimate({}) == 0
+    assert hyperloglog.estimate(None) == 0
+
+
+def test_duplicates_do_not_count():
+    registers = {}
+    for _ in range(10):
+        hyperloglog.add(registers, 'user-1')
+    assert hyperloglog.estimate(registers) == 1
+
+
+@pytest.mark.parametrize('count', [50, 1000, 20000])
+def test_estimate_error(count):
+    registers = {}
+    for number in range(count):
+        hyperloglog.add(registers, f'user-{number}')
+    # Стандартная ошибка ~3.25%, берем с запасом
+    assert abs(hyperloglog.estimate(registers) - count) / count < 0.1
+
+
+def test_merge_equals_union():
+    left, right, union = {}, {}, {}
+    for number in range(3000):
+        hyperloglog.add(left if number % 2 else right, f'user-{number}')
+        hyperloglog.add(union, f'user-{number}')
+    assert hyperloglog.merge(dict(left), right) == union
+
+
+def test_register_matches_add():
+    index, rank = hyperloglog.register_for('user-1')
+    assert 0 <= index < hyperloglog.NUM_REGISTERS
+    assert hyperloglog.add({}, 'user-1') == {str(index): rank}
@@ -0,0 +1,191 @@
+"""
+Бюджеты запросов к MongoDB (utils/query_budget.py)
+
+Тесты маршрутов выполняются на настоящей MongoDB:
+    STORAGE_BACKEND=mongo TEST_MONGODB_URI=mongodb://localhost:27017/ python -m pytest tests/test_query_budget.py
+Без нее (или при STORAGE_BACKEND=memory) они пропускаются. Кэши перед
+каждым запросом холодные — проверяется худший случай маршрута.
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from conftest import STORAGE_BACKEND
+from utils.query_budget import QueryBudgetListener, assert_max_queries, route_budget
+
+WORDS = [
+    {'word': f'сүз{number}', 'definitions': [f'слово {number}'], 'difficulty': difficulty}
+    for number, difficulty in enumerate(['easy', 'medium', 'hard'] * 4)
+] + [
+    {'word': 'китап', 'definitions': ['1. книга', '2. том'], 'difficulty': 'easy'},
+]
+
+
+def command_event(command_name, collection, request_id):
+    return SimpleNamespace(
+        command_name=command_name, command={command_name: collection},
+        request_id=request_id, duration_micros=1500
+    )
+
+
+def test_assert_max_queries_counts_commands():
+    listener = QueryBudgetListener()
+    with assert_max_queries(2) as stats:
+        for request_id, (name, collection) in enumerate([('find', 'users'), ('insert', 'answers')]):
+            listener.started(command_event(name, collection, request_id))
+            listener.succeeded(command_event(name, collection, request_id))
+    assert stats.count == 2
+    assert stats.duration_ms == 3
+    assert stats.commands == {'users.find': 1, 'answers.insert': 1}
+
+
+def test_assert_max_queries_fails_over_budget():
+    listener = QueryBudgetListener()
+    with pytest.raises(AssertionError, match='at most 1 queries, got 3: users.find×3'):
+        with assert_max_queries(route='/stats/<user_id>', limit=1):
+            for request_id in range(3):
+                listener.started(command_event('find', 'users', request_id))
+
+
+def test_nested_blocks_count_in_outer():
+    listener = QueryBudgetListener()
+    with assert_max_queries(2) as outer:
+        with assert_max_queries(1) as inner:
+            listener.started(command_event('find', 'users', 1))
+        listener.started(command_event('find', 'words', 2))
+    assert (inner.count, outer.count) == (1, 2)
+
+
+@pytest.fixture(scope='module')
+def mongo_app(request):
+    if STORAGE_BACKEND != 'mongo':
+        pytest.skip('нужен STORAGE_BACKEND=mongo')
+    client = MongoClient(os.environ['MONGODB_URI'], serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError as e:
+        pytest.skip(f'MongoDB недоступна: {e}')
+    finally:
+        client.close()
+
+    app_module = request.getfixturevalue('app_module')
+    app_module.words_repository.words.insert_many([dict(word) for word in WORDS])
+    yield app_module
+    app_module.client.drop_database(os.environ['DATABASE_NAME'])
+
+
+@pytest.fixture
+def mongo_client(mongo_app):
+    return mongo_app.app.test_client()
+
+
+def register(client):
+    data = client.post('/register').get_json()
+    return {'user_id': data['user_id'], 'token': data['token']}
+
+
+def auth(user):
+    return {'X-User-Id': user['user_id'], 'Authorization': f"Bearer {user['token']}"}
+
+
+def within_budget(client, route, path, method='GET', **kwargs):
+    """Запрос к маршруту; AssertionError, если команд больше его бюджета"""
+    with assert_max_queries(route=route) as stats:
+        response = client.open(path, method=method, **kwargs)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    return response, stats
+
+
+@pytest.fixture
+def cold_leaderboard(mongo_app):
+    mongo_app.invalidate(mongo_app.LEADERBOARD_TAG)
+
+
+@pytest.fixture(scope='module')
+def streak_users(mongo_app):
+    """Три пользователя со стриком — рейтинг не пустой"""
+    client = mongo_app.app.test_client()
+    users = [register(client) for _ in range(3)]
+    for user in users:
+        client.post('/api/streak/visit', headers=auth(user))
+    return users
+
+
+def test_register(mongo_client):
+    _, stats = within_budget(mongo_client, '/register', '/register', 'POST')
+    assert stats.count >= 1
+
+
+def test_cards(mongo_client):
+    response, stats = within_budget(mongo_client, '/cards', '/cards')
+    assert len(response.get_json()['words']) == len(WORDS)
+    assert stats.count >= 1
+
+
+def test_answer(mongo_client):
+    user = register(mongo_client)
+    card_id = mongo_client.get('/cards').get_json()['words'][0]['id']
+    within_budget(mongo_client, '/answer', '/answer', 'POST', json={
+        'user_id': user['user_id'], 'token': user['token'], 'card_id': card_id, 'is_correct': True
+    })
+
+
+def test_visit(mongo_client):
+    user = register(mongo_client)
+    within_budget(mongo_client, '/api/visit', '/api/visit', 'POST', headers=auth(user))
+    within_budget(mongo_client, '/api/visit', '/api/visit', 'POST', headers=auth(user))
+
+
+def test_streak_visit(mongo_client, cold_leaderboard):
+    user = register(mongo_client)
+    within_budget(mongo_client, '/api/streak/visit', '/api/streak/visit', 'POST', headers=auth(user))
+    within_budget(mongo_client, '/api/streak/visit', '/api/streak/visit', 'POST', headers=auth(user))
+
+
+def test_user_answers(mongo_client):
+    user = register(mongo_client)
+    card_id = mongo_client.get('/cards').get_json()['words'][0]['id']
+    for is_correct in (True, False, True):
+        mongo_client.post('/answer', json={
+            'user_id': user['user_id'], 'token': user['token'], 'card_id': card_id, 'is_correct': is_correct
+        })
+
+    route = '/api/user-answers/<user_id>'
+    response, _ = within_budget(mongo_client, route, f"/api/user-answers/{user['user_id']}?limit=2")
+    cursor = response.get_json()['next_cursor']
+    within_budget(mongo_client, route, f"/api/user-answers/{user['user_id']}", query_string={'cursor': cursor})
+    within_budget(
+        mongo_client, '/api/user-answers/stats/<user_id>', f"/api/user-answers/stats/{user['user_id']}"
+    )
+
+
+def test_user_stats(mongo_client):
+    user = register(mongo_client)
+    within_budget(mongo_client, '/stats/<user_id>', f"/stats/{user['user_id']}")
+
+
+@pytest.mark.parametrize('path', ['/rating/words', '/rating/streak'])
+def test_ratings(mongo_client, streak_users, cold_leaderboard, path):
+    within_budget(mongo_client, path, path)
+
+
+def test_ranking(mongo_client, streak_users, cold_leaderboard):
+    within_budget(mongo_client, '/api/ranking', '/api/ranking')
+
+
+def test_ranking_top(mongo_client, streak_users, cold_leaderboard):
+    within_budget(mongo_client, '/api/ranking/top', '/api/ranking/top')
+
+
+def test_ranking_user(mongo_client, streak_users):
+    within_budget(mongo_client, '/api/ranking/user', f"/api/ranking/user?user_id={streak_users[0]['user_id']}")
+
+
+@pytest.mark.parametrize('path', ['/health', '/metrics'])
+def test_no_queries(mongo_client, path):
+    assert route_budget(path) == 0
+    within_budget(mongo_client, path, path)
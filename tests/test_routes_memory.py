@@ -0,0 +1,201 @@
+"""Маршруты API на STORAGE_BACKEND=memory (без MongoDB)"""
+
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from conftest import STORAGE_BACKEND
+
+pytestmark = pytest.mark.skipif(STORAGE_BACKEND != 'memory', reason='нужен STORAGE_BACKEND=memory')
+
+WORDS = [
+    {'word': f'сүз{number}', 'definitions': [f'слово {number}'], 'difficulty': difficulty}
+    for number, difficulty in enumerate(['easy', 'medium', 'hard'] * 4)
+] + [
+    {'word': 'китап', 'definitions': ['1. книга', '2. том'], 'difficulty': 'easy'},
+]
+
+
+@pytest.fixture(scope='module', autouse=True)
+def words(app_module):
+    app_module.words_repository.insert_many(WORDS)
+    return WORDS
+
+
+def auth(user):
+    return {'X-User-Id': user['user_id'], 'Authorization': f"Bearer {user['token']}"}
+
+
+def answer(client, user, card_id, is_correct=True):
+    return client.post('/answer', json={
+        'user_id': user['user_id'], 'token': user['token'],
+        'card_id': card_id, 'is_correct': is_correct
+    })
+
+
+def test_health(client):
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'OK'
+
+
+def test_register_and_stats(client, user):
+    response = client.get(f"/stats/{user['user_id']}")
+    assert response.status_code == 200
+    stats = response.get_json()['stats']
+    assert stats['user_id'] == user['user_id']
+    assert stats['total_questions'] == 0
+    assert 'token' not in stats
+
+    # Повтор с ETag — 304 без тела
+    etag = response.headers['ETag']
+    assert client.get(f"/stats/{user['user_id']}", headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.get('/stats/unknown').status_code == 404
+
+
+def test_cards(client):
+    response = client.get('/cards')
+    assert response.status_code == 200
+    cards = response.get_json()['words']
+    assert len(cards) == len(WORDS)
+    # Пронумерованные определения заменяются определениями другого слова
+    book = next(card for card in cards if card['word'] == 'китап')
+    assert book['changed_from'] is not None
+    assert all('1.' not in definition for definition in book['definitions'])
+
+    hard = client.get('/cards?difficulty=hard').get_json()['words']
+    assert hard and all(card['difficulty'] == 'hard' for card in hard)
+
+
+def test_cards_validation(client):
+    assert client.get('/cards?difficulty=unknown').status_code == 400
+    assert client.get('/cards?order=alphabet').status_code == 400
+    # card_stats есть только в MongoDB
+    assert client.get('/cards?source=empirical').status_code == 503
+
+
+def test_answer_requires_auth(client, user):
+    card_id = client.get('/cards').get_json()['words'][0]['id']
+    response = client.post('/answer', json={'user_id': user['user_id'], 'token': 'wrong',
+                                            'card_id': card_id, 'is_correct': True})
+    assert response.status_code == 401
+
+
+def test_answer_rejects_invalid_card_id(client, user):
+    assert answer(client, user, {'$gt': ''}).status_code == 400
+    assert answer(client, user, 'not-an-object-id').status_code == 400
+
+
+def test_answer_updates_stats_and_history(client, user):
+    cards = client.get('/cards').get_json()['words']
+    for number, card in enumerate(cards[:5]):
+        assert answer(client, user, card['id'], is_correct=number != 2).status_code == 200
+
+    stats = client.get(f"/stats/{user['user_id']}").get_json()['stats']
+    assert stats['total_questions'] == 5
+    assert stats['correct_answers'] == 4
+    assert stats['current_streak'] == 2
+    assert stats['max_streak'] == 2
+
+    first = client.get(f"/api/user-answers/{user['user_id']}?limit=3").get_json()
+    assert [item['card_id'] for item in first['answers']] == [card['id'] for card in cards[4:1:-1]]
+    assert first['answers'][0]['word'] == cards[4]['word']
+    assert first['next_cursor']
+
+    second = client.get(
+        f"/api/user-answers/{user['user_id']}", query_string={'limit': 3, 'cursor': first['next_cursor']}
+    ).get_json()
+    assert [item['card_id'] for item in second['answers']] == [card['id'] for card in cards[1::-1]]
+    assert second['next_cursor'] is None
+
+    wrong = client.get(f"/api/user-answers/{user['user_id']}?correct=false").get_json()
+    assert [item['card_id'] for item in wrong['answers']] == [cards[2]['id']]
+
+
+def test_history_rejects_invalid_cursor(client, user):
+    response = client.get(f"/api/user-answers/{user['user_id']}?cursor=garbage")
+    assert response.status_code == 400
+
+
+def test_user_answer_stats(client, user):
+    card_id = client.get('/cards').get_json()['words'][0]['id']
+    answer(client, user, card_id, True)
+    answer(client, user, card_id, False)
+    answer(client, user, card_id, True)
+
+    response = client.get(f"/api/user-answers/stats/{user['user_id']}?days=7")
+    assert response.status_code == 200
+    stats = response.get_json()['stats']
+    assert (stats['total'], stats['correct'], stats['incorrect']) == (3, 2, 1)
+    assert stats['accuracy'] == 66.67
+    assert len(stats['daily']) == 7
+    today = stats['daily'][-1]
+    assert today['date'] == datetime.utcnow().date().isoformat()
+    assert (today['answers'], today['correct']) == (3, 2)
+    assert sum(item['answers'] for item in stats['daily']) == 3
+
+
+def test_visit_once_a_day(client, user):
+    first = client.post('/api/visit', headers=auth(user)).get_json()
+    assert first['already_visited'] is False
+    second = client.post('/api/visit', headers=auth(user)).get_json()
+    assert second['already_visited'] is True
+
+    visits = client.get(f"/api/visits?user_id={user['user_id']}").get_json()
+    assert visits['total_visits'] == 1
+
+    assert client.post('/api/visit').status_code == 401
+
+
+def test_streak_and_ranking(client, user):
+    info = client.post('/api/streak/visit', headers=auth(user)).get_json()['streak_info']
+    assert info['current_streak'] == 1
+    again = client.post('/api/streak/visit', headers=auth(user)).get_json()['streak_info']
+    assert again == info
+
+    streak = client.get(f"/api/streak?user_id={user['user_id']}").get_json()
+    assert streak['streak_info']['total_visits'] == 1
+
+    ranking = client.get('/api/ranking', query_string={'search': user['user_id'][:8].upper()}).get_json()
+    assert [item['user_id'] for item in ranking['ranking']] == [user['user_id']]
+
+    rank = client.get(f"/api/ranking/user?user_id={user['user_id']}").get_json()
+    assert rank['user_rank']['user_id'] == user['user_id']
+    assert client.get('/api/ranking/user?user_id=unknown').status_code == 404
+
+    top = client.get('/api/ranking/top?limit=50').get_json()['top_streaks']
+    assert user['user_id'] in [item['user_id'] for item in top]
+
+
+def test_rating_by_words(app_module, client, user):
+    # Рейтинг по ответам живет RESPONSE_CACHE_TTL и ответами не сбрасывается
+    app_module.invalidate(app_module.LEADERBOARD_TAG)
+    card_id = client.get('/cards').get_json()['words'][0]['id']
+    for _ in range(50):
+        answer(client, user, card_id, True)
+
+    rating = client.get('/rating/words').get_json()['rating']
+    assert rating[0] == {'user_id': user['user_id'], 'correct_words': 50}
+
+    rating = client.get('/rating/streak').get_json()['rating']
+    assert rating[0] == {'user_id': user['user_id'], 'max_streak': 50}
+
+
+def test_mongo_only_routes(client):
+    assert client.get('/api/activity/day').status_code == 503
+    assert client.get('/words/search?q=сү').status_code == 503
+    assert client.get('/quiz').status_code == 503
+
+
+def test_logout_uuid_token(client, user):
+    response = client.post('/logout', headers=auth(user))
+    assert response.status_code == 200
+    assert response.get_json()['revoked'] is False
+    assert client.post('/logout').status_code == 401
+
+
+def test_card_id_is_object_id(client):
+    card = client.get('/cards').get_json()['words'][0]
+    assert ObjectId.is_valid(card['id'])
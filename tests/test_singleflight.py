@@ -0,0 +1,121 @@
+"""Single flight (utils/singleflight.py)"""
+
+import threading
+import time
+
+import pytest
+
+from utils.singleflight import SingleFlight, SingleFlightTimeout, TooManyWaiters, coalesced
+
+
+def run_shared(flight, fn, waiters):
+    """Лидер выполняет fn, пока waiters вызовов ждут его; результаты всех вызовов"""
+    started = threading.Event()
+    release = threading.Event()
+    results = [None] * (waiters + 1)
+
+    def leader_fn():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(index, target):
+        try:
+            results[index] = ('ok', flight.do('key', target))
+        except BaseException as e:
+            results[index] = ('error', e)
+
+    leader = threading.Thread(target=call, args=(0, leader_fn))
+    leader.start()
+    started.wait(5)
+    threads = [threading.Thread(target=call, args=(index, fn)) for index in range(1, waiters + 1)]
+    for thread in threads:
+        thread.start()
+    # Ждущие встали в очередь до завершения лидера
+    while flight._calls['key'].waiters < waiters:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + threads:
+        thread.join()
+    return results
+
+
+def test_single_call_is_leader():
+    flight = SingleFlight('test')
+    assert flight.do('key', lambda: 42) == (42, False)
+    assert flight.in_flight() == 0
+
+
+def test_waiters_share_result():
+    flight = SingleFlight('test')
+    calls = []
+    results = run_shared(flight, lambda: calls.append(1) or len(calls), waiters=5)
+    assert results[0] == ('ok', (1, False))
+    assert results[1:] == [('ok', (1, True))] * 5
+    assert len(calls) == 1
+
+
+def test_waiters_get_leader_exception():
+    flight = SingleFlight('test')
+
+    def fail():
+        raise RuntimeError('boom')
+
+    results = run_shared(flight, fail, waiters=3)
+    assert all(kind == 'error' and isinstance(error, RuntimeError) for kind, error in results)
+
+
+def test_base_exception_reaches_waiters():
+    flight = SingleFlight('test')
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    results = run_shared(flight, interrupt, waiters=2)
+    assert all(kind == 'error' and isinstance(error, KeyboardInterrupt) for kind, error in results)
+    assert flight.in_flight() == 0
+
+
+def test_too_many_waiters():
+    flight = SingleFlight('test', max_waiters=1)
+    results = run_shared(flight, lambda: 'value', waiters=1)
+    assert results[1] == ('ok', ('value', True))
+
+    started = threading.Event()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('key', lambda: started.set() or release.wait(5)))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=flight.do, args=('key', lambda: None))
+    waiter.start()
+    while flight._calls['key'].waiters < 1:
+        time.sleep(0.001)
+    with pytest.raises(TooManyWaiters):
+        flight.do('key', lambda: None)
+    release.set()
+    leader.join()
+    waiter.join()
+
+
+def test_timeout():
+    flight = SingleFlight('test', timeout=0.01)
+    started = threading.Event()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('key', lambda: started.set() or release.wait(5)))
+    leader.start()
+    started.wait(5)
+    with pytest.raises(SingleFlightTimeout):
+        flight.do('key', lambda: None)
+    release.set()
+    leader.join()
+
+
+def test_coalesced_decorator():
+    flight = SingleFlight('test')
+
+    @coalesced(flight, key=lambda page, per_page=20: (page, per_page))
+    def ranking(page, per_page=20):
+        return [page, per_page]
+
+    assert ranking(2) == [2, 20]
+    assert ranking.__name__ == 'ranking'
@@ -0,0 +1,52 @@
+"""Подписанные токены (utils/tokens.py)"""
+
+import time
+
+from utils import tokens
+
+KEYS = [('k2', b'new-secret'), ('k1', b'old-secret')]
+
+
+def test_issue_and_verify():
+    token = tokens.issue('user-1', keys=KEYS)
+    assert tokens.is_signed(token)
+    assert token.startswith('k2.')
+
+    claims = tokens.verify(token, keys=KEYS)
+    assert claims['user_id'] == 'user-1'
+    assert claims['token_id'] == token.rsplit('.', 1)[1]
+
+
+def test_old_key_still_accepted():
+    token = tokens.issue('user-1', keys=KEYS[1:])
+    assert tokens.verify(token, keys=KEYS)['user_id'] == 'user-1'
+    # Ключ убран из списка — токен больше не принимается
+    assert tokens.verify(token, keys=KEYS[:1]) is None
+
+
+def test_tampered_token_rejected():
+    kid, payload, signature = tokens.issue('user-1', keys=KEYS).split('.')
+    other_payload = tokens.issue('user-2', keys=KEYS).split('.')[1]
+    assert tokens.verify(f'{kid}.{other_payload}.{signature}', keys=KEYS) is None
+    assert tokens.verify(f'{kid}.{payload}.{signature[:-2]}', keys=KEYS) is None
+    assert tokens.verify(f'unknown.{payload}.{signature}', keys=KEYS) is None
+
+
+def test_signature_has_single_spelling():
+    # Другая запись тех же байт подписи (лишний '=' или не-base64 символ)
+    # дала бы другой token_id и обошла бы отзыв
+    token = tokens.issue('user-1', keys=KEYS)
+    assert tokens.verify(token + '=', keys=KEYS) is None
+    assert tokens.verify(token + '!', keys=KEYS) is None
+
+
+def test_expired_token_rejected():
+    token = tokens.issue('user-1', issued_at=time.time() - 120, keys=KEYS)
+    assert tokens.verify(token, keys=KEYS, max_age=60) is None
+    assert tokens.verify(token, keys=KEYS, max_age=600) is not None
+
+
+def test_uuid_token_is_not_signed():
+    assert not tokens.is_signed('123e4567-e89b-12d3-a456-426614174000')
+    assert not tokens.is_signed(None)
+    assert tokens.verify('123e4567-e89b-12d3-a456-426614174000', keys=KEYS) is None
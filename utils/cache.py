@@ -0,0 +1,537 @@
+"""
+Кэш с взаимозаменяемыми бэкендами
+
+CACHE_BACKEND:
+    memory — LRU в памяти процесса (у каждого воркера свой);
+    shared — хэш-таблица в разделяемой памяти (mmap файла CACHE_SHM_PATH),
+             общая для всех воркеров на машине;
+    redis  — сервер с протоколом Redis (RESP) по REDIS_URL, общий для всех машин.
+             Для разработки подойдет utils/resp_server.py.
+
+Записи живут TTL секунд и помечаются тегами. У тега есть счетчик версии в
+том же бэкенде, запись хранит версии своих тегов на момент вычисления;
+invalidate('words') увеличивает счетчик, и все записи с тегом становятся
+промахами — в том числе в других процессах, если бэкенд общий.
+
+Значения для shared и redis сериализуются pickle: в бэкенд пишет только
+само приложение. Ошибка бэкенда считается промахом и не ломает запрос.
+
+Cache(..., local=True) хранит значения в памяти процесса, а версии тегов —
+в общем бэкенде: для больших значений, которые не помещаются в слот shared
+и которые дороже передавать из redis, чем вычислить заново.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import hashlib
+import logging
+import os
+import pickle
+import queue
+import socket
+import stat
+import struct
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from utils.metrics import registry
+from utils.singleflight import SingleFlight
+
+# Загрузка переменных окружения
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+# Префикс ключей (на случай общего Redis у нескольких приложений)
+CACHE_PREFIX = os.getenv('CACHE_PREFIX', 'chak:')
+CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 60))
+# memory: записей в LRU на процесс
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+# shared: файл в tmpfs, его размер и размер слота (значения больше слота не кэшируются)
+CACHE_SHM_PATH = os.getenv('CACHE_SHM_PATH', '/dev/shm/chak-back-cache')
+CACHE_SHM_SIZE_MB = int(os.getenv('CACHE_SHM_SIZE_MB', 64))
+CACHE_SHM_SLOT_SIZE = int(os.getenv('CACHE_SHM_SLOT_SIZE', 64 * 1024))
+# redis
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+CACHE_REDIS_TIMEOUT = float(os.getenv('CACHE_REDIS_TIMEOUT', 0.5))
+
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Обращения к кэшу: hit, miss, stale (тег инвалидирован), error',
+    ('cache', 'result')
+)
+CACHE_INVALIDATIONS = registry.counter(
+    'cache_invalidations_total', 'Инвалидации тегов (по части тега до ":")', ('tag',)
+)
+
+
+def _digest(key):
+    """Стабильный между процессами хэш ключа"""
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+class MemoryBackend:
+    """LRU в памяти процесса; счетчики тегов не вытесняются"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, name):
+        with self._lock:
+            value = self._counters[name] = self._counters.get(name, 0) + 1
+            return value
+
+    def counters(self, names):
+        return [self._counters.get(name, 0) for name in names]
+
+    def close(self):
+        pass
+
+
+class SharedMemoryBackend:
+    """
+    Хэш-таблица в mmap файла: заголовок, счетчики тегов и слоты фиксированного
+    размера. Ключ ищется в PROBES слотах подряд начиная с hash % slots; при
+    записи занимается слот того же ключа, пустой или истекший, иначе тот,
+    что истекает раньше. Доступ между процессами — через flock файла.
+
+    Счетчик тега — ячейка hash % COUNTERS: теги с одной ячейкой
+    инвалидируются вместе, это безопасно (лишний промах).
+    """
+
+    MAGIC = b'CHAKSHM1'
+    HEADER = struct.Struct('<8sII')
+    COUNTER = struct.Struct('<Q')
+    COUNTERS = 256
+    SLOT = struct.Struct('<16sdI')
+    PROBES = 4
+
+    def __init__(self, path=CACHE_SHM_PATH, size_mb=CACHE_SHM_SIZE_MB, slot_size=CACHE_SHM_SLOT_SIZE):
+        import fcntl
+        import mmap
+
+        self._fcntl = fcntl
+        self.path = path
+        self.slot_size = slot_size
+        self._data_offset = self.HEADER.size + self.COUNTERS * self.COUNTER.size
+        self.slots = max((size_mb * 1024 * 1024 - self._data_offset) // slot_size, self.PROBES)
+        size = self._data_offset + self.slots * slot_size
+
+        self._lock = threading.Lock()
+        self._fd = self._open(path)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, size)
+            self._mm = mmap.mmap(self._fd, size)
+            if self.HEADER.unpack_from(self._mm, 0) != (self.MAGIC, self.slots, slot_size):
+                # Новый файл или другая разметка — размечаем заново
+                self._mm[:self._data_offset] = bytes(self._data_offset)
+                self._clear_slots()
+                self.HEADER.pack_into(self._mm, 0, self.MAGIC, self.slots, slot_size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        # flock принадлежит открытому файлу: после fork воркеру нужен свой дескриптор
+        os.register_at_fork(after_in_child=self._reopen)
+
+    @staticmethod
+    def _open(path):
+        """
+        Открывает файл кэша. Содержимое читается через pickle, поэтому
+        файл, созданный другим пользователем или доступный ему, не принимается.
+        """
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode) or info.st_uid != os.geteuid() or info.st_mode & 0o077:
+            os.close(fd)
+            raise PermissionError(f'Cache file {path} must be a regular file owned by this user with mode 0600')
+        return fd
+
+    def _reopen(self):
+        self._lock = threading.Lock()
+        self._fd = self._open(self.path)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._lock:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_EX if exclusive else self._fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def _slot_offsets(self, digest):
+        start = int.from_bytes(digest[:8], 'little') % self.slots
+        for probe in range(self.PROBES):
+            yield self._data_offset + (start + probe) % self.slots * self.slot_size
+
+    def _clear_slots(self):
+        empty = bytes(self.SLOT.size)
+        for slot in range(self.slots):
+            offset = self._data_offset + slot * self.slot_size
+            self._mm[offset:offset + self.SLOT.size] = empty
+
+    def get(self, key):
+        digest = _digest(key)
+        with self._locked(exclusive=False):
+            for offset in self._slot_offsets(digest):
+                slot_digest, expires_at, length = self.SLOT.unpack_from(self._mm, offset)
+                if slot_digest == digest:
+                    if expires_at < time.time():
+                        return None
+                    start = offset + self.SLOT.size
+                    data = self._mm[start:start + length]
+                    break
+            else:
+                return None
+        return pickle.loads(data)
+
+    def set(self, key, value, ttl):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.slot_size - self.SLOT.size:
+            return
+        digest = _digest(key)
+        now = time.time()
+        with self._locked(exclusive=True):
+            slots = [(offset,) + self.SLOT.unpack_from(self._mm, offset)
+                     for offset in self._slot_offsets(digest)]
+            # Слот этого же ключа, иначе свободный или истекший, иначе истекающий раньше всех
+            target = next((slot[0] for slot in slots if slot[1] == digest), None)
+            if target is None:
+                target = min(slots, key=lambda slot: slot[2])[0]
+            start = target + self.SLOT.size
+            self._mm[start:start + len(data)] = data
+            self.SLOT.pack_into(self._mm, target, digest, now + ttl, len(data))
+
+    def delete(self, key):
+        digest = _digest(key)
+        with self._locked(exclusive=True):
+            for offset in self._slot_offsets(digest):
+                if self.SLOT.unpack_from(self._mm, offset)[0] == digest:
+                    self.SLOT.pack_into(self._mm, offset, bytes(16), 0.0, 0)
+
+    def _counter_offset(self, name):
+        index = int.from_bytes(_digest(name)[:8], 'little') % self.COUNTERS
+        return self.HEADER.size + index * self.COUNTER.size
+
+    def incr(self, name):
+        offset = self._counter_offset(name)
+        with self._locked(exclusive=True):
+            value = self.COUNTER.unpack_from(self._mm, offset)[0] + 1
+            self.COUNTER.pack_into(self._mm, offset, value)
+            return value
+
+    def counters(self, names):
+        offsets = [self._counter_offset(name) for name in names]
+        with self._locked(exclusive=False):
+            return [self.COUNTER.unpack_from(self._mm, offset)[0] for offset in offsets]
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+class RespError(Exception):
+    """Ошибка, которую вернул сервер"""
+
+
+def encode_command(*args):
+    """Команда в формате RESP: массив bulk-строк"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif isinstance(arg, int):
+            arg = str(arg).encode('ascii')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(file):
+    """Читает один ответ RESP из файла сокета"""
+    line = file.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('Connection closed')
+    kind, body = line[:1], line[1:-2]
+    if kind == b'+':
+        return body.decode('utf-8')
+    if kind == b'-':
+        raise RespError(body.decode('utf-8'))
+    if kind == b':':
+        return int(body)
+    if kind == b'$':
+        length = int(body)
+        if length < 0:
+            return None
+        data = file.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError('Connection closed')
+        return data[:-2]
+    if kind == b'*':
+        count = int(body)
+        return None if count < 0 else [read_reply(file) for _ in range(count)]
+    raise RespError(f'Unexpected reply: {line!r}')
+
+
+class _Connection:
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rb')
+
+    def execute(self, *args):
+        self.sock.sendall(encode_command(*args))
+        return read_reply(self.file)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+class RedisBackend:
+    """Клиент протокола Redis (RESP) с пулом соединений; redis-py не нужен"""
+
+    def __init__(self, url=REDIS_URL, timeout=CACHE_REDIS_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+        # Сокеты родителя воркеру после fork не годятся
+        os.register_at_fork(after_in_child=self._reset_pool)
+
+    def _reset_pool(self):
+        self._pool = queue.LifoQueue()
+
+    def _connect(self):
+        connection = _Connection(self.host, self.port, self.timeout)
+        if self.password:
+            connection.execute('AUTH', self.password)
+        if self.database:
+            connection.execute('SELECT', self.database)
+        return connection
+
+    def execute(self, *args):
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        try:
+            reply = connection.execute(*args)
+        except RespError:
+            self._pool.put(connection)
+            raise
+        except Exception:
+            # Соединение в неизвестном состоянии — не возвращаем в пул
+            connection.close()
+            raise
+        self._pool.put(connection)
+        return reply
+
+    def get(self, key):
+        data = self.execute('GET', key)
+        return None if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.execute('SET', key, data, 'PX', max(int(ttl * 1000), 1))
+
+    def delete(self, key):
+        self.execute('DEL', key)
+
+    def incr(self, name):
+        return self.execute('INCR', name)
+
+    def counters(self, names):
+        return [int(value or 0) for value in self.execute('MGET', *names)]
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def create_backend(name=CACHE_BACKEND):
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'shared':
+        return SharedMemoryBackend()
+    if name == 'redis':
+        return RedisBackend()
+    raise ValueError(f'Unknown cache backend: {name}')
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Бэкенд процесса (создается при первом обращении)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def _tag_counter(tag):
+    return f'{CACHE_PREFIX}tag:{tag}'
+
+
+def invalidate(*tags, backend=None):
+    """Делает недействительными все записи с этими тегами"""
+    backend = backend or get_backend()
+    for tag in tags:
+        try:
+            backend.incr(_tag_counter(tag))
+            CACHE_INVALIDATIONS.inc(tag.split(':', 1)[0])
+        except Exception:
+            logger.exception("Error in cache invalidate %s", tag)
+
+
+class Cache:
+    """
+    Кэш одного назначения: name — пространство ключей и метка метрик.
+    Записи кэша помечены тегом cache:<name>, поэтому clear() — тоже
+    инвалидация и работает во всех процессах.
+    """
+
+    def __init__(self, name, ttl=CACHE_DEFAULT_TTL, backend=None, local=False):
+        self.name = name
+        self.ttl = ttl
+        self._backend = backend
+        self._local = MemoryBackend() if local else None
+        self._own_tag = f'cache:{name}'
+        self._flights = SingleFlight(f'cache_{name}')
+
+    @property
+    def backend(self):
+        """Бэкенд версий тегов (и значений, если кэш не local)"""
+        return self._backend or get_backend()
+
+    @property
+    def _values(self):
+        return self._local or self.backend
+
+    def _key(self, key):
+        return f'{CACHE_PREFIX}{self.name}:{key}'
+
+    def _versions(self, tags):
+        return tuple(self.backend.counters([_tag_counter(tag) for tag in tags]))
+
+    def _lookup(self, key):
+        """(результат, значение): hit, miss, stale или error"""
+        try:
+            entry = self._values.get(self._key(key))
+            if entry is None:
+                return 'miss', None
+            tags, versions, value = entry
+            if self._versions(tags) != versions:
+                return 'stale', None
+            return 'hit', value
+        except Exception:
+            logger.exception("Error in cache %s get", self.name)
+            return 'error', None
+
+    def get(self, key):
+        """Значение или None"""
+        result, value = self._lookup(key)
+        CACHE_REQUESTS.inc(self.name, result)
+        return value
+
+    def peek(self, key):
+        """Как get, но без учета в метриках — для повторной проверки после ожидания"""
+        return self._lookup(key)[1]
+
+    def _store(self, key, value, ttl, tags, versions):
+        if value is None:
+            return
+        try:
+            self._values.set(self._key(key), (tags, versions, value), ttl or self.ttl)
+        except Exception:
+            logger.exception("Error in cache %s set", self.name)
+
+    def versions(self, tags=()):
+        """
+        Текущие версии тегов записи или None при ошибке бэкенда. Снимаются
+        до вычисления значения и передаются в set(): инвалидация во время
+        вычисления тогда не потеряется.
+        """
+        try:
+            return self._versions((self._own_tag,) + tuple(tags))
+        except Exception:
+            logger.exception("Error in cache %s versions", self.name)
+            return None
+
+    def set(self, key, value, ttl=None, tags=(), versions=None):
+        """Сохраняет значение (None не кэшируется)"""
+        if versions is None:
+            versions = self.versions(tags)
+            if versions is None:
+                return
+        self._store(key, value, ttl, (self._own_tag,) + tuple(tags), versions)
+
+    def get_or_set(self, key, compute, ttl=None, tags=()):
+        """
+        Значение из кэша или compute(). Одинаковые параллельные промахи
+        вычисляются один раз (single flight).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def load():
+            value = self.peek(key)
+            if value is not None:
+                return value
+            versions = self.versions(tags)
+            if versions is None:
+                return compute()
+            value = compute()
+            self.set(key, value, ttl, tags, versions)
+            return value
+
+        return self._flights.do(key, load)[0]
+
+    def delete(self, key):
+        try:
+            self._values.delete(self._key(key))
+        except Exception:
+            logger.exception("Error in cache %s delete", self.name)
+
+    def clear(self):
+        invalidate(self._own_tag, backend=self.backend)
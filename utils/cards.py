@@ -0,0 +1,58 @@
+"""
+Сборка карточек /cards из документов слов
+
+Без обращений к базе: слова и кандидаты на замену передаются готовыми,
+поэтому тот же код гоняет benchmarks/bench_cards.py.
+"""
+
+import random
+
+from utils.normalization import card_definitions
+
+
+def has_numbered_definitions(word):
+    """Есть ли в определениях нумерация "1." (такие определения заменяются)"""
+    return any('1.' in definition for definition in word.get('definitions', []))
+
+
+def build_card(word, replacements, stats=None, rng=random):
+    """
+    Карточка одного слова.
+
+    Если определения пронумерованы, они берутся у случайного слова из
+    replacements, а его id пишется в changed_from. stats — статистика
+    карточек по id (None — поля сложности по ответам не добавляются).
+    """
+    card = {
+        'id': str(word.get('_id', '')),
+        'word': word.get('word', ''),
+        'definitions': [],
+        'difficulty': word.get('difficulty', 'easy'),
+        'changed_from': None  # По умолчанию null
+    }
+
+    source = word
+    if replacements and has_numbered_definitions(word):
+        source = rng.choice(replacements)
+        card['changed_from'] = str(source['_id'])  # ID слова, откуда взяли definitions
+
+    # Очищенные определения сохраняет импорт; для старых документов чистим здесь
+    card['definitions'] = card_definitions(source)
+
+    if stats is not None:
+        card_stats = stats.get(card['id'], {})
+        card['empirical_difficulty'] = card_stats.get('empirical_difficulty')
+        card['recent_accuracy'] = card_stats.get('recent_accuracy')
+    return card
+
+
+def build_cards(words, replacements, stats=None, order='random', rng=random):
+    """Карточки слов; order=difficulty — сначала самые трудные по последним ответам"""
+    cards = [build_card(word, replacements, stats, rng) for word in words]
+
+    if order == 'difficulty':
+        # Карточки без ответов — в конце
+        cards.sort(key=lambda card: (
+            card['recent_accuracy'] is None, card['recent_accuracy'] or 0
+        ))
+    return cards
@@ -0,0 +1,239 @@
+"""
+Сжатие ответов (gzip/brotli), условные GET-запросы (ETag / If-None-Match)
+и кэш готовых ответов для редко меняющихся эндпоинтов (utils/cache.py, с
+тегами для инвалидации). Промах кэша считается одним запросом: параллельные
+одинаковые запросы ждут его (utils/singleflight.py).
+"""
+
+import gzip
+import hashlib
+import os
+from functools import wraps
+
+from dotenv import load_dotenv
+from flask import current_app, request
+from werkzeug.wrappers import Response
+
+from utils.cache import Cache
+from utils.json_provider import dumps_bytes, json_response
+from utils.singleflight import SingleFlight, SingleFlightError
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, тогда используем только gzip
+    brotli = None
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Ответы меньше порога не сжимаем: выигрыш меньше накладных расходов
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 30))
+
+# Уровни сжатия: "на лету" быстрее, для кэша сильнее (сжимаем один раз)
+GZIP_LEVEL = 6
+GZIP_LEVEL_CACHED = 9
+BROTLI_QUALITY = 5
+BROTLI_QUALITY_CACHED = 9
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/plain',
+    'text/html',
+    'text/css',
+    'application/javascript',
+}
+
+
+def choose_encoding(accept_encoding):
+    """Выбирает лучшее поддерживаемое сжатие по заголовку Accept-Encoding"""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding, cached=False):
+    """Сжимает тело ответа выбранным алгоритмом"""
+    if encoding == 'br':
+        quality = BROTLI_QUALITY_CACHED if cached else BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)
+    if encoding == 'gzip':
+        level = GZIP_LEVEL_CACHED if cached else GZIP_LEVEL
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    return body
+
+
+class PreparedPayload:
+    """Готовый JSON-ответ: тело, ETag и лениво посчитанные сжатые варианты"""
+
+    __slots__ = ('body', 'etag', '_variants')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._variants = {}
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(dumps_bytes(data))
+
+    def __reduce__(self):
+        # В общий кэш пишется только тело: ETag и сжатие восстанавливаются
+        return PreparedPayload, (self.body,)
+
+    def variant(self, encoding):
+        """Возвращает тело в нужной кодировке (сжатие выполняется один раз)"""
+        if encoding is None:
+            return self.body
+        body = self._variants.get(encoding)
+        if body is None:
+            body = compress(self.body, encoding, cached=True)
+            self._variants[encoding] = body
+        return body
+
+
+def payload_response(payload, status=200):
+    """Отдает PreparedPayload с учетом If-None-Match и Accept-Encoding"""
+    if status == 200 and request.if_none_match.contains_weak(payload.etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(payload.etag, weak=True)
+        return response
+
+    encoding = None
+    if len(payload.body) >= COMPRESSION_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+
+    response = json_response(payload.variant(encoding), status=status)
+    response.set_etag(payload.etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def conditional_json(data, status=200):
+    """JSON-ответ с ETag: при совпадении If-None-Match вернется 304 без тела"""
+    return payload_response(PreparedPayload.from_data(data), status=status)
+
+
+class ResponseCache:
+    """Кэш готовых ответов (PreparedPayload) поверх utils/cache.py"""
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL):
+        self.ttl = ttl
+        self.cache = Cache('response', ttl=ttl)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def peek(self, key):
+        return self.cache.peek(key)
+
+    def versions(self, tags=()):
+        return self.cache.versions(tags)
+
+    def set(self, key, payload, ttl=None, tags=(), versions=None):
+        self.cache.set(key, payload, self.ttl if ttl is None else ttl, tags, versions)
+
+    def clear(self):
+        self.cache.clear()
+
+
+response_cache = ResponseCache()
+response_flights = SingleFlight('response')
+
+
+def _request_cache_key():
+    """Ключ кэша: путь и отсортированные параметры запроса"""
+    args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    return f'{request.path}?{args}'
+
+
+def cached_response(ttl=None, tags=()):
+    """
+    Декоратор для эндпоинтов только на чтение.
+
+    Обработчик возвращает dict с данными — он сериализуется и сжимается
+    один раз и хранится в кэше с тегами tags (см. utils.cache.invalidate). Готовый Response (например, ошибка)
+    возвращается без кэширования. При промахе обработчик выполняет один
+    запрос, одинаковые параллельные запросы получают его результат.
+    """
+    def decorator(view):
+        def compute(key, args, kwargs):
+            # Кэш мог заполниться, пока мы вставали в очередь
+            payload = response_cache.peek(key)
+            if payload is not None:
+                return payload
+            # Версии тегов — до вызова обработчика, как в Cache.get_or_set
+            versions = response_cache.versions(tags)
+            result = view(*args, **kwargs)
+            if not isinstance(result, dict):
+                return result
+            payload = PreparedPayload.from_data(result)
+            if versions is not None:
+                response_cache.set(key, payload, ttl, tags, versions)
+            return payload
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = _request_cache_key()
+            payload = response_cache.get(key)
+            if payload is None:
+                try:
+                    payload, shared = response_flights.do(key, compute, key, args, kwargs)
+                except SingleFlightError:
+                    response = json_response({'success': False, 'error': 'Too many concurrent requests'}, status=503)
+                    response.headers['Retry-After'] = '1'
+                    return response
+                if not isinstance(payload, PreparedPayload):
+                    # Response не делится между запросами: ждавший строит свой
+                    return view(*args, **kwargs) if shared else payload
+            return payload_response(payload)
+        return wrapper
+    return decorator
+
+
+def init_compression(app):
+    """Подключает сжатие всех достаточно больших ответов"""
+
+    @app.after_request
+    def compress_response(response: Response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_SIZE:
+            return response
+
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return compress_response
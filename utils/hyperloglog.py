@@ -0,0 +1,60 @@
+"""
+HyperLogLog для приблизительного подсчета уникальных пользователей
+
+Регистры хранятся разреженно как {"<индекс>": ранг}, поэтому их можно
+обновлять прямо в MongoDB оператором $max по полю "hll.<индекс>"
+и объединять взятием максимума по каждому регистру.
+"""
+
+import hashlib
+import math
+
+# 2^10 = 1024 регистра, стандартная ошибка ~3.25%
+PRECISION = 10
+NUM_REGISTERS = 1 << PRECISION
+_HASH_BITS = 64
+_REST_BITS = _HASH_BITS - PRECISION
+
+
+def register_for(value):
+    """Возвращает (индекс регистра, ранг) для значения"""
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+    hashed = int.from_bytes(digest, 'big')
+    index = hashed >> _REST_BITS
+    rest = hashed & ((1 << _REST_BITS) - 1)
+    # Ранг — позиция первой единицы в оставшихся битах
+    rank = _REST_BITS - rest.bit_length() + 1
+    return index, rank
+
+
+def add(registers, value):
+    """Добавляет значение в словарь регистров"""
+    index, rank = register_for(value)
+    key = str(index)
+    if registers.get(key, 0) < rank:
+        registers[key] = rank
+    return registers
+
+
+def merge(target, other):
+    """Объединяет регистры other в target (максимум по каждому регистру)"""
+    for key, rank in (other or {}).items():
+        if target.get(key, 0) < rank:
+            target[key] = rank
+    return target
+
+
+def estimate(registers):
+    """Оценка количества уникальных значений"""
+    if not registers:
+        return 0
+
+    alpha = 0.7213 / (1 + 1.079 / NUM_REGISTERS)
+    zeros = NUM_REGISTERS - len(registers)
+    harmonic = zeros + sum(2.0 ** -rank for rank in registers.values())
+    raw = alpha * NUM_REGISTERS * NUM_REGISTERS / harmonic
+
+    # Коррекция для малых значений (linear counting)
+    if raw <= 2.5 * NUM_REGISTERS and zeros:
+        return round(NUM_REGISTERS * math.log(NUM_REGISTERS / zeros))
+    return round(raw)
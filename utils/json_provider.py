@@ -0,0 +1,91 @@
+"""
+Быстрая JSON-сериализация для Flask
+
+Использует orjson, если он установлен, иначе стандартный json.
+Умеет сериализовать datetime/date, ObjectId и UUID (в том числе BSON Binary) без ручных преобразований
+в обработчиках, а также отдавать заранее закодированные байты (например, из кэша).
+"""
+
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from bson import ObjectId
+from bson.binary import Binary, UUID_SUBTYPE
+from flask import current_app
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, работаем на стандартном json
+    orjson = None
+
+
+JSON_MIMETYPE = 'application/json'
+
+
+def _default(o):
+    """Преобразует типы, которые не поддерживаются сериализатором напрямую"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if isinstance(o, Binary) and o.subtype == UUID_SUBTYPE:
+        return str(o.as_uuid())
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        """Сериализует объект в UTF-8 байты"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data):
+        """Разбирает JSON из строки или байтов"""
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj):
+        """Сериализует объект в UTF-8 байты"""
+        return json.dumps(
+            obj, default=_default, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    def loads(data):
+        """Разбирает JSON из строки или байтов"""
+        return json.loads(data)
+
+
+def json_response(payload, status=200, headers=None):
+    """
+    Создает JSON-ответ.
+
+    Если payload уже является байтами (готовый ответ из кэша),
+    он отдается как есть, без повторной сериализации.
+    """
+    body = payload if isinstance(payload, (bytes, bytearray)) else dumps_bytes(payload)
+    return current_app.response_class(
+        body, status=status, headers=headers, mimetype=JSON_MIMETYPE
+    )
+
+
+class FastJSONProvider(JSONProvider):
+    """JSON-провайдер Flask: jsonify, request.get_json и т.д. идут через orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=JSON_MIMETYPE)
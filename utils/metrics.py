@@ -0,0 +1,370 @@
+"""
+Метрики приложения в текстовом формате Prometheus
+
+- время обработки запросов по маршрутам (гистограмма) и число запросов в работе;
+- время команд MongoDB по коллекциям и командам, число возвращенных документов
+  (pymongo CommandListener);
+- состояние пулов соединений MongoDB (ConnectionPoolListener);
+- произвольные значения, снимаемые при чтении /metrics (например, очередь executor).
+
+Слушатели pymongo регистрируются глобально и действуют только на клиенты,
+созданные после register_mongo_listeners(), поэтому вызывать ее нужно до
+создания MongoClient.
+"""
+
+import bisect
+import logging
+import threading
+import time
+
+from flask import g, request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Границы гистограмм в секундах: от 0.5 мс до 10 с
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name}: expected labels {self.labelnames}')
+        return tuple(str(value) for value in labels)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        # callback() -> {labels: значение}, вызывается при каждом чтении
+        self.callback = callback
+
+    def set(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        if self.callback is not None:
+            try:
+                values.update(self.callback())
+            except Exception:
+                logger.exception('Metric callback %s failed', self.name)
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счетчики по корзинам (последняя — +Inf), сумма, количество
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """Набор метрик, отдаваемых на /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP запроса', ('route', 'method', 'status')
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    'http_requests_in_flight', 'Запросы в обработке', ('route',)
+)
+MONGO_COMMAND_DURATION = registry.histogram(
+    'mongo_command_duration_seconds', 'Время команды MongoDB', ('collection', 'command')
+)
+MONGO_COMMAND_DOCUMENTS = registry.counter(
+    'mongo_command_documents_returned_total', 'Документы, возвращенные командами MongoDB',
+    ('collection', 'command')
+)
+MONGO_COMMAND_FAILURES = registry.counter(
+    'mongo_command_failures_total', 'Ошибки команд MongoDB', ('collection', 'command')
+)
+MONGO_POOL_CONNECTIONS = registry.gauge(
+    'mongo_pool_connections', 'Открытые соединения пула MongoDB', ('address',)
+)
+MONGO_POOL_CHECKED_OUT = registry.gauge(
+    'mongo_pool_checked_out_connections', 'Соединения пула MongoDB, занятые запросами', ('address',)
+)
+MONGO_POOL_CHECKOUT_FAILURES = registry.counter(
+    'mongo_pool_checkout_failures_total', 'Неудачные попытки взять соединение из пула', ('address', 'reason')
+)
+MONGO_POOL_CLEARED = registry.counter(
+    'mongo_pool_cleared_total', 'Сбросы пула MongoDB', ('address',)
+)
+
+# Команды, у которых значение первого поля — имя коллекции
+_COLLECTION_COMMANDS = {
+    'find', 'insert', 'update', 'delete', 'aggregate', 'count', 'distinct',
+    'findAndModify', 'createIndexes', 'listIndexes', 'drop',
+}
+
+
+def _address(address):
+    host, port = address
+    return f'{host}:{port}'
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Время и число документов по (коллекция, команда)"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event):
+        return event.connection_id, event.request_id, event.operation_id
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        elif event.command_name not in _COLLECTION_COMMANDS or not isinstance(collection, str):
+            collection = ''
+        with self._lock:
+            self._pending[self._key(event)] = collection
+
+    def _pop(self, event):
+        with self._lock:
+            return self._pending.pop(self._key(event), '')
+
+    def succeeded(self, event):
+        collection = self._pop(event)
+        MONGO_COMMAND_DURATION.observe(collection, event.command_name, value=event.duration_micros / 1e6)
+
+        reply = event.reply
+        cursor = reply.get('cursor')
+        if isinstance(cursor, dict):
+            returned = len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+        elif event.command_name == 'findAndModify':
+            returned = 1 if reply.get('value') is not None else 0
+        else:
+            returned = 0
+        if returned:
+            MONGO_COMMAND_DOCUMENTS.inc(collection, event.command_name, amount=returned)
+
+    def failed(self, event):
+        collection = self._pop(event)
+        MONGO_COMMAND_DURATION.observe(collection, event.command_name, value=event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.inc(collection, event.command_name)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Открытые и занятые соединения пулов MongoDB. У каждой модели свой
+    клиент и пул к тому же адресу, поэтому значения по адресу — сумма
+    по пулам процесса и при создании пула не сбрасываются.
+    """
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CLEARED.inc(_address(event.address))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc(_address(event.address))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec(_address(event.address))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.inc(_address(event.address), event.reason)
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKED_OUT.inc(_address(event.address))
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec(_address(event.address))
+
+
+_listeners_registered = False
+
+
+def register_mongo_listeners():
+    """Подключает слушатели pymongo (действует на клиенты, созданные после вызова)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    monitoring.register(CommandMetrics())
+    monitoring.register(PoolMetrics())
+    _listeners_registered = True
+
+
+def executor_queue_gauge(name, documentation, executor):
+    """Длина очереди задач ThreadPoolExecutor, снимается при чтении /metrics"""
+    return registry.gauge(name, documentation, callback=lambda: {(): executor._work_queue.qsize()})
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def init_request_metrics(app):
+    """Время обработки и число запросов в работе по маршрутам"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_route = _route()
+        REQUESTS_IN_FLIGHT.inc(g.metrics_route)
+
+    @app.after_request
+    def _record_duration(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            REQUEST_DURATION.observe(
+                g.metrics_route, request.method, response.status_code,
+                value=time.perf_counter() - started
+            )
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        route = g.pop('metrics_route', None)
+        if route is None:
+            return
+        started = g.pop('metrics_started', None)
+        if exc is not None and started is not None:
+            # Необработанное исключение: after_request не вызывался
+            REQUEST_DURATION.observe(route, request.method, 500, value=time.perf_counter() - started)
+        REQUESTS_IN_FLIGHT.dec(route)
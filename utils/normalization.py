@@ -0,0 +1,221 @@
+"""
+Нормализация определений слов
+
+Общий код для импорта словаря и выдачи /cards: удаление служебных помет
+одним заранее скомпилированным регулярным выражением и определение
+сложности слова в том же проходе по определениям.
+"""
+
+import os
+import re
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Служебные пометы, которые удаляются из определений
+REMOVE_WORDS_1 = ['разг', 'прост', 'межд', 'част']
+REMOVE_WORDS_2 = ['сущ', 'гл', 'прил', 'нар', 'пр']
+
+# Ключевые слова для определения сложности (ищутся как подстроки)
+EASY_KEYWORDS = ['разг', 'прост', 'межд', 'част']
+MEDIUM_KEYWORDS = ['сущ', 'гл', 'прил', 'нареч']
+
+
+def _alternation(words):
+    # Длинные варианты первыми, чтобы меньше откатываться ("прил" раньше "пр")
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+# Границы слова через \w: для str шаблонов \w включает кириллицу и татарские буквы
+REMOVE_PATTERN = re.compile(
+    r'(?<!\w)(?:' + _alternation(REMOVE_WORDS_1 + REMOVE_WORDS_2) + r')(?!\w)',
+    re.IGNORECASE
+)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+EDGE_COMMA_PATTERN = re.compile(r'^,\s*|\s*,$')
+EASY_PATTERN = re.compile(_alternation(EASY_KEYWORDS), re.IGNORECASE)
+MEDIUM_PATTERN = re.compile(_alternation(MEDIUM_KEYWORDS), re.IGNORECASE)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Двойники татарских букв из латиницы и старых кодировок
+TATAR_LOOKALIKES = str.maketrans({
+    'ə': 'ә',  # латинская шва
+    'ɵ': 'ө',  # латинская перечеркнутая o
+    'h': 'һ',
+    'ҥ': 'ң',  # лигатура "эн-гэ" из старых шрифтов
+    'ӊ': 'ң',
+    'ӂ': 'җ',
+})
+# Свертка татарских букв к русским — для ввода без татарской раскладки
+TATAR_FOLDING = str.maketrans({
+    'ә': 'а',
+    'ө': 'о',
+    'ү': 'у',
+    'җ': 'ж',
+    'ң': 'н',
+    'һ': 'х',
+})
+# Знаки ударения (комбинируемые акут и гравис)
+STRESS_MARKS = re.compile('[\u0300\u0301]')
+
+
+def clean_definition(definition):
+    """Удаляет служебные пометы, лишние пробелы и запятые по краям"""
+    definition = REMOVE_PATTERN.sub('', definition)
+    definition = WHITESPACE_PATTERN.sub(' ', definition).strip()
+    return EDGE_COMMA_PATTERN.sub('', definition)
+
+
+def clean_definitions(definitions):
+    """Очищает список определений, пустые результаты отбрасываются"""
+    cleaned = []
+    for definition in definitions:
+        definition = clean_definition(definition)
+        if definition:
+            cleaned.append(definition)
+    return cleaned
+
+
+def card_definitions(document):
+    """Очищенные определения слова: сохраненные при импорте или посчитанные сейчас"""
+    cleaned = document.get('clean_definitions')
+    if cleaned is None:
+        cleaned = clean_definitions(document.get('definitions', []))
+    return cleaned
+
+
+def normalize_definitions(definitions):
+    """
+    Очищает определения и определяет сложность за один проход.
+
+    Сложность: easy, если встречается помета из EASY_KEYWORDS,
+    medium — из MEDIUM_KEYWORDS, иначе hard; пустой список — easy.
+    """
+    if not definitions:
+        return [], 'easy'
+
+    cleaned = []
+    has_medium = False
+    has_easy = False
+    for definition in definitions:
+        if not has_easy:
+            if EASY_PATTERN.search(definition):
+                has_easy = True
+            elif not has_medium and MEDIUM_PATTERN.search(definition):
+                has_medium = True
+
+        definition = clean_definition(definition)
+        if definition:
+            cleaned.append(definition)
+
+    if has_easy:
+        return cleaned, 'easy'
+    return cleaned, 'medium' if has_medium else 'hard'
+
+
+def determine_difficulty(definitions):
+    """Определение сложности слова на основе его определений"""
+    return normalize_definitions(definitions)[1]
+
+
+def normalize_chunk(chunk):
+    """Обрабатывает пачку списков определений (выполняется в процессе пула)"""
+    return [normalize_definitions(definitions) for definitions in chunk]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def normalize_documents(documents, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Заполняет clean_definitions и difficulty у потока документов слов.
+
+    При workers > 1 пачки обрабатываются в пуле процессов. Одновременно
+    в работе не больше 2 * workers пачек, поэтому память ограничена,
+    а порядок документов сохраняется.
+    """
+    workers = workers or 1
+
+    if workers <= 1:
+        for document in documents:
+            document['clean_definitions'], document['difficulty'] = \
+                normalize_definitions(document['definitions'])
+            yield document
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+
+        def drain_one():
+            chunk, future = in_flight.popleft()
+            for document, (cleaned, difficulty) in zip(chunk, future.result()):
+                document['clean_definitions'] = cleaned
+                document['difficulty'] = difficulty
+            return chunk
+
+        for chunk in _chunks(documents, chunk_size):
+            in_flight.append((chunk, pool.submit(normalize_chunk, [doc['definitions'] for doc in chunk])))
+            if len(in_flight) >= 2 * workers:
+                yield from drain_one()
+
+        while in_flight:
+            yield from drain_one()
+
+
+def normalize_headword(word):
+    """
+    Нормализует татарское слово для поиска: NFC, нижний регистр,
+    без ударений, латинские двойники заменены татарскими буквами.
+    """
+    word = unicodedata.normalize('NFD', word)
+    word = STRESS_MARKS.sub('', word)
+    word = unicodedata.normalize('NFC', word).casefold()
+    return WHITESPACE_PATTERN.sub(' ', word.translate(TATAR_LOOKALIKES)).strip()
+
+
+def fold_headword(word):
+    """Ключ поиска без татарских букв: ә -> а, ө -> о, ү -> у, җ -> ж, ң -> н, һ -> х"""
+    return normalize_headword(word).translate(TATAR_FOLDING)
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+# Окончания для легкого стемминга русских слов (длинные первыми)
+RUSSIAN_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ться', 'тся', 'ешь', 'ишь', 'ете', 'ите', 'ют', 'ут', 'ят', 'ат',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю',
+    'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ью', 'ия', 'ть',
+    'а', 'я', 'ы', 'и', 'у', 'ю', 'е', 'о', 'ь', 'й',
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+
+def stem_russian(token):
+    """Отрезает типичное окончание, если остается основа не короче MIN_STEM_LENGTH"""
+    for ending in RUSSIAN_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM_LENGTH:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize_russian(text):
+    """Токены русского текста для полнотекстового поиска: нижний регистр, ё -> е, основы"""
+    return [
+        stem_russian(token)
+        for token in TOKEN_PATTERN.findall(text.casefold().replace('ё', 'е'))
+        if len(token) > 1 and not token.isdigit()
+    ]
+
+
+def default_workers():
+    """Количество процессов по умолчанию — число ядер"""
+    return os.cpu_count() or 1
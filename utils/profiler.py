@@ -0,0 +1,181 @@
+"""
+Выборочный профилировщик запросов
+
+Профилируется запрос с заголовком X-Profile: 1 (если authorize() его
+пропускает) или случайная доля запросов PROFILE_SAMPLE_RATE. Пока такой запрос
+обрабатывается, фоновый поток раз в PROFILE_INTERVAL_MS снимает его стек через
+sys._current_frames(). Стеки копятся по маршрутам в "folded" формате
+(кадры через ';' и число выборок), который понимают flamegraph.pl и speedscope.
+
+Если выборка выключена (PROFILE_SAMPLE_RATE=0 и нет authorize), хуки не
+регистрируются вовсе. Данные хранятся в памяти процесса.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+from flask import g, request
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Доля запросов, профилируемых без заголовка (0 — только по заголовку)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+# Интервал снятия стека
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+# Не больше стольких разных стеков на маршрут, остальные считаются в [other]
+PROFILE_MAX_STACKS = int(os.getenv('PROFILE_MAX_STACKS', 5000))
+
+PROFILE_HEADER = 'X-Profile'
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[-1]
+    else:
+        filename = os.path.basename(filename)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def folded_stack(frame):
+    """Стек кадра от корня к листу, кадры через ';'"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class RouteProfile:
+    """Выборки стеков одного маршрута"""
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.requests = 0
+        self.samples = 0
+
+    def add(self, stack):
+        if stack not in self.stacks and len(self.stacks) >= PROFILE_MAX_STACKS:
+            stack = '[other]'
+        self.stacks[stack] += 1
+        self.samples += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Один поток выборки на все профилируемые сейчас запросы"""
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.profiles = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id, route):
+        with self._lock:
+            self._active[thread_id] = [route, 0]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        """Завершает профилирование потока; возвращает число выборок"""
+        with self._lock:
+            session = self._active.pop(thread_id, None)
+            if session is None:
+                return 0
+            route, samples = session
+            self.profiles.setdefault(route, RouteProfile()).requests += 1
+            return samples
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                for thread_id, session in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    route = session[0]
+                    self.profiles.setdefault(route, RouteProfile()).add(folded_stack(frame))
+                    session[1] += 1
+            del frames
+
+    def summary(self):
+        with self._lock:
+            return [
+                {'route': route, 'requests': profile.requests, 'samples': profile.samples,
+                 'stacks': len(profile.stacks)}
+                for route, profile in sorted(self.profiles.items(), key=lambda item: -item[1].samples)
+            ]
+
+    def folded(self, route=None):
+        """Стеки маршрута (или всех маршрутов) в folded формате"""
+        with self._lock:
+            if route is not None:
+                profile = self.profiles.get(route)
+                return profile.folded() if profile else ''
+            merged = RouteProfile()
+            for name, profile in self.profiles.items():
+                for stack, count in profile.stacks.items():
+                    merged.stacks[f'{name};{stack}'] += count
+            return merged.folded()
+
+    def reset(self):
+        with self._lock:
+            self.profiles.clear()
+
+
+profiler = Profiler()
+
+
+def init_profiler(app, authorize=None):
+    """
+    Профилирование запросов. authorize() решает, можно ли запросу включить
+    профилирование заголовком; без него и при PROFILE_SAMPLE_RATE=0 ничего
+    не подключается.
+    """
+    if authorize is None and PROFILE_SAMPLE_RATE <= 0:
+        return
+
+    @app.before_request
+    def _start_profiling():
+        requested = request.headers.get(PROFILE_HEADER) == '1'
+        if requested and authorize is not None and authorize():
+            g.profiled_by_header = True
+        elif not (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE):
+            return
+        g.profile_thread = threading.get_ident()
+        rule = request.url_rule
+        profiler.start(g.profile_thread, rule.rule if rule is not None else 'unmatched')
+
+    @app.after_request
+    def _stop_profiling(response):
+        thread_id = g.pop('profile_thread', None)
+        if thread_id is not None:
+            samples = profiler.stop(thread_id)
+            if g.pop('profiled_by_header', False):
+                response.headers['X-Profile-Samples'] = str(samples)
+        return response
+
+    @app.teardown_request
+    def _stop_on_error(exc):
+        thread_id = g.pop('profile_thread', None)
+        if thread_id is not None:
+            profiler.stop(thread_id)
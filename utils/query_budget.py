@@ -0,0 +1,197 @@
+"""
+Бюджет запросов к MongoDB на HTTP запрос
+
+Слушатель pymongo считает команды и их суммарное время в объекте QueryStats
+текущего контекста (contextvars). Обработчик запроса создает свой QueryStats,
+и если команд больше бюджета маршрута — пишет предупреждение с разбивкой по
+коллекциям: так N+1 виден сразу. В режиме отладки (или при SERVER_TIMING=1)
+итог отдается в заголовке Server-Timing.
+
+Потоки ThreadPoolExecutor не наследуют контекст: задачи, которые должны
+считаться в запрос, передаются через submit_in_context().
+
+Для тестов: assert_max_queries(n) / assert_max_queries(route='/cards'),
+бюджеты маршрутов проверяет tests/test_query_budget.py.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from flask import g, request
+from pymongo import monitoring
+
+# Загрузка переменных окружения
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_budgets(value):
+    budgets = {}
+    for item in value.split(','):
+        route, _, limit = item.strip().rpartition('=')
+        if route and limit.isdigit():
+            budgets[route] = int(limit)
+    return budgets
+
+
+# Бюджет для маршрутов, которых нет в ROUTE_QUERY_BUDGETS
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 10))
+# Отдавать Server-Timing и без режима отладки
+SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1'
+
+# Бюджеты маршрутов (правило Flask -> число команд); QUERY_BUDGETS=route=n,... переопределяет
+ROUTE_QUERY_BUDGETS = {
+    '/register': 3,
+    '/cards': 3,
+    '/quiz': 3,
+    '/answer': 8,
+    '/api/visit': 4,
+    '/api/streak/visit': 4,
+    '/api/ranking': 5,
+    '/api/ranking/top': 5,
+    '/api/ranking/user': 5,
+    '/api/user-answers/<user_id>': 4,
+    '/api/user-answers/stats/<user_id>': 4,
+    '/rating/words': 2,
+    '/rating/streak': 2,
+    '/stats/<user_id>': 2,
+    '/metrics': 0,
+    '/health': 0,
+}
+ROUTE_QUERY_BUDGETS.update(_parse_budgets(os.getenv('QUERY_BUDGETS', '')))
+
+_current = contextvars.ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    """Число команд и их время; учитывается и во внешнем QueryStats"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.count = 0
+        self.duration_micros = 0
+        self.commands = Counter()
+        self._lock = threading.Lock()
+
+    def add_command(self, collection, command_name):
+        with self._lock:
+            self.count += 1
+            self.commands[f'{collection}.{command_name}' if collection else command_name] += 1
+        if self.parent is not None:
+            self.parent.add_command(collection, command_name)
+
+    def add_duration(self, duration_micros):
+        with self._lock:
+            self.duration_micros += duration_micros
+        if self.parent is not None:
+            self.parent.add_duration(duration_micros)
+
+    @property
+    def duration_ms(self):
+        return self.duration_micros / 1000
+
+    def summary(self, limit=5):
+        return ', '.join(f'{name}×{count}' for name, count in self.commands.most_common(limit))
+
+
+def current():
+    """QueryStats текущего контекста (None вне запроса)"""
+    return _current.get()
+
+
+class QueryBudgetListener(monitoring.CommandListener):
+    """Учитывает команды в QueryStats потока, который их выполняет"""
+
+    def started(self, event):
+        stats = _current.get()
+        if stats is not None:
+            collection = event.command.get(event.command_name)
+            stats.add_command(collection if isinstance(collection, str) else '', event.command_name)
+
+    def succeeded(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.add_duration(event.duration_micros)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+_listener_registered = False
+
+
+def register_listener():
+    """Подключает слушатель pymongo (действует на клиенты, созданные после вызова)"""
+    global _listener_registered
+    if not _listener_registered:
+        monitoring.register(QueryBudgetListener())
+        _listener_registered = True
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit, при котором команды задачи учитываются в текущем запросе"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def route_budget(route):
+    return ROUTE_QUERY_BUDGETS.get(route, QUERY_BUDGET_DEFAULT)
+
+
+def init_query_budget(app):
+    """Считает команды каждого запроса и проверяет бюджет маршрута"""
+
+    @app.before_request
+    def _start_counting():
+        stats = QueryStats(parent=_current.get())
+        g.query_budget_token = _current.set(stats)
+        g.query_stats = stats
+
+    @app.after_request
+    def _check_budget(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else None
+        budget = route_budget(route)
+        if route is not None and stats.count > budget:
+            logger.warning(
+                'Query budget exceeded on %s %s: %d commands (budget %d), %.1f ms: %s',
+                request.method, route, stats.count, budget, stats.duration_ms, stats.summary()
+            )
+        if app.debug or SERVER_TIMING:
+            response.headers.add(
+                'Server-Timing', f'db;dur={stats.duration_ms:.1f};desc="{stats.count} queries"'
+            )
+        return response
+
+    @app.teardown_request
+    def _stop_counting(exc):
+        token = g.pop('query_budget_token', None)
+        if token is not None:
+            _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit=None, route=None):
+    """
+    Падает с AssertionError, если внутри блока выполнено больше limit команд
+    (или больше бюджета маршрута route).
+    """
+    if limit is None:
+        limit = route_budget(route)
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if stats.count > limit:
+        raise AssertionError(
+            f'Expected at most {limit} queries, got {stats.count}: {stats.summary(limit=10)}'
+        )
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Минимальный сервер протокола Redis (RESP) для разработки
+
+Хранит данные в памяти и понимает команды, которые использует
+utils/cache.py (GET, SET с EX/PX, DEL, INCR, MGET, PING, SELECT, AUTH,
+FLUSHDB). Нужен, чтобы проверить CACHE_BACKEND=redis без Redis:
+    python utils/resp_server.py --port 6380
+    CACHE_BACKEND=redis REDIS_URL=redis://localhost:6380/0 python app.py
+"""
+
+import argparse
+import socketserver
+import sys
+import threading
+import time
+
+
+def _simple(text):
+    return b'+%s\r\n' % text.encode('utf-8')
+
+
+def _error(text):
+    return b'-ERR %s\r\n' % text.encode('utf-8')
+
+
+def _integer(value):
+    return b':%d\r\n' % value
+
+
+def _bulk(value):
+    return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class Store:
+    """Ключи с необязательным временем истечения"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args):
+        command = args[0].upper()
+        with self.lock:
+            if command == b'PING':
+                return _simple('PONG')
+            if command in (b'SELECT', b'AUTH'):
+                return _simple('OK')
+            if command == b'GET':
+                return _bulk(self._get(args[1]))
+            if command == b'MGET':
+                values = [self._get(key) for key in args[1:]]
+                return b'*%d\r\n' % len(values) + b''.join(_bulk(value) for value in values)
+            if command == b'SET':
+                expires_at = None
+                options = [arg.upper() for arg in args[3:]]
+                if b'PX' in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(b'PX') + 1]) / 1000
+                elif b'EX' in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(b'EX') + 1])
+                self.data[args[1]] = (args[2], expires_at)
+                return _simple('OK')
+            if command == b'DEL':
+                return _integer(sum(self.data.pop(key, None) is not None for key in args[1:]))
+            if command == b'INCR':
+                try:
+                    value = int(self._get(args[1]) or 0) + 1
+                except ValueError:
+                    return _error('value is not an integer or out of range')
+                self.data[args[1]] = (str(value).encode('ascii'), self.data.get(args[1], (None, None))[1])
+                return _integer(value)
+            if command == b'FLUSHDB':
+                self.data.clear()
+                return _simple('OK')
+        return _error(f"unknown command '{command.decode('utf-8', 'replace')}'")
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b'*'):
+                self.wfile.write(_error('Protocol error'))
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(self.server.store.execute(args) if args else _error('empty command'))
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, RespHandler)
+        self.store = Store()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+
+def start_in_thread(host='127.0.0.1', port=0):
+    """Сервер в фоновом потоке (port=0 — свободный порт); адрес в server.url"""
+    server = RespServer((host, port))
+    threading.Thread(target=server.serve_forever, name='resp-server', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сервер RESP в памяти для разработки')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args(argv)
+
+    server = RespServer((args.host, args.port))
+    print(f'Сервер RESP: {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
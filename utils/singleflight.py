@@ -0,0 +1,123 @@
+"""
+Объединение одинаковых параллельных вычислений (single flight)
+
+Пока по ключу идет вычисление, остальные вызовы с тем же ключом не
+запускают свое, а ждут его и получают тот же результат (или то же
+исключение). Так истечение кэша рейтинга под нагрузкой стоит одного
+запроса к MongoDB, а не сотни одинаковых.
+
+Ожидание ограничено SINGLEFLIGHT_TIMEOUT секунд, число ждущих на ключ —
+SINGLEFLIGHT_MAX_WAITERS; сверх этого вызов сразу получает исключение,
+и обработчик отвечает 503, а не встает в очередь.
+"""
+
+import os
+import threading
+from functools import wraps
+
+from dotenv import load_dotenv
+
+from utils.metrics import registry
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Сколько ждать чужого вычисления, секунд
+SINGLEFLIGHT_TIMEOUT = float(os.getenv('SINGLEFLIGHT_TIMEOUT', 10))
+# Сколько вызовов может ждать одно вычисление
+SINGLEFLIGHT_MAX_WAITERS = int(os.getenv('SINGLEFLIGHT_MAX_WAITERS', 1000))
+
+SINGLEFLIGHT_CALLS = registry.counter(
+    'singleflight_calls_total', 'Вызовы single flight: leader — вычислял сам, shared — дождался чужого',
+    ('flight', 'outcome')
+)
+
+
+class SingleFlightError(Exception):
+    """Вызов не дождался чужого вычисления"""
+
+
+class SingleFlightTimeout(SingleFlightError):
+    """Вычисление не завершилось за timeout"""
+
+
+class TooManyWaiters(SingleFlightError):
+    """У ключа уже SINGLEFLIGHT_MAX_WAITERS ждущих"""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Текущие вычисления по ключам"""
+
+    def __init__(self, name, timeout=SINGLEFLIGHT_TIMEOUT, max_waiters=SINGLEFLIGHT_MAX_WAITERS):
+        self.name = name
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Результат fn(*args, **kwargs) для ключа и флаг shared — получен ли он
+        из чужого вычисления.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            elif call.waiters >= self.max_waiters:
+                SINGLEFLIGHT_CALLS.inc(self.name, 'rejected')
+                raise TooManyWaiters(key)
+            else:
+                call.waiters += 1
+
+        if leader:
+            SINGLEFLIGHT_CALLS.inc(self.name, 'leader')
+            try:
+                call.result = fn(*args, **kwargs)
+                return call.result, False
+            except BaseException as e:
+                # В том числе SystemExit/KeyboardInterrupt: иначе ждущие
+                # получили бы None как успешный результат
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+
+        if not call.done.wait(self.timeout):
+            SINGLEFLIGHT_CALLS.inc(self.name, 'timeout')
+            raise SingleFlightTimeout(key)
+        SINGLEFLIGHT_CALLS.inc(self.name, 'shared')
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def in_flight(self):
+        """Число ключей, по которым сейчас идет вычисление"""
+        return len(self._calls)
+
+
+def coalesced(flight, key):
+    """
+    Декоратор: одинаковые параллельные вызовы функции выполняются один раз.
+    key(*args, **kwargs) — ключ вызова (аргументы, нормализованные так,
+    чтобы равнозначные вызовы совпадали).
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(key(*args, **kwargs), fn, *args, **kwargs)[0]
+        return wrapper
+    return decorator
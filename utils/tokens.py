@@ -0,0 +1,110 @@
+"""
+Подписанные токены доступа
+
+Токен вида <kid>.<payload>.<signature>: payload содержит user_id и время
+выдачи, подпись — HMAC-SHA256 ключом kid. Проверка токена не обращается
+к базе. Ключи задаются в TOKEN_SIGNING_KEYS списком kid:secret через запятую:
+первым ключом подписываются новые токены, остальные принимаются при проверке,
+что позволяет менять ключ без разлогинивания пользователей.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# uuid — случайный токен в users (как раньше), signed — подписанный токен
+TOKEN_MODE = os.getenv('TOKEN_MODE', 'uuid')
+# Срок жизни подписанного токена в секундах (0 — без ограничения)
+TOKEN_MAX_AGE = int(os.getenv('TOKEN_MAX_AGE', 0))
+
+
+def _parse_keys(value):
+    keys = []
+    for item in value.split(','):
+        kid, _, secret = item.strip().partition(':')
+        if kid and secret:
+            keys.append((kid, secret.encode('utf-8')))
+    return keys
+
+
+SIGNING_KEYS = _parse_keys(os.getenv('TOKEN_SIGNING_KEYS', ''))
+
+if TOKEN_MODE not in ('uuid', 'signed'):
+    raise ValueError(f'Unknown token mode: {TOKEN_MODE}')
+if TOKEN_MODE == 'signed' and not SIGNING_KEYS:
+    raise ValueError('TOKEN_MODE=signed requires TOKEN_SIGNING_KEYS')
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _signature(secret, message):
+    return hmac.new(secret, message.encode('ascii'), hashlib.sha256).digest()
+
+
+def signing_enabled():
+    """Выдаются ли новые токены подписанными"""
+    return TOKEN_MODE == 'signed'
+
+
+def is_signed(token):
+    """Похож ли токен на подписанный (UUID не содержит точек)"""
+    return isinstance(token, str) and token.count('.') == 2
+
+
+def issue(user_id, issued_at=None, keys=None):
+    """Выдает токен, подписанный активным (первым) ключом"""
+    kid, secret = (keys or SIGNING_KEYS)[0]
+    payload = _b64encode(json.dumps(
+        {'u': user_id, 'iat': int(issued_at if issued_at is not None else time.time())},
+        separators=(',', ':')
+    ).encode('utf-8'))
+    message = f'{kid}.{payload}'
+    return f'{message}.{_b64encode(_signature(secret, message))}'
+
+
+def verify(token, keys=None, max_age=None):
+    """
+    Проверяет подпись и срок токена.
+
+    Возвращает {'user_id', 'iat', 'token_id'} или None, если токен
+    поврежден, подписан неизвестным ключом или устарел.
+    """
+    if not is_signed(token):
+        return None
+    kid, payload, signature = token.split('.')
+    secret = dict(keys or SIGNING_KEYS).get(kid)
+    if secret is None:
+        return None
+
+    # Сравнивается строка подписи, а не декодированные байты: нестрогий
+    # base64 принимает много записей одних и тех же байт, а token_id
+    # (ключ отзыва и кэша) должен быть у токена единственным
+    expected = _b64encode(_signature(secret, f'{kid}.{payload}'))
+    if not hmac.compare_digest(expected.encode('ascii'), signature.encode('utf-8')):
+        return None
+
+    try:
+        claims = json.loads(_b64decode(payload))
+        user_id, issued_at = claims['u'], int(claims['iat'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    max_age = TOKEN_MAX_AGE if max_age is None else max_age
+    if max_age and time.time() - issued_at > max_age:
+        return None
+
+    return {'user_id': user_id, 'iat': issued_at, 'token_id': signature}
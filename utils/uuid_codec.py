@@ -0,0 +1,107 @@
+"""
+Хранение идентификаторов в бинарном виде
+
+При USE_BINARY_UUIDS=1 user_id и token (UUID) записываются как BSON Binary
+подтипа 4 (16 байт вместо 36-символьной строки), а card_id (ObjectId слова) —
+как ObjectId (12 байт вместо 24 символов). API по-прежнему принимает и
+возвращает строки: модели кодируют значения при записи и декодируют при чтении.
+
+Пока идет миграция (python jobs.py migrate-uuids), в базе лежат оба
+представления, поэтому запросы ищут по обоим (UUID_DUAL_READ=1).
+"""
+
+import os
+import re
+import uuid
+
+from bson import ObjectId
+from bson.binary import Binary, UUID_SUBTYPE
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения
+load_dotenv()
+
+USE_BINARY_UUIDS = os.getenv('USE_BINARY_UUIDS', '0').lower() in ('1', 'true', 'yes')
+UUID_DUAL_READ = os.getenv('UUID_DUAL_READ', '1').lower() in ('1', 'true', 'yes')
+
+_UUID_TEMPLATE = 'xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx'
+_HEX_DIGITS = '0123456789abcdef'
+
+
+def _parse_uuid(value):
+    try:
+        return uuid.UUID(value)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def to_binary(value):
+    """Бинарное представление строкового id; None, если строка не UUID и не ObjectId"""
+    if not isinstance(value, str):
+        return None
+    if len(value) == 24 and ObjectId.is_valid(value):
+        return ObjectId(value)
+    parsed = _parse_uuid(value)
+    return Binary.from_uuid(parsed) if parsed is not None else None
+
+
+def encode(value):
+    """Значение id для записи в базу"""
+    if not USE_BINARY_UUIDS:
+        return value
+    binary = to_binary(value)
+    return binary if binary is not None else value
+
+
+def match(value):
+    """Условие поиска по id: во время миграции — по обоим представлениям"""
+    if not UUID_DUAL_READ:
+        return encode(value)
+    binary = to_binary(value)
+    if binary is None:
+        return value
+    return {'$in': [value, binary]}
+
+
+def decode(value):
+    """Строковое представление id из базы"""
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return str(value.as_uuid())
+    if isinstance(value, (uuid.UUID, ObjectId)):
+        return str(value)
+    return value
+
+
+def decode_fields(document, fields):
+    """Переводит поля документа в строки на месте и возвращает документ"""
+    if document:
+        for field in fields:
+            if field in document:
+                document[field] = decode(document[field])
+    return document
+
+
+def _uuid_prefix_range(prefix):
+    """Границы Binary для UUID, строка которых начинается с prefix; None, если это не начало UUID"""
+    if len(prefix) > len(_UUID_TEMPLATE):
+        return None
+    for char, slot in zip(prefix, _UUID_TEMPLATE):
+        if (char == '-') != (slot == '-') or (slot == 'x' and char not in _HEX_DIGITS):
+            return None
+    digits = prefix.replace('-', '')
+    return (Binary(bytes.fromhex(digits.ljust(32, '0')), UUID_SUBTYPE),
+            Binary(bytes.fromhex(digits.ljust(32, 'f')), UUID_SUBTYPE))
+
+
+def prefix_filter(field, prefix):
+    """
+    Условие поиска id по началу строковой формы. Подстроку внутри Binary
+    найти нельзя, а начало UUID — это диапазон байт, поэтому поиск по
+    префиксу находит оба представления и идет по индексу.
+    """
+    prefix = prefix.lower()
+    conditions = [{field: {'$regex': '^' + re.escape(prefix)}}]
+    bounds = _uuid_prefix_range(prefix)
+    if bounds is not None:
+        conditions.append({field: {'$gte': bounds[0], '$lte': bounds[1]}})
+    return conditions[0] if len(conditions) == 1 else {'$or': conditions}